@@ -0,0 +1,156 @@
+import threading
+from collections import namedtuple
+from concurrent.futures import Future
+
+import lazy_import
+import vector_ops
+
+np = lazy_import.lazy_module("numpy")
+
+# --- まとめて類似度を計算する処理 ---
+# (お題, 推測) の組をたくさん受け取り、単位ベクトルの積を1回の NumPy 演算で計算する
+DEFAULT_MAX_BATCH = 256  # 1回にまとめる組の数
+DEFAULT_MAX_DELAY = 0.002  # 組が集まるのを待つ最大の秒数
+
+# similarities: 類似度（語彙にない組は 0）, ranks: 順位（求めていない・語彙にない組は -1）,
+# in_vocab: お題と推測の両方が語彙にあるか
+BatchResult = namedtuple("BatchResult", ["similarities", "ranks", "in_vocab"])
+
+
+def lookup_ids(model, words):
+    """単語の行番号の配列を返す（語彙にない単語は -1）"""
+    key_to_index = model.key_to_index
+    return np.fromiter((key_to_index.get(word, -1) for word in words), dtype=np.int64, count=len(words))
+
+
+def _ranks_for_question(model, question_id, guess_ids, table=None):
+    """1つのお題について、推測した単語の (類似度, 順位) を返す"""
+    if table is not None and table.similarities is not None:
+        return table.similarities[guess_ids], table.ranks[guess_ids]
+    # 表がなければ全語彙との類似度を1回計算し、自分より近い単語の数を順位にする
+    query = vector_ops.unit_rows(model, np.array([question_id]))[0]
+    all_similarities = vector_ops.similarities_to_all(model, query)
+    similarities = all_similarities[guess_ids]
+    ordered = np.sort(all_similarities)
+    ranks = len(ordered) - np.searchsorted(ordered, similarities, side="right")
+    return similarities, ranks
+
+
+def similarity_pairs(model, questions, guesses, with_ranks=False, tables=None):
+    """(お題, 推測) の組ごとの類似度をまとめて計算して BatchResult で返す
+
+    with_ranks=True なら順位も求める（お題ごとに全語彙との積が1回必要になる）。
+    tables に similarity_table.SimilarityTableCache を渡すと、作成済みの表を使い回す。
+    """
+    count = len(questions)
+    similarities = np.zeros(count, dtype=np.float32)
+    ranks = np.full(count, -1, dtype=np.int64)
+    question_ids = lookup_ids(model, questions)
+    guess_ids = lookup_ids(model, guesses)
+    in_vocab = (question_ids >= 0) & (guess_ids >= 0)
+    valid = np.flatnonzero(in_vocab)
+    if not len(valid):
+        return BatchResult(similarities, ranks, in_vocab)
+
+    if with_ranks:
+        for question_id in np.unique(question_ids[valid]):
+            members = valid[question_ids[valid] == question_id]
+            table = tables.peek(model, model.index_to_key[question_id]) if tables is not None else None
+            similarities[members], ranks[members] = _ranks_for_question(model, question_id, guess_ids[members], table)
+        return BatchResult(similarities, ranks, in_vocab)
+
+    # 同じお題は1回だけ単位ベクトルにして、組ごとの内積を1回の einsum で求める
+    unique_ids, inverse = np.unique(question_ids[valid], return_inverse=True)
+    question_rows = vector_ops.unit_rows(model, unique_ids)
+    guess_rows = vector_ops.unit_rows(model, guess_ids[valid])
+    similarities[valid] = np.einsum("ij,ij->i", question_rows[inverse], guess_rows)
+    return BatchResult(similarities, ranks, in_vocab)
+
+
+def similarity_one_to_many(model, question, guesses, with_ranks=False, tables=None):
+    """1つのお題とたくさんの推測との類似度をまとめて計算して BatchResult で返す"""
+    return similarity_pairs(model, [question] * len(guesses), guesses, with_ranks, tables)
+
+
+class MicroBatcher:
+    """別々のスレッドから届いた要求を少しだけ待ってまとめ、1回の計算で処理する
+
+    submit() はすぐに concurrent.futures.Future を返す（asyncio からは asyncio.wrap_future で待てる）。
+    process_batch は要求のリストを受け取り、同じ長さの結果のリストを返す関数。
+    """
+
+    def __init__(self, process_batch, max_batch=DEFAULT_MAX_BATCH, max_delay=DEFAULT_MAX_DELAY, name="batcher"):
+        self._process_batch = process_batch
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._items = []
+        self._condition = threading.Condition()
+        self._stopped = False
+        self.batches = 0
+        self.items = 0
+        self._thread = threading.Thread(target=self._run, name=f"MicroBatcher-{name}", daemon=True)
+        self._thread.start()
+
+    def submit(self, item):
+        """要求を追加して、結果を受け取る Future を返す"""
+        future = Future()
+        with self._condition:
+            if self._stopped:
+                raise RuntimeError("MicroBatcher は停止しています。")
+            self._items.append((item, future))
+            if len(self._items) == 1 or len(self._items) >= self.max_batch:
+                self._condition.notify()
+        return future
+
+    def _take_batch(self):
+        with self._condition:
+            while not self._items and not self._stopped:
+                self._condition.wait()
+            if not self._items:
+                return None
+            # 最初の要求が届いてから max_delay だけ、ほかの要求が集まるのを待つ
+            self._condition.wait_for(lambda: len(self._items) >= self.max_batch or self._stopped, self.max_delay)
+            batch, self._items = self._items[:self.max_batch], self._items[self.max_batch:]
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._take_batch()
+            if batch is None:
+                return
+            # 取り消された要求は計算しない
+            accepted = [(item, future) for item, future in batch if future.set_running_or_notify_cancel()]
+            if not accepted:
+                continue
+            try:
+                results = self._process_batch([item for item, _ in accepted])
+            except Exception as e:
+                for _, future in accepted:
+                    future.set_exception(e)
+                continue
+            self.batches += 1
+            self.items += len(accepted)
+            for (_, future), result in zip(accepted, results):
+                future.set_result(result)
+
+    def stop(self):
+        """残っている要求を処理してからワーカースレッドを止める"""
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+
+    def stats(self):
+        return {"batches": self.batches, "items": self.items,
+                "mean_batch_size": self.items / self.batches if self.batches else None}
+
+
+def similarity_batcher(get_model, max_batch=DEFAULT_MAX_BATCH, max_delay=DEFAULT_MAX_DELAY):
+    """(お題, 推測) を受け取って (類似度, 語彙にあるか) を返す MicroBatcher を作る
+
+    get_model は計算するときに呼ぶので、途中でモデルが差し替わっても新しいモデルで計算する。
+    """
+    def process(pairs):
+        questions, guesses = zip(*pairs)
+        result = similarity_pairs(get_model(), questions, guesses)
+        return [(float(similarity), bool(in_vocab)) for similarity, in_vocab in zip(result.similarities, result.in_vocab)]
+    return MicroBatcher(process, max_batch, max_delay, name="similarity")
@@ -0,0 +1,5 @@
+"""ゲームロジックのベンチマーク
+
+数GBのモデルをダウンロードしなくても計測できるように、合成したモデルを使う。
+python -m benchmarks.run で実行する。
+"""
@@ -0,0 +1,178 @@
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import contextlib
+
+import game_logic
+from guess_ranking import GuessRanking
+from benchmarks import synthetic_model
+
+# 画面（Tk）は使わないので、ディスプレイのない環境でも実行できる
+
+
+def summarize(durations):
+    """処理時間のリスト（秒）から、スループットとレイテンシのパーセンタイルをまとめる"""
+    if not durations:
+        return {"count": 0}
+    ordered = sorted(durations)
+    total = sum(ordered)
+
+    def percentile(p):
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p))] * 1000
+
+    return {
+        "count": len(ordered),
+        "total_s": total,
+        "throughput_per_s": len(ordered) / total if total else None,
+        "p50_ms": percentile(0.50),
+        "p90_ms": percentile(0.90),
+        "p99_ms": percentile(0.99),
+        "max_ms": ordered[-1] * 1000,
+    }
+
+
+def measure(func, iterations):
+    """func を iterations 回呼び、1回ごとの処理時間（秒）のリストを返す"""
+    durations = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def peak_rss_bytes():
+    """このプロセスのピークメモリ使用量（バイト）を返す。取得できなければ None"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux は KB 単位、macOS はバイト単位
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def run_benchmarks(args, workdir):
+    """合成モデルを作り、ゲームロジックの主な処理を計測して結果を辞書で返す"""
+    results = {"config": {"vocab": args.vocab, "dim": args.dim, "iterations": args.iterations, "seed": args.seed}}
+    random.seed(args.seed)
+
+    start = time.perf_counter()
+    words, vectors = synthetic_model.generate_model(args.vocab, args.dim, args.data_dir, args.seed)
+    model_path = os.path.join(workdir, "synthetic.vec")
+    synthetic_model.write_text_model(model_path, words, vectors)
+    results["generate_model_s"] = time.perf_counter() - start
+    if args.binary:
+        # バイナリ形式は参考として gensim の読み込み時間を測る
+        binary_path = os.path.join(workdir, "synthetic.bin")
+        synthetic_model.write_binary_model(binary_path, words, vectors)
+        from gensim.models import KeyedVectors
+        results["gensim_load_binary"] = summarize(measure(lambda: KeyedVectors.load_word2vec_format(binary_path, binary=True), 1))
+    del words, vectors
+
+    # 1回目はテキストを解析してキャッシュを作り、2回目以降はキャッシュを開く
+    results["load_model_cold"] = summarize(measure(lambda: game_logic.load_model(model_path, store=args.store), 1))
+    if game_logic.get_model() is None:
+        raise RuntimeError("合成モデルの読み込みに失敗しました。")
+    results["load_model_warm"] = summarize(measure(lambda: game_logic.load_model(model_path, store=args.store), 3))
+    # 近傍のディスクキャッシュは作業フォルダごと消えるので付けない
+    game_logic.prepare_neighbor_index(model_path, args.neighbor_backend, disk_cache=False)
+
+    e_data = game_logic.load_json_data(os.path.join(args.data_dir, "easy_data.json"))
+    n_data = game_logic.load_json_data(os.path.join(args.data_dir, "normal_data.json"))
+    h_data = game_logic.load_json_data(os.path.join(args.data_dir, "hard_data.json"))
+    results["prepare_easy_data"] = summarize(measure(lambda: game_logic.prepare_easy_data(e_data), 1))
+
+    for difficulty in ("1", "2", "3"):
+        failures = 0
+
+        def generate():
+            nonlocal failures
+            question, _ = game_logic.generate_question_by_difficulty(difficulty, e_data, n_data, h_data)
+            failures += question is None
+
+        summary = summarize(measure(generate, args.iterations))
+        summary["failures"] = failures
+        results[f"generate_question_difficulty_{difficulty}"] = summary
+
+    keywords = [word for word in list(e_data) + list(n_data) + list(h_data) if game_logic.word_exists(word)]
+    # キーワードは数が少なく近傍のキャッシュにすぐ当たるので、当たらない場合と当たる場合を分けて測る
+    cold = []
+    for _ in range(args.iterations):
+        game_logic.similar_words_cache.clear()
+        cold += measure(lambda: game_logic.generate_custom_question(random.choice(keywords)), 1)
+    results["generate_custom_question_cold"] = summarize(cold)
+    for keyword in keywords:
+        game_logic.generate_custom_question(keyword)
+    results["generate_custom_question_warm"] = summarize(measure(lambda: game_logic.generate_custom_question(random.choice(keywords)), args.iterations))
+    results["neighbor_cache"] = game_logic.similar_words_cache.stats()
+
+    vocab = game_logic.get_model().index_to_key
+    pairs = [(random.choice(vocab), random.choice(vocab)) for _ in range(args.iterations * 10)]
+    pair_iter = iter(pairs)
+    results["check_similarity"] = summarize(measure(lambda: game_logic.check_similarity(*next(pair_iter)), len(pairs)))
+    questions, guesses = zip(*pairs)
+    batch = summarize(measure(lambda: game_logic.check_similarity_batch(questions, guesses), args.iterations))
+    batch["pairs_per_s"] = len(pairs) / (batch["total_s"] / batch["count"]) if batch["total_s"] else None
+    results["check_similarity_batch"] = batch
+    results["word_exists"] = summarize(measure(lambda: game_logic.word_exists(random.choice(vocab)), len(pairs)))
+
+    question = random.choice(vocab)
+    results["similarity_table_build"] = summarize(measure(lambda: game_logic.create_similarity_table(question, background=False), 3))
+    table = game_logic.create_similarity_table(question, background=False)
+    results["check_similarity_with_rank"] = summarize(measure(lambda: game_logic.check_similarity_with_rank(question, random.choice(vocab), table), len(pairs)))
+
+    ranking = GuessRanking()
+    guess_iter = iter(range(args.ranking_guesses))
+
+    def add_guess():
+        i = next(guess_iter)
+        ranking.add(f"guess{i}", random.uniform(-0.2, 0.9))
+        ranking.display_rows(5)
+
+    results["ranking_update"] = summarize(measure(add_guess, args.ranking_guesses))
+    results["peak_rss_bytes"] = peak_rss_bytes()
+    return results
+
+
+def main():
+    """コマンドラインからベンチマークを実行し、結果を JSON で出力する"""
+    parser = argparse.ArgumentParser(description="合成モデルでゲームロジックの処理時間を計測します。")
+    parser.add_argument("--vocab", type=int, default=50000, help="合成モデルの語彙数")
+    parser.add_argument("--dim", type=int, default=300, help="合成モデルの次元数")
+    parser.add_argument("--iterations", type=int, default=100, help="各処理の繰り返し回数")
+    parser.add_argument("--ranking-guesses", type=int, default=10000, help="ランキング更新の計測に使う推測数")
+    parser.add_argument("--store", default="full", help="full / float16 / int8")
+    parser.add_argument("--neighbor-backend", default="exact", help="exact / ivf")
+    parser.add_argument("--binary", action="store_true", help="バイナリ形式の合成モデルも書き出す")
+    parser.add_argument("--data-dir", default="data")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workdir", default=None, help="合成モデルとキャッシュの置き場所（省略時は一時フォルダ）")
+    parser.add_argument("--out", default=None, help="結果の JSON の出力先（省略時は標準出力）")
+    args = parser.parse_args()
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="wordrequest-bench-")
+    os.makedirs(workdir, exist_ok=True)
+    try:
+        # ゲームロジックの print が JSON に混ざらないように標準エラー出力へ回す
+        with contextlib.redirect_stdout(sys.stderr):
+            results = run_benchmarks(args, workdir)
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    text = json.dumps(results, indent=2, ensure_ascii=False)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import asyncio
+import argparse
+import tempfile
+import contextlib
+
+import game_logic
+import game_server
+from benchmarks import synthetic_model
+from benchmarks.run import summarize
+
+
+async def play(client, vocab, guesses, durations, errors):
+    """1人分のプレイヤー：ゲームを始めて guesses 回推測し、あきらめる"""
+    status, state = await client.start(difficulty=random.choice(("1", "2", "3")))
+    if status != 201:
+        errors.append(state.get("error"))
+        return
+    session_id = state["session"]
+    for _ in range(guesses):
+        start = time.perf_counter()
+        status, result = await client.guess(session_id, random.choice(vocab))
+        durations.append(time.perf_counter() - start)
+        if status != 200:
+            errors.append(result.get("error"))
+            return
+        if result.get("correct"):
+            return
+    await client.ranking(session_id)
+    await client.give_up(session_id)
+
+
+async def run_load(args):
+    """サーバーを起動し、同時に players 人が推測したときのスループットとレイテンシを測る"""
+    e_data = game_logic.load_json_data(os.path.join(args.data_dir, "easy_data.json"))
+    n_data = game_logic.load_json_data(os.path.join(args.data_dir, "normal_data.json"))
+    h_data = game_logic.load_json_data(os.path.join(args.data_dir, "hard_data.json"))
+    game_logic.prepare_easy_data(e_data)
+    service = game_server.GameService(e_data, n_data, h_data, workers=args.workers)
+    server = None
+    if args.in_process:
+        clients = [game_server.LocalClient(service) for _ in range(args.players)]
+    else:
+        server = await game_server.GameServer(service, "127.0.0.1", 0).start()
+        clients = [game_server.HttpClient("127.0.0.1", server.port) for _ in range(args.players)]
+
+    vocab = game_logic.get_model().index_to_key
+    durations, errors = [], []
+    start = time.perf_counter()
+    try:
+        for _ in range(args.rounds):
+            await asyncio.gather(*(play(client, vocab, args.guesses, durations, errors) for client in clients))
+        elapsed = time.perf_counter() - start
+    finally:
+        for client in clients:
+            if isinstance(client, game_server.HttpClient):
+                await client.close()
+        if server is not None:
+            await server.close()
+        stats = service.stats()
+        service.close()
+
+    summary = summarize(durations)
+    return {
+        "config": {"vocab": args.vocab, "dim": args.dim, "players": args.players, "guesses": args.guesses,
+                   "rounds": args.rounds, "workers": args.workers, "transport": "local" if args.in_process else "http"},
+        "elapsed_s": elapsed,
+        "guesses_per_s": len(durations) / elapsed if elapsed else None,
+        "guess_latency": summary,
+        "errors": len(errors),
+        "server": {"similarity_tables": stats["similarity_tables"]},
+    }
+
+
+def main():
+    """合成モデルでゲームサーバーの負荷試験を行い、結果を JSON で出力する"""
+    parser = argparse.ArgumentParser(description="合成モデルでゲームサーバーに同時に推測を送り、1秒あたりの推測数と p99 を測ります。")
+    parser.add_argument("--vocab", type=int, default=50000)
+    parser.add_argument("--dim", type=int, default=300)
+    parser.add_argument("--players", type=int, default=100, help="同時に遊ぶプレイヤー数")
+    parser.add_argument("--guesses", type=int, default=50, help="1ゲームあたりの推測数")
+    parser.add_argument("--rounds", type=int, default=1, help="各プレイヤーが遊ぶゲーム数")
+    parser.add_argument("--workers", type=int, default=game_server.MODEL_WORKERS)
+    parser.add_argument("--in-process", action="store_true", help="ソケットを通さずに LocalClient で呼ぶ")
+    parser.add_argument("--data-dir", default="data")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default=None, help="結果の JSON の出力先（省略時は標準出力）")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    workdir = tempfile.mkdtemp(prefix="wordrequest-server-")
+    try:
+        with contextlib.redirect_stdout(sys.stderr):
+            words, vectors = synthetic_model.generate_model(args.vocab, args.dim, args.data_dir, args.seed)
+            model_path = os.path.join(workdir, "synthetic.vec")
+            synthetic_model.write_text_model(model_path, words, vectors)
+            del words, vectors
+            if not game_logic.load_model(model_path):
+                raise RuntimeError("合成モデルの読み込みに失敗しました。")
+            results = asyncio.run(run_load(args))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    text = json.dumps(results, indent=2, ensure_ascii=False)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
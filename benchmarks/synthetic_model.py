@@ -0,0 +1,109 @@
+import os
+import json
+import random
+import argparse
+import numpy as np
+
+# --- 合成モデルの設定 ---
+# ジャンルごとにクラスタを作り、ジャンル語・例示語・お題をそのクラスタに入れる
+CLUSTER_SIZE = 500  # 1つのクラスタに入る単語数の目安
+CLUSTER_SPREAD = 0.65  # クラスタ中心からのずれ（大きいほどクラスタ内の類似度が下がる）
+WRITE_CHUNK_ROWS = 4096
+
+HIRAGANA = [chr(c) for c in range(ord("ぁ"), ord("ゖ") + 1)]
+KATAKANA = [chr(c) for c in range(ord("ァ"), ord("ヶ") + 1)] + ["ー"]
+KANJI = [chr(c) for c in range(0x4E00, 0x4E00 + 2000)]
+
+
+def collect_data_words(data_dir="data"):
+    """data/*.json のジャンルごとに、(ジャンル名, 関連語のリスト) を集める"""
+    groups = []
+    for name in sorted(os.listdir(data_dir)):
+        if not name.endswith(".json"):
+            continue
+        with open(os.path.join(data_dir, name), "r", encoding="utf-8") as f:
+            data = json.load(f)
+        for genre, value in data.items():
+            words = value.get("example_words", []) if isinstance(value, dict) else list(value)
+            groups.append((genre, words))
+    return groups
+
+
+def random_japanese_word(rng):
+    """日本語らしい（ひらがな・カタカナ・漢字の）ランダムな単語を作る"""
+    kind = rng.random()
+    if kind < 0.4:
+        return "".join(rng.choice(KANJI) for _ in range(rng.randint(1, 3)))
+    if kind < 0.7:
+        return "".join(rng.choice(KATAKANA) for _ in range(rng.randint(2, 6)))
+    if kind < 0.9:
+        return "".join(rng.choice(KANJI) for _ in range(rng.randint(1, 2))) + "".join(rng.choice(HIRAGANA) for _ in range(rng.randint(1, 3)))
+    return "".join(rng.choice(HIRAGANA) for _ in range(rng.randint(2, 5)))
+
+
+def generate_model(vocab_size, dim, data_dir="data", seed=0):
+    """合成モデルの (単語リスト, ベクトル) を作る。データの単語は必ず含まれる"""
+    rng = random.Random(seed)
+    np_rng = np.random.default_rng(seed)
+    groups = collect_data_words(data_dir)
+    cluster_count = max(len(groups), vocab_size // CLUSTER_SIZE, 1)
+    centers = np_rng.standard_normal((cluster_count, dim)).astype(np.float32)
+    centers /= np.linalg.norm(centers, axis=1, keepdims=True)
+
+    words, clusters, seen = [], [], set()
+    for cluster, (genre, related) in enumerate(groups):
+        for word in [genre] + related:
+            if word not in seen and len(words) < vocab_size:
+                seen.add(word); words.append(word); clusters.append(cluster)
+    while len(words) < vocab_size:
+        word = random_japanese_word(rng)
+        if word in seen:
+            continue
+        seen.add(word); words.append(word); clusters.append(rng.randrange(cluster_count))
+
+    # データの単語を頻度の高い位置（先頭付近）に散らばらせる
+    order = list(range(len(words)))
+    rng.shuffle(order)
+    words = [words[i] for i in order]
+    clusters = np.array([clusters[i] for i in order])
+
+    noise = np_rng.standard_normal((len(words), dim)).astype(np.float32) * (CLUSTER_SPREAD / np.sqrt(dim))
+    vectors = centers[clusters] + noise
+    return words, vectors
+
+
+def write_text_model(path, words, vectors):
+    """word2vec のテキスト形式で書き出す"""
+    with open(path, "w", encoding="utf-8", newline="\n") as f:
+        f.write(f"{len(words)} {vectors.shape[1]}\n")
+        for start in range(0, len(words), WRITE_CHUNK_ROWS):
+            chunk = vectors[start:start + WRITE_CHUNK_ROWS]
+            rows = [" ".join(row) for row in np.char.mod("%.5f", chunk)]
+            f.write("".join(f"{word} {row}\n" for word, row in zip(words[start:start + WRITE_CHUNK_ROWS], rows)))
+
+
+def write_binary_model(path, words, vectors):
+    """word2vec のバイナリ形式で書き出す"""
+    with open(path, "wb") as f:
+        f.write(f"{len(words)} {vectors.shape[1]}\n".encode("utf-8"))
+        for word, row in zip(words, vectors.astype(np.float32)):
+            f.write(word.encode("utf-8") + b" " + row.tobytes() + b"\n")
+
+
+def main():
+    """コマンドラインから合成モデルを書き出す"""
+    parser = argparse.ArgumentParser(description="ベンチマーク用の合成 word2vec モデルを作成します。")
+    parser.add_argument("output", help="出力ファイル")
+    parser.add_argument("--vocab", type=int, default=50000)
+    parser.add_argument("--dim", type=int, default=300)
+    parser.add_argument("--binary", action="store_true", help="バイナリ形式で書き出す")
+    parser.add_argument("--data-dir", default="data")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    words, vectors = generate_model(args.vocab, args.dim, args.data_dir, args.seed)
+    (write_binary_model if args.binary else write_text_model)(args.output, words, vectors)
+    print(f"{len(words)}語 × {args.dim}次元のモデルを {args.output} に書き出しました。")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+import os
+import json
+import heapq
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+
+import model_cache
+import compact_store
+
+# --- お題バンク作成の設定 ---
+# シードとなるジャンル語から、語彙全体を走査して「普通」「むずかしい」のお題候補を作る
+CHUNK_ROWS = 65536  # 1つの作業単位で調べる語彙の行数
+DEFAULT_POOL_SIZE = 300  # ジャンルごとに残す候補数
+DEFAULT_MIN_SIMILARITY = 0.3
+DENSITY_NEIGHBORS = 10  # 近傍密度を測るときに使う近傍の数
+CHECKPOINT_VERSION = 1
+
+# ワーカープロセスごとに1回だけ開くベクトル（mmap なので複数プロセスでメモリを共有する）
+_worker_state = {}
+
+
+def _init_worker(model_path, limit, seed_vectors, min_similarity, pool_size, allow_latin):
+    """ワーカープロセスでキャッシュを mmap で開いておく"""
+    words, vectors, norms = model_cache.load_cache(model_path, limit)
+    _worker_state.update(words=words, vectors=vectors, norms=norms, seeds=seed_vectors,
+                         min_similarity=min_similarity, pool_size=pool_size, allow_latin=allow_latin)
+
+
+def scan_chunk(chunk_id, start, end):
+    """語彙の一部とシード全体との類似度をまとめて計算し、シードごとの上位候補を返す"""
+    state = _worker_state
+    rows = np.array(state["vectors"][start:end], dtype=np.float32)  # mmap は読み取り専用なのでコピーする
+    rows /= np.maximum(np.asarray(state["norms"][start:end], dtype=np.float32), 1e-12)[:, None]
+    similarities = state["seeds"] @ rows.T  # (シード数, 行数)
+    results = []
+    for seed_similarities in similarities:
+        order = np.argsort(-seed_similarities)
+        found = []
+        for offset in order:
+            similarity = float(seed_similarities[offset])
+            if similarity < state["min_similarity"] or len(found) >= state["pool_size"]:
+                break
+            word = state["words"][start + offset]
+            if compact_store.is_allowed_word(word, state["allow_latin"]):
+                found.append((int(start + offset), similarity))
+        results.append(found)
+    return chunk_id, results
+
+
+def load_checkpoint(path, config_hash):
+    """途中経過を読み込む。設定が変わっていれば最初からやり直す"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            checkpoint = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    if checkpoint.get("version") != CHECKPOINT_VERSION or checkpoint.get("config_hash") != config_hash:
+        print("設定が変わっているため、途中経過を使わずに最初から作成します。")
+        return None
+    return checkpoint
+
+
+def save_checkpoint(path, checkpoint):
+    """途中経過を保存する（書き込み中に中断しても壊れないように置き換える）"""
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(checkpoint, f, ensure_ascii=False)
+    os.replace(path + ".tmp", path)
+
+
+def merge_candidates(current, found, pool_size):
+    """これまでの候補と新しい候補を合わせ、類似度の高い順に pool_size 件残す"""
+    merged = {row: similarity for row, similarity in current}
+    for row, similarity in found:
+        merged[row] = similarity
+    return heapq.nlargest(pool_size, merged.items(), key=lambda item: item[1])
+
+
+def score_difficulty(candidate_rows, candidate_similarities):
+    """候補ごとの難しさを 0〜1 で返す（シードから遠く、近傍がまばらなほど難しい）
+
+    近傍の密度はモデル全体ではなく、同じシードの候補どうしの類似度から測る。
+    """
+    seed_distance = 1.0 - np.asarray(candidate_similarities, dtype=np.float32)
+    if len(candidate_rows) > 1:
+        pairwise = candidate_rows @ candidate_rows.T
+        np.fill_diagonal(pairwise, -np.inf)
+        k = min(DENSITY_NEIGHBORS, len(candidate_rows) - 1)
+        density = np.sort(pairwise, axis=1)[:, -k:].mean(axis=1)
+    else:
+        density = np.ones(len(candidate_rows), dtype=np.float32)
+    return 0.5 * seed_distance + 0.5 * (1.0 - density)
+
+
+def read_seeds(args, key_to_index):
+    """コマンドライン引数とシードファイルからジャンル語を集める"""
+    seeds = list(args.seeds or [])
+    for path in args.seed_file or []:
+        with open(path, "r", encoding="utf-8") as f:
+            if path.endswith(".json"):
+                seeds.extend(json.load(f).keys())
+            else:
+                seeds.extend(line.strip() for line in f if line.strip())
+    unique = list(dict.fromkeys(seeds))
+    missing = [seed for seed in unique if seed not in key_to_index]
+    if missing:
+        print(f"モデルにないため無視するジャンル: {', '.join(missing)}")
+    return [seed for seed in unique if seed in key_to_index]
+
+
+def main():
+    """シードのジャンル語から「普通」「むずかしい」用のお題バンクを作成する"""
+    parser = argparse.ArgumentParser(description="シードのジャンルから大量のお題候補を作成し、難易度別のJSONに書き出します。")
+    parser.add_argument("model_path", help="モデルファイル (例: model/cc.ja.300.vec)")
+    parser.add_argument("--seeds", nargs="*", help="シードとなるジャンル語")
+    parser.add_argument("--seed-file", nargs="*", help="ジャンル語を書いたファイル（.json ならキー、それ以外は1行1語）")
+    parser.add_argument("--normal-out", default="normal_bank.json", help="「普通」用の出力ファイル")
+    parser.add_argument("--hard-out", default="hard_bank.json", help="「むずかしい」用の出力ファイル")
+    parser.add_argument("--per-genre", type=int, default=30, help="ジャンルごとに書き出すお題の数")
+    parser.add_argument("--pool-size", type=int, default=DEFAULT_POOL_SIZE)
+    parser.add_argument("--min-similarity", type=float, default=DEFAULT_MIN_SIMILARITY)
+    parser.add_argument("--allow-latin", action="store_true", help="英字だけの単語も候補にする")
+    parser.add_argument("--limit", type=int, default=None, help="読み込む語彙数の上限")
+    parser.add_argument("--workers", type=int, default=None, help="プロセス数（省略時はCPU数）")
+    parser.add_argument("--checkpoint", default="question_bank.checkpoint.json", help="途中経過の保存先")
+    args = parser.parse_args()
+
+    # キャッシュがなければ1回だけ作る（ワーカーはキャッシュを mmap で共有する）
+    if not model_cache.is_cache_valid(args.model_path, limit=args.limit):
+        import game_logic
+        if not game_logic.load_model(args.model_path, limit=args.limit):
+            return
+    words, vectors, norms = model_cache.load_cache(args.model_path, args.limit)
+    key_to_index = {}
+    for i, word in enumerate(words):
+        key_to_index.setdefault(word, i)
+
+    seeds = read_seeds(args, key_to_index)
+    if not seeds:
+        print("シードとなるジャンル語がありません。--seeds か --seed-file で指定してください。")
+        return
+    seed_ids = np.array([key_to_index[seed] for seed in seeds])
+    seed_vectors = np.asarray(vectors[seed_ids], dtype=np.float32)
+    seed_vectors /= np.maximum(np.asarray(norms[seed_ids], dtype=np.float32), 1e-12)[:, None]
+
+    config = {"source": model_cache.source_fingerprint(args.model_path), "limit": args.limit, "seeds": seeds,
+              "pool_size": args.pool_size, "min_similarity": args.min_similarity, "allow_latin": args.allow_latin,
+              "chunk_rows": CHUNK_ROWS}
+    config_hash = hashlib.sha1(json.dumps(config, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+    checkpoint = load_checkpoint(args.checkpoint, config_hash) or {
+        "version": CHECKPOINT_VERSION, "config_hash": config_hash, "done_chunks": [], "candidates": {seed: [] for seed in seeds}}
+    done = set(checkpoint["done_chunks"])
+    chunks = [(i, start, min(start + CHUNK_ROWS, len(words))) for i, start in enumerate(range(0, len(words), CHUNK_ROWS))]
+    todo = [chunk for chunk in chunks if chunk[0] not in done]
+    if done:
+        print(f"途中経過から再開します（{len(done)}/{len(chunks)} チャンク完了済み）")
+
+    executor = ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker,
+                                   initargs=(args.model_path, args.limit, seed_vectors, args.min_similarity, args.pool_size, args.allow_latin))
+    try:
+        futures = [executor.submit(scan_chunk, *chunk) for chunk in todo]
+        for future in as_completed(futures):
+            chunk_id, results = future.result()
+            for seed, found in zip(seeds, results):
+                checkpoint["candidates"][seed] = merge_candidates(checkpoint["candidates"][seed], found, args.pool_size)
+            checkpoint["done_chunks"].append(chunk_id)
+            # チャンクが終わるたびに保存するので、いつ中断しても続きから再開できる
+            save_checkpoint(args.checkpoint, checkpoint)
+            print(f"\r語彙を走査中... {len(checkpoint['done_chunks'])}/{len(chunks)} チャンク", end="", flush=True)
+        print()
+    except KeyboardInterrupt:
+        print("\n中断しました。同じコマンドをもう一度実行すると続きから再開します。")
+        return
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    # 同じ単語が複数のジャンルに入らないように、難易度ごとに書き出し済みの単語を覚えておく
+    normal_bank, hard_bank = {}, {}
+    normal_used, hard_used = set(), set()
+    for seed in seeds:
+        candidates = [(row, sim) for row, sim in checkpoint["candidates"][seed] if row != key_to_index[seed]]
+        if not candidates:
+            continue
+        rows = np.array([row for row, _ in candidates])
+        unit_rows = np.asarray(vectors[rows], dtype=np.float32)
+        unit_rows /= np.maximum(np.asarray(norms[rows], dtype=np.float32), 1e-12)[:, None]
+        difficulty = score_difficulty(unit_rows, [sim for _, sim in candidates])
+        order = np.argsort(difficulty)
+        ranked = [words[rows[i]] for i in order]
+        count = min(args.per_genre, len(ranked) // 2)
+        normal = [word for word in ranked if word not in normal_used][:count]
+        hard = [word for word in reversed(ranked) if word not in hard_used and word not in normal][:count][::-1]
+        if normal:
+            normal_bank[seed] = normal; normal_used.update(normal)
+        if hard:
+            hard_bank[seed] = hard; hard_used.update(hard)
+
+    for path, bank in ((args.normal_out, normal_bank), (args.hard_out, hard_bank)):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(bank, f, indent=2, ensure_ascii=False)
+    print(f"{len(normal_bank)}ジャンルのお題を {args.normal_out} と {args.hard_out} に書き出しました。")
+
+
+if __name__ == "__main__":
+    main()
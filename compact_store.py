@@ -0,0 +1,319 @@
+import os
+import re
+import json
+import hashlib
+import argparse
+
+import lazy_import
+import model_cache
+
+np = lazy_import.lazy_module("numpy")
+
+# --- 省メモリなベクトルストアの設定 ---
+# L2正規化したベクトルを float16 または int8（行ごとのスケール付き）で保持する
+SUPPORTED_DTYPES = ("float16", "int8")
+DEFAULT_TOP_N = 300000  # 頻度順の上位何語までを残すか
+SCAN_CHUNK_ROWS = 32768  # 全語彙との内積をこの行数ずつ float32 に戻して計算する
+
+# ひらがな・カタカナ・漢字（々や長音記号を含む）だけでできた単語
+JAPANESE_WORD_PATTERN = re.compile(r"^[ぁ-ゟ゠-ヿ㐀-䶿一-鿿々〆]+$")
+LATIN_WORD_PATTERN = re.compile(r"^[A-Za-zＡ-Ｚａ-ｚ]+$")
+
+
+class CompactVectorStore:
+    """正規化済みベクトルを量子化して保持するストア
+
+    KeyedVectors と同じように `in`・similarity・most_similar が使えるので、
+    game_logic のモデルとしてそのまま差し替えられる。
+    """
+
+    def __init__(self, words, data, scales=None, source_ids=None):
+        self.index_to_key = words
+        self.key_to_index = {}
+        for i, word in enumerate(words):
+            self.key_to_index.setdefault(word, i)
+        self.data = data
+        self.scales = scales
+        self.source_ids = source_ids
+        self.vector_size = data.shape[1]
+
+    def __contains__(self, word):
+        return word in self.key_to_index
+
+    def __len__(self):
+        return len(self.index_to_key)
+
+    @property
+    def nbytes(self):
+        """ベクトルの保持に使っているバイト数"""
+        return self.data.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+
+    def unit_rows(self, ids):
+        """指定した行を float32 の単位ベクトルとして返す"""
+        rows = np.asarray(self.data[ids], dtype=np.float32)
+        if self.scales is not None:
+            rows *= np.asarray(self.scales[ids], dtype=np.float32)[..., None]
+        return rows
+
+    def get_vector(self, word, norm=True):
+        """単語の単位ベクトルを返す（このストアは常に正規化済み）"""
+        return self.unit_rows(self.key_to_index[word])
+
+    def similarity(self, word1, word2):
+        """2つの単語のコサイン類似度を返す"""
+        return float(np.dot(self.get_vector(word1), self.get_vector(word2)))
+
+    def dot_all(self, query):
+        """単位ベクトル query と全語彙とのコサイン類似度を返す"""
+        query = np.asarray(query, dtype=np.float32)
+        scores = np.empty(len(self), dtype=np.float32)
+        for start in range(0, len(self), SCAN_CHUNK_ROWS):
+            end = min(start + SCAN_CHUNK_ROWS, len(self))
+            scores[start:end] = self.unit_rows(slice(start, end)) @ query
+        return scores
+
+    def most_similar(self, positive, topn=10):
+        """単語に近い順に (単語, 類似度) のリストを返す"""
+        word = positive if isinstance(positive, str) else positive[0]
+        if word not in self:
+            raise KeyError(f"Key '{word}' not present")
+        index = self.key_to_index[word]
+        scores = self.dot_all(self.unit_rows(index))
+        scores[index] = -np.inf  # 自分自身は除く
+        topn = min(topn, len(self) - 1)
+        if topn <= 0:
+            return []
+        best = np.argpartition(-scores, topn - 1)[:topn]
+        best = best[np.argsort(-scores[best])]
+        return [(self.index_to_key[i], float(scores[i])) for i in best]
+
+    def save(self, directory, meta=None):
+        """ストアをフォルダに保存する
+
+        どのファイルも一時ファイルに書いてから置き換え、meta.json を最後に書く。
+        途中で止まっても meta.json がなければ読み込み側は作り直す。
+        """
+        os.makedirs(directory, exist_ok=True)
+        meta_path = os.path.join(directory, "meta.json")
+        if os.path.exists(meta_path):
+            os.remove(meta_path)
+        arrays = {"data": self.data, "scales": self.scales, "source_ids": self.source_ids}
+        for name, array in arrays.items():
+            if array is None:
+                continue
+            path = os.path.join(directory, name + ".npy")
+            with open(path + ".tmp", "wb") as f:
+                np.save(f, np.asarray(array))
+            os.replace(path + ".tmp", path)
+        vocab_path = os.path.join(directory, "vocab.txt")
+        with open(vocab_path + ".tmp", "w", encoding="utf-8", newline="\n") as f:
+            f.write("\n".join(self.index_to_key))
+        os.replace(vocab_path + ".tmp", vocab_path)
+        meta = dict(meta or {}, dtype=str(self.data.dtype), count=len(self))
+        with open(meta_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=2, ensure_ascii=False)
+        os.replace(meta_path + ".tmp", meta_path)
+
+    @classmethod
+    def load(cls, directory, mmap=True):
+        """保存したストアを読み込む（mmap=True ならメモリマップで開く）"""
+        mmap_mode = "r" if mmap else None
+        data = np.load(os.path.join(directory, "data.npy"), mmap_mode=mmap_mode)
+        scales_path = os.path.join(directory, "scales.npy")
+        scales = np.load(scales_path, mmap_mode=mmap_mode) if os.path.exists(scales_path) else None
+        ids_path = os.path.join(directory, "source_ids.npy")
+        source_ids = np.load(ids_path, mmap_mode=mmap_mode) if os.path.exists(ids_path) else None
+        with open(os.path.join(directory, "vocab.txt"), "r", encoding="utf-8", newline="\n") as f:
+            words = f.read().split("\n")
+        return cls(words, data, scales, source_ids)
+
+
+def get_store_dir(model_path, dtype, limit=None):
+    """省メモリストアの保存先フォルダを返す"""
+    base = os.path.join(model_cache.get_cache_dir(model_path), os.path.basename(model_path))
+    if limit:
+        base += f".top{limit}"
+    return f"{base}.compact-{dtype}"
+
+
+def read_store_meta(directory):
+    """ストアのメタ情報を返す（なければ None）"""
+    try:
+        with open(os.path.join(directory, "meta.json"), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def is_allowed_word(word, allow_latin=False):
+    """文字種のルールでお題や推測に使える単語かを判定する"""
+    if JAPANESE_WORD_PATTERN.match(word):
+        return True
+    # 英字は許可した場合だけ。日本語との混在（"abcです" など）は常に除く
+    return allow_latin and bool(LATIN_WORD_PATTERN.match(word))
+
+
+def collect_keep_words(data_dir="data"):
+    """data/*.json に出てくるジャンル名・例示語・お題を必ず残す単語として集める"""
+    keep = set()
+
+    def walk(value):
+        if isinstance(value, str):
+            keep.add(value)
+        elif isinstance(value, list):
+            for item in value:
+                walk(item)
+        elif isinstance(value, dict):
+            for key, item in value.items():
+                if key != "example_words":
+                    keep.add(key)
+                walk(item)
+
+    for name in sorted(os.listdir(data_dir)):
+        if name.endswith(".json"):
+            with open(os.path.join(data_dir, name), "r", encoding="utf-8") as f:
+                walk(json.load(f))
+    return keep
+
+
+def build_options(top_n=DEFAULT_TOP_N, script_filter=True, allow_latin=False):
+    """絞り込みの条件をメタ情報に保存する形の辞書にする"""
+    return {"top_n": top_n, "script_filter": script_filter, "allow_latin": allow_latin}
+
+
+def build_signature(keep_words, options):
+    """必ず残す単語と絞り込みの条件からハッシュを作る（お題データが変わったら作り直すため）"""
+    payload = json.dumps({"keep_words": sorted(keep_words), "options": options}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def select_vocabulary(words, top_n=DEFAULT_TOP_N, script_filter=True, allow_latin=False, keep_words=()):
+    """フィルターを通過した単語の行番号（頻度順）を返す"""
+    keep_words = set(keep_words)
+    selected = []
+    seen = set()
+    for i, word in enumerate(words):
+        if word in seen:
+            continue
+        if word in keep_words:
+            selected.append(i); seen.add(word)
+            continue
+        if top_n and i >= top_n:
+            continue
+        if script_filter and not is_allowed_word(word, allow_latin):
+            continue
+        selected.append(i); seen.add(word)
+    return np.asarray(selected, dtype=np.int64)
+
+
+def quantize_rows(rows, dtype):
+    """単位ベクトルの行を量子化し、(データ, スケール) を返す"""
+    if dtype == "float16":
+        return rows.astype(np.float16), None
+    if dtype == "int8":
+        peak = np.maximum(np.abs(rows).max(axis=1, keepdims=True), 1e-12)
+        quantized = np.round(rows / peak * 127).astype(np.int8)
+        # 復元したベクトルのノルムがちょうど1になるようにスケールを決める
+        norms = np.linalg.norm(quantized.astype(np.float32), axis=1)
+        return quantized, (1.0 / np.maximum(norms, 1e-12)).astype(np.float32)
+    raise ValueError(f"未対応の型です: {dtype}")
+
+
+def build_compact_store(kv, dtype="float16", top_n=DEFAULT_TOP_N, script_filter=True, allow_latin=False, keep_words=()):
+    """KeyedVectors から語彙を絞り込み、量子化したストアを作る"""
+    ids = select_vocabulary(kv.index_to_key, top_n, script_filter, allow_latin, keep_words)
+    kv.fill_norms()
+    itemtype = np.float16 if dtype == "float16" else np.int8
+    data = np.empty((len(ids), kv.vector_size), dtype=itemtype)
+    scales = np.empty(len(ids), dtype=np.float32) if dtype == "int8" else None
+    for start in range(0, len(ids), SCAN_CHUNK_ROWS):
+        chunk = ids[start:start + SCAN_CHUNK_ROWS]
+        rows = np.asarray(kv.vectors[chunk], dtype=np.float32)
+        rows /= np.maximum(np.asarray(kv.norms[chunk], dtype=np.float32), 1e-12)[:, None]
+        quantized, chunk_scales = quantize_rows(rows, dtype)
+        data[start:start + len(chunk)] = quantized
+        if scales is not None:
+            scales[start:start + len(chunk)] = chunk_scales
+    words = [kv.index_to_key[i] for i in ids]
+    return CompactVectorStore(words, data, scales, ids)
+
+
+def compare_with_full(kv, store, query_words=(), pair_count=10000, topn=10, seed=0):
+    """フルの float32 モデルと比べて、メモリ削減量と類似度の誤差をまとめる"""
+    rng = np.random.default_rng(seed)
+    kv.fill_norms()
+    full_bytes = kv.vectors.nbytes + kv.norms.nbytes
+
+    def full_unit(source_ids):
+        rows = np.asarray(kv.vectors[source_ids], dtype=np.float32)
+        return rows / np.maximum(np.asarray(kv.norms[source_ids], dtype=np.float32), 1e-12)[..., None]
+
+    # ランダムな単語ペアで類似度の誤差を測る
+    a = rng.integers(0, len(store), pair_count)
+    b = rng.integers(0, len(store), pair_count)
+    full_sims = np.einsum("ij,ij->i", full_unit(store.source_ids[a]), full_unit(store.source_ids[b]))
+    compact_sims = np.einsum("ij,ij->i", store.unit_rows(a), store.unit_rows(b))
+    errors = np.abs(full_sims - compact_sims)
+
+    # ジャンル語などで近傍上位 topn の一致率を測る
+    overlaps = []
+    coverages = []
+    for word in query_words:
+        if word not in store or word not in kv:
+            continue
+        compact_top = {w for w, _ in store.most_similar(word, topn=topn)}
+        # 同じ語彙の中でフル精度のまま計算した上位 topn（量子化だけの影響）
+        full_scores = np.empty(len(store), dtype=np.float32)
+        query = kv.get_vector(word, norm=True)
+        for start in range(0, len(store), SCAN_CHUNK_ROWS):
+            full_scores[start:start + SCAN_CHUNK_ROWS] = full_unit(store.source_ids[start:start + SCAN_CHUNK_ROWS]) @ query
+        full_scores[store.key_to_index[word]] = -np.inf
+        full_top = {store.index_to_key[i] for i in np.argsort(-full_scores)[:topn]}
+        overlaps.append(len(compact_top & full_top) / topn)
+        # 語彙の絞り込みで元のモデルの上位 topn がどれだけ残ったか
+        original_top = [w for w, _ in kv.most_similar(word, topn=topn)]
+        coverages.append(sum(1 for w in original_top if w in store) / topn)
+
+    return {
+        "dtype": str(store.data.dtype),
+        "full_vocab": len(kv.index_to_key),
+        "compact_vocab": len(store),
+        "full_bytes": int(full_bytes),
+        "compact_bytes": int(store.nbytes),
+        "memory_saved_ratio": 1 - store.nbytes / full_bytes if full_bytes else 0.0,
+        "similarity_mean_abs_error": float(errors.mean()) if len(errors) else 0.0,
+        "similarity_max_abs_error": float(errors.max()) if len(errors) else 0.0,
+        f"top{topn}_overlap": float(np.mean(overlaps)) if overlaps else None,
+        f"top{topn}_kept_after_pruning": float(np.mean(coverages)) if coverages else None,
+        "query_words": len(overlaps),
+    }
+
+
+def main():
+    """コマンドラインから省メモリストアを作成し、レポートを表示する"""
+    parser = argparse.ArgumentParser(description="モデルの語彙を絞り込み、量子化したベクトルストアを作成します。")
+    parser.add_argument("model_path", help="元のモデルファイル (例: model/cc.ja.300.vec)")
+    parser.add_argument("--dtype", choices=SUPPORTED_DTYPES, default="float16")
+    parser.add_argument("--top-n", type=int, default=DEFAULT_TOP_N, help="頻度順で残す語数（0なら制限なし）")
+    parser.add_argument("--no-script-filter", action="store_true", help="文字種による絞り込みを行わない")
+    parser.add_argument("--allow-latin", action="store_true", help="英字だけの単語も残す")
+    parser.add_argument("--data-dir", default="data", help="必ず残す単語を集めるフォルダ")
+    parser.add_argument("--limit", type=int, default=None, help="元のモデルから読み込む語数")
+    args = parser.parse_args()
+
+    import game_logic
+    if not game_logic.load_model(args.model_path, limit=args.limit):
+        return
+    kv = game_logic.get_model()
+    keep_words = collect_keep_words(args.data_dir)
+    store = build_compact_store(kv, args.dtype, args.top_n, not args.no_script_filter, args.allow_latin, keep_words)
+    options = build_options(args.top_n, not args.no_script_filter, args.allow_latin)
+    store.save(get_store_dir(args.model_path, args.dtype, args.limit),
+               {"source": model_cache.source_fingerprint(args.model_path), "options": options,
+                "build": build_signature(keep_words, options)})
+    report = compare_with_full(kv, store, query_words=sorted(keep_words))
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,113 @@
+import startup_report  # 起動時間を計るため最初に読み込む
 import os
+import sys
+import json
 import time
+import asyncio
+import argparse
+import threading
+import contextlib
+import lazy_import
+import model_registry
+import history_store
+from guess_ranking import GuessRanking
 # game_logic.pyから必要な関数や変数をインポート
 from game_logic import (
     load_model,
     load_json_data,
+    load_settings,
+    prepare_neighbor_index,
+    prepare_word_index,
+    prepare_easy_data,
     generate_question_by_difficulty,
-    check_similarity,
-    word_exists
+    check_similarity_with_rank,
+    check_similarity_batch,
+    create_similarity_table,
+    resolve_word,
+    word_exists,
+    get_state
 )
 
-def play_game_cui(question, time_limit, genre=None):
-    """CUIでゲームをプレイするための関数"""
-    start_time = time.time()
-    guessed_words = {}
+DEFAULT_TIME_LIMIT = 180  # 設定にない難易度の制限時間
+
+
+class StdinReader:
+    """標準入力を別スレッドで1行ずつ読み、asyncio のキューに渡す
+
+    入力を待っている間も制限時間を見張れるように、ブロックする読み込みだけをスレッドに任せる。
+    """
+
+    def __init__(self):
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue()
+        self._thread = threading.Thread(target=self._run, name="StdinReader", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            line = sys.stdin.readline()
+            try:
+                self._loop.call_soon_threadsafe(self._queue.put_nowait, line.rstrip("\n") if line else None)
+            except RuntimeError:
+                return  # イベントループがもう閉じている
+            if not line:
+                return
+
+    async def readline(self, timeout=None):
+        """1行を返す。入力が終わったら None、timeout 秒を過ぎたら asyncio.TimeoutError"""
+        return await asyncio.wait_for(self._queue.get(), timeout)
+
+
+def judge_guess(question, typed, ranking, table=None):
+    """推測を1つ判定して、結果の辞書を返す（推測済みでなければ ranking に追加する）"""
+    # 「りんご」と「リンゴ」のような表記ゆれは語彙の表記に直してから判定する
+    resolved = resolve_word(typed) if typed else None
+    if typed == question or resolved == question:
+        return {"input": typed, "word": question, "status": "correct"}
+    if resolved is None:
+        return {"input": typed, "word": None, "status": "unknown"}
+    if resolved in ranking:
+        return {"input": typed, "word": resolved, "status": "duplicate"}
+    similarity, rank = check_similarity_with_rank(question, resolved, table)
+    ranking.add(resolved, similarity)
+    return {"input": typed, "word": resolved, "status": "scored", "similarity": float(similarity),
+            "rank": int(rank) if rank is not None else None}
+
+
+def print_ranking(ranking):
+    top_rows, bottom_rows = ranking.display_rows(5)
+    print("\n--- ヒント: 推測単語ランキング ---")
+    if not bottom_rows:
+        for place, word, sim in top_rows:
+            print(f"{place}位: {word}")
+    else:
+        print("【正解に近いトップ5】")
+        for place, word, sim in top_rows: print(f"{place}位: {word}")
+        print("...")
+        print("【正解から遠いワースト5】")
+        for place, word, sim in bottom_rows:
+            print(f"{place}位: {word}")
+
+
+async def play_game_cui(question, time_limit, genre=None, reader=None, history=None, session_id=None):
+    """CUIでゲームをプレイするための関数
+
+    入力待ちの途中でも制限時間が来た時点でゲームを終える。
+    結果を "correct" / "giveup" / "timeout" / "eof"（入力の終わり）で返す。
+    history と session_id を渡すと、推測と結果を履歴に記録する（入力の終わりは abandoned として記録する）。
+    """
+    outcome = await _play_game_cui(question, time_limit, genre, reader or StdinReader(), history, session_id)
+    if history:
+        history.finish_session(session_id, {"correct": "won", "giveup": "gave_up", "eof": history_store.ABANDONED}.get(outcome, outcome))
+    return outcome
+
+
+async def _play_game_cui(question, time_limit, genre, reader, history, session_id):
+    # 壁時計が変わっても影響を受けないように、単調増加する時計で締め切りを決める
+    deadline = time.monotonic() + time_limit
+    ranking = GuessRanking()
+    # 全語彙との類似度・順位の表を裏で作っておき、推測ごとの計算は表を引くだけにする
+    table = create_similarity_table(question)
 
     print("\n--- ゲームスタート！ ---")
     if genre and "ジャンル指定なし" not in genre:
@@ -21,80 +116,304 @@ def play_game_cui(question, time_limit, genre=None):
     print("お題となる単語を推測してください。ギブアップする場合は 'giveup' と入力してください。")
 
     while True:
-        elapsed_time = time.time() - start_time
-        remaining_time = time_limit - elapsed_time
+        remaining_time = deadline - time.monotonic()
         if remaining_time <= 0:
             print(f"\n時間切れ！正解は「{question}」でした。")
-            return
+            return "timeout"
 
-        guess = input(f"\n残り時間: {int(remaining_time)}秒 | 推測した単語を入力: ").strip()
+        print(f"\n残り時間: {int(remaining_time)}秒 | 推測した単語を入力: ", end="", flush=True)
+        try:
+            guess = await reader.readline(timeout=remaining_time)
+        except asyncio.TimeoutError:
+            print(f"\n\n時間切れ！正解は「{question}」でした。")
+            return "timeout"
+        if guess is None:
+            print(f"\n入力が終わったため終了します。正解は「{question}」でした。")
+            return "eof"
+        guess = guess.strip()
 
         if guess.lower() == 'giveup':
             print(f"\nギブアップしました。正解は「{question}」でした。")
-            return
-        
-        if guess == question:
-            print(f"\n★★ 正解！おめでとうございます！正解は「{question}」でした！ ★★")
-            return
+            return "giveup"
 
-        if not word_exists(guess):
+        result = judge_guess(question, guess, ranking, table)
+        if history:
+            history.record_guess(session_id, result["input"], result["word"], result["status"], result.get("similarity"), result.get("rank"))
+        if result["status"] == "correct":
+            print(f"\n★★ 正解！おめでとうございます！正解は「{question}」でした！ ★★")
+            return "correct"
+        if result["status"] == "unknown":
             print("その単語は辞書にありません。別の単語を試してください。")
             continue
-        
-        if guess in guessed_words:
+        if result["word"] != guess:
+            print(f"「{guess}」を「{result['word']}」として判定します。")
+        if result["status"] == "duplicate":
             print("その単語は既に推測済みです。")
             continue
 
-        similarity = check_similarity(question, guess)
-        guessed_words[guess] = similarity
-        print(f"「{guess}」... 正解との近さ: {similarity:.4f}")
-
-        if guessed_words:
-            sorted_guesses = sorted(guessed_words.items(), key=lambda item: item[1], reverse=True)
-            total_guesses = len(sorted_guesses)
-            print("\n--- ヒント: 推測単語ランキング ---")
-            if total_guesses <= 10:
-                for i, (word, sim) in enumerate(sorted_guesses):
-                    print(f"{i + 1}位: {word}")
-            else:
-                print("【正解に近いトップ5】")
-                for i, (word, sim) in enumerate(sorted_guesses[:5]): print(f"{i + 1}位: {word}")
-                print("...")
-                print("【正解から遠いワースト5】")
-                for i, (word, sim) in enumerate(sorted_guesses[-5:]):
-                    rank = total_guesses - 5 + i + 1
-                    print(f"{rank}位: {word}")
+        rank_text = f"（{result['rank']:,}番目に近い単語）" if result["rank"] is not None else ""
+        print(f"「{result['word']}」... 正解との近さ: {result['similarity']:.4f}{rank_text}")
+        print_ranking(ranking)
 
 
-# --- メインの実行ブロック ---
-if __name__ == "__main__":
-    # 設定
-    MODEL_FILE_NAME = "jawiki.entity_vectors.300d.txt"
-    model_path = os.path.join("model", MODEL_FILE_NAME)
+def replay_game(question, inputs, with_ranks=True):
+    """記録した推測を順に判定し、1ゲーム分の結果の辞書を返す
+
+    判定（表記ゆれ・推測済み・正解）を先に済ませ、類似度と順位は最後にまとめて1回の行列演算で求める。
+    正解した後の推測は判定しない。
+    """
+    results = []
+    scored = []
+    seen = set()
+    for typed in inputs:
+        typed = str(typed).strip()
+        resolved = resolve_word(typed) if typed else None
+        if typed == question or resolved == question:
+            results.append({"input": typed, "word": question, "status": "correct"})
+            break
+        if resolved is None:
+            results.append({"input": typed, "word": None, "status": "unknown"})
+        elif resolved in seen:
+            results.append({"input": typed, "word": resolved, "status": "duplicate"})
+        else:
+            seen.add(resolved)
+            scored.append(len(results))
+            results.append({"input": typed, "word": resolved, "status": "scored"})
+
+    ranking = GuessRanking()
+    if scored:
+        words = [results[i]["word"] for i in scored]
+        batch = check_similarity_batch([question] * len(words), words, with_ranks)
+        for i, similarity, rank in zip(scored, batch.similarities, batch.ranks):
+            results[i]["similarity"] = float(similarity)
+            results[i]["rank"] = int(rank) if rank >= 0 else None
+            ranking.add(results[i]["word"], float(similarity))
+    best = ranking.best() if len(ranking) else None
+    # 履歴（history_store）と同じく、語彙にない単語と推測済みの単語は回数に数えない
+    guess_count = sum(result["status"] in ("scored", "correct") for result in results)
+    return {"question": question, "solved": bool(results) and results[-1]["status"] == "correct",
+            "guess_count": guess_count, "best": {"word": best[0], "similarity": float(best[1])} if best else None,
+            "results": results}
 
-    # 1. モデルとデータを読み込む
-    if load_model(model_path):
+
+def play_batch_game(game, data, with_ranks=True):
+    """バッチの1行（1ゲーム）を再生して結果の辞書を返す
+
+    {"question": "りんご", "guesses": [...]} の形。"question" の代わりに "difficulty" を書くとお題を生成する。
+    """
+    question, genre, guesses = game.get("question"), game.get("genre"), game.get("guesses", [])
+    if question is not None and not isinstance(question, str):
+        return {"error": "\"question\" は文字列で指定してください。"}
+    if not isinstance(guesses, list) or not all(isinstance(guess, str) for guess in guesses):
+        return {"error": "\"guesses\" は文字列のリストで指定してください。"}
+    if not question:
+        question, genre = generate_question_by_difficulty(str(game.get("difficulty", "1")), *data)
+        if not question:
+            return {"error": "お題を生成できませんでした。"}
+    elif not word_exists(question):
+        return {"question": question, "error": "お題が語彙にありません。"}
+    start = time.perf_counter()
+    result = replay_game(question, guesses, with_ranks)
+    result.update(genre=genre, seconds=time.perf_counter() - start)
+    return result
+
+
+def run_batch(source, out, data, with_ranks=True):
+    """JSON Lines のゲームを1つのモデルで続けて再生し、1ゲームごとに結果を1行の JSON で out に書く
+
+    再生できなかった（"error" を出した）行の数を返す。
+    """
+    games = solved = errors = 0
+    start = time.perf_counter()
+    for line_no, line in enumerate(source, 1):
+        line = line.strip()
+        if not line:
+            continue
+        result = {"line": line_no}
+        try:
+            game = json.loads(line)
+            if not isinstance(game, dict):
+                raise ValueError("1行に1つの JSON オブジェクトを書いてください。")
+        except ValueError as e:
+            result["error"] = f"行を読めませんでした: {e}"
+        else:
+            if "id" in game:
+                result["id"] = game["id"]
+            result.update(play_batch_game(game, data, with_ranks))
+        games += "error" not in result
+        errors += "error" in result
+        solved += bool(result.get("solved"))
+        out.write(json.dumps(result, ensure_ascii=False) + "\n")
+        out.flush()
+    elapsed = time.perf_counter() - start
+    print(f"{games}ゲームを再生しました（正解 {solved}、{elapsed:.2f}秒）。")
+    if errors:
+        print(f"{errors}行は再生できませんでした。")
+    return errors
+
+
+def print_load_progress(progress):
+    """モデル読み込みの進捗を1行で上書き表示する"""
+    eta_text = f" 残り約{int(progress.eta)}秒" if progress.eta is not None else ""
+    end = "\n" if progress.words_parsed >= progress.total_words else ""
+    print(f"\r読み込み中... {progress.fraction:6.1%} ({progress.words_parsed:,}/{progress.total_words:,}語){eta_text}    ", end=end, flush=True)
+
+
+def load_game_data():
+    """お題データを読み込み、(かんたん, 普通, むずかしい) のデータを返す。失敗したら None"""
+    with startup_report.stage("data"):
         easy_data = load_json_data(os.path.join("data", "easy_data.json"))
         normal_data = load_json_data(os.path.join("data", "normal_data.json"))
         hard_data = load_json_data(os.path.join("data", "hard_data.json"))
+    if not all([easy_data, normal_data, hard_data]):
+        print("\nデータファイルの読み込みに失敗したため、プログラムを終了します。")
+        return None
+    return easy_data, normal_data, hard_data
 
-        if not all([easy_data, normal_data, hard_data]):
-            print("\nデータファイルの読み込みに失敗したため、プログラムを終了します。")
-        else:
-            # 2. 難易度を選択してもらう
-            print("\n言葉の近さからお題を当てるゲーム！")
+
+def prepare_model(settings, model_path, easy_data, progress_callback=print_load_progress):
+    """数値計算ライブラリとモデルを読み込み、索引を用意する。読み込めたら True"""
+    try:
+        with startup_report.stage("numeric_import"):
+            lazy_import.load("numpy")
+    except ImportError as e:
+        print(f"\n数値計算ライブラリを読み込めませんでした: {e}")
+        return False
+    with startup_report.stage("model"):
+        if not load_model(model_path, limit=settings["vocab_limit"], progress_callback=progress_callback, store=settings["vector_store"]):
+            return False
+    with startup_report.stage("indexes"):
+        prepare_neighbor_index(model_path, settings["neighbor_backend"], settings["neighbor_nprobe"])
+        prepare_word_index()
+        prepare_easy_data(easy_data)
+    startup_report.finish("model_ready")
+    return True
+
+
+def load_game(settings, model_path):
+    """お題データとモデルを順に読み込み、お題データを返す。失敗したら None"""
+    data = load_game_data()
+    if not data or not prepare_model(settings, model_path, data[0]):
+        return None
+    return data
+
+
+async def wait_for_model(task, latest):
+    """裏で読み込んでいるモデルを待つ。待つ間は進捗を表示し、読み込めたかを返す"""
+    if not task.done():
+        print("\nモデルを読み込んでいます...", flush=True)
+        shown = None
+        while not task.done():
+            await asyncio.wait([task], timeout=0.2)
+            progress = latest.get("progress")
+            if progress is not None and progress is not shown:
+                print_load_progress(progress)
+                shown = progress
+        if shown is not None and shown.words_parsed < shown.total_words:
+            print()
+    if not task.result():
+        print("\nモデルを読み込めなかったため、プログラムを終了します。")
+        return False
+    return True
+
+
+async def play_interactive(settings, model_path, data, difficulty=None, time_limit=None):
+    """難易度を選んでゲームを遊ぶ。続けて遊ぶかどうかも聞く
+
+    難易度を聞いている間に、数値計算ライブラリとモデルを裏のスレッドで読み込んでおく。
+    モデルが読み込めないなどでゲームを始められなかったときは False を返す。
+    """
+    reader = StdinReader()
+    history = history_store.open_store(settings["history_file"])
+    # 進捗は入力中の行を崩さないように保存だけしておき、待つときに表示する
+    latest = {}
+    model_task = asyncio.get_running_loop().run_in_executor(
+        None, prepare_model, settings, model_path, data[0], lambda progress: latest.update(progress=progress))
+    try:
+        return await _play_rounds(settings, data, difficulty, time_limit, reader, history, model_task, latest)
+    finally:
+        if history:
+            history.close()
+
+
+async def _play_rounds(settings, data, difficulty, time_limit, reader, history, model_task, latest):
+    print("\n言葉の近さからお題を当てるゲーム！")
+    while True:
+        # 2. 難易度を選択してもらう
+        selected_difficulty = difficulty
+        if selected_difficulty is None:
             print("難易度を選択してください。")
-            selected_difficulty = input("1: かんたん, 2: 普通, 3: むずかしい -> ")
-
-            # 3. お題を生成
-            question, genre = generate_question_by_difficulty(selected_difficulty, easy_data, normal_data, hard_data)
-
-            if not question:
-                print("\nお題を生成できませんでした。プログラムを終了します。")
-            else:
-                # 4. ゲームプレイを開始
-                if selected_difficulty == "1": time_limit = 300
-                elif selected_difficulty == "2": time_limit = 240
-                else: time_limit = 180
-                
-                play_game_cui(question, time_limit, genre)
\ No newline at end of file
+            print("1: かんたん, 2: 普通, 3: むずかしい -> ", end="", flush=True)
+            startup_report.mark("interactive")
+            selected_difficulty = await reader.readline()
+            if selected_difficulty is None:
+                return True
+            selected_difficulty = selected_difficulty.strip()
+        if not await wait_for_model(model_task, latest):
+            return False
+
+        # 3. お題を生成
+        question, genre = generate_question_by_difficulty(selected_difficulty, *data)
+        if not question:
+            print("\nお題を生成できませんでした。プログラムを終了します。")
+            return False
+
+        # 4. ゲームプレイを開始
+        limit = time_limit or settings["time_limits"].get(selected_difficulty, DEFAULT_TIME_LIMIT)
+        session_id = history.start_session(question, genre, selected_difficulty, settings["player_name"],
+                                           os.path.basename(get_state().source_path or ""), limit) if history else None
+        if await play_game_cui(question, limit, genre, reader, history, session_id) == "eof":
+            return True
+        print("\nもう一度遊びますか？ (y/n) -> ", end="", flush=True)
+        answer = await reader.readline()
+        if answer is None or answer.strip().lower() not in ("y", "yes", "はい"):
+            return True
+
+
+def main():
+    """CUI版を起動する（--batch なら記録した推測を再生して結果を JSON Lines で出力する）
+
+    終了コードを返す。データやモデルを読み込めなかったとき、バッチで再生できない行があったときは 1。
+    """
+    parser = argparse.ArgumentParser(description="言葉の近さからお題を当てるゲーム（CUI版）")
+    parser.add_argument("--model", default=None, help="モデルファイル（省略時は settings.json の model_file）")
+    parser.add_argument("--difficulty", choices=["1", "2", "3"], default=None, help="難易度（省略時は起動後に選ぶ）")
+    parser.add_argument("--time-limit", type=int, default=None, help="制限時間（秒、省略時は設定の値）")
+    parser.add_argument("--batch", metavar="FILE", default=None, help="推測を記録した JSON Lines を再生する（- なら標準入力）")
+    parser.add_argument("--out", default=None, help="バッチの結果の出力先（省略時は標準出力）")
+    parser.add_argument("--no-ranks", action="store_true", help="バッチで順位を求めない（類似度だけなら速い）")
+    args = parser.parse_args()
+
+    # 設定（使うモデルは settings.json の "model_file" で選ぶ）
+    with startup_report.stage("settings"):
+        settings = load_settings()
+        model_path = args.model or model_registry.resolve_model_path(settings["model_file"])
+
+    if args.batch is None:
+        # 1. お題データを読み込む（モデルは難易度を選んでいる間に裏で読み込む）
+        data = load_game_data()
+        if not data or not asyncio.run(play_interactive(settings, model_path, data, args.difficulty, args.time_limit)):
+            return 1
+        return 0
+
+    out = open(args.out, "w", encoding="utf-8") if args.out else sys.stdout
+    source = sys.stdin if args.batch == "-" else open(args.batch, "r", encoding="utf-8")
+    try:
+        # 読み込みの進捗やゲームロジックの print が結果に混ざらないように標準エラー出力へ回す
+        with contextlib.redirect_stdout(sys.stderr):
+            data = load_game(settings, model_path)
+            if not data:
+                return 1
+            # 回帰確認に使うので、再生できない行があれば失敗として終わる
+            return 1 if run_batch(source, out, data, with_ranks=not args.no_ranks) else 0
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if out is not sys.stdout:
+            out.close()
+
+
+# --- メインの実行ブロック ---
+if __name__ == "__main__":
+    startup_report.mark("imports")
+    sys.exit(main())
@@ -2,28 +2,181 @@ import os
 import random
 import time
 import json
-from gensim.models import KeyedVectors
+import tempfile
+import model_cache
+import vec_parser
+import compact_store
+import similarity_table
+import batch_similarity
+import neighbor_index as neighbor_index_module
+import genre_cache
+import metrics
+import model_registry
+import word_index
+import neighbor_cache
 
-# --- グローバル変数としてモデルを保持 ---
-# アプリケーション起動時に一度だけ読み込む
-model = None
+# 「かんたん」モードのお題生成の設定
+EASY_SIMILARITY_THRESHOLD = 0.6
+EASY_RELATED_WORD_COUNT = 200
+EASY_RANDOM_CANDIDATE_COUNT = 5
 
 SETTINGS_FILE = "settings.json"
 
-def load_model(model_path):
-    """モデルを読み込み、グローバル変数に格納する"""
-    global model
+class ModelState:
+    """読み込んだモデルと、それに付随するインデックスや候補表をまとめたもの
+
+    モデルを切り替えるときは新しい ModelState を用意してから丸ごと差し替えるので、
+    処理の途中でモデルとインデックスの組み合わせが食い違うことがない。
+    """
+
+    def __init__(self, model=None, fingerprint=None, source_path=None, handle=None):
+        self.model = model
+        # 読み込んだモデル（元ファイル・語彙数・ストアの種類）を識別するキー。派生キャッシュの保存に使う
+        self.fingerprint = fingerprint
+        # 読み込んだモデルファイルのパス（派生キャッシュの保存先を決めるのに使う）
+        self.source_path = source_path
+        # 別プロセスから同じベクトルを mmap で開くための情報（model_registry.VectorHandle）
+        self.handle = handle
+        # most_similar の代わりに使う近傍探索インデックス（None なら総当たり）
+        self.neighbor_index = None
+        # 「かんたん」モードのジャンルごとの候補表 {ジャンル: [(単語, 例示語との最大類似度), ...]}
+        self.genre_tables = {}
+        # 表記ゆれをならした形から語彙の表記を引く索引（word_index.NormalizedIndex）
+        self.word_index = None
+
+# 近傍探索の結果のキャッシュ（キーにモデルの指紋を含むので、モデルを切り替えても共有できる）
+similar_words_cache = neighbor_cache.NeighborCache()
+
+# --- 今使っているモデル ---
+# 差し替えは参照の代入1回で行うので、読む側はロックを取らずに get_state() を呼べばよい
+_state = ModelState()
+
+def get_state():
+    """今使っている ModelState を返す"""
+    return _state
+
+def get_model():
+    """今使っているモデルを返す（読み込み前は None）"""
+    return _state.model
+
+def set_state(state):
+    """ModelState を差し替え、それまでの ModelState を返す"""
+    global _state
+    previous, _state = _state, state
+    return previous
+
+def build_model_state(model_path, use_cache=True, limit=None, progress_callback=None, store="full"):
+    """モデルを読み込んで ModelState を返す（今使っているモデルには触れない）。失敗したら None
+
+    2回目以降はバイナリキャッシュを mmap で開くので、テキストの解析は行わない。
+    limit を指定すると頻度の高い先頭 N 語だけを読み込む。
+    progress_callback にはテキスト解析中の進捗 (vec_parser.LoadProgress) が渡される。
+    store に "float16" か "int8" を指定すると、語彙を絞り込んだ省メモリストアを使う。
+    """
     print("モデルを読み込んでいます...")
     try:
-        model = KeyedVectors.load_word2vec_format(model_path, binary=False)
+        with metrics.timer("load_model_phase", phase="fingerprint"):
+            fingerprint = model_cache.source_fingerprint(model_path)
+        state = ModelState(fingerprint=model_cache.variant_key(fingerprint, limit=limit, store=store), source_path=model_path,
+                           handle=model_registry.VectorHandle(model_path, limit, store))
+        if store != "full":
+            store_dir = compact_store.get_store_dir(model_path, store, limit)
+            meta = compact_store.read_store_meta(store_dir)
+            keep_words = compact_store.collect_keep_words("data")
+            # コマンドで条件を変えて作ったストアは、同じ条件のまま作り直す
+            options = (meta or {}).get("options") or compact_store.build_options()
+            signature = compact_store.build_signature(keep_words, options)
+            if use_cache and meta and meta.get("source") == fingerprint and meta.get("build") == signature:
+                with metrics.timer("load_model_phase", phase="load_compact_store"):
+                    state.model = compact_store.CompactVectorStore.load(store_dir)
+                print(f"省メモリストア ({store}) を読み込みました。")
+                return state
+
+        if use_cache and model_cache.is_cache_valid(model_path, fingerprint, limit):
+            with metrics.timer("load_model_phase", phase="load_cache"):
+                words, vectors, norms = model_cache.load_cache(model_path, limit)
+                model = model_cache.build_keyed_vectors(words, vectors, norms)
+            print("キャッシュからモデルを読み込みました。")
+        else:
+            with metrics.timer("load_model_phase", phase="parse_text"):
+                words, vectors = vec_parser.parse_word2vec_text(model_path, limit=limit, progress_callback=progress_callback)
+                model = model_cache.build_keyed_vectors(words, vectors)
+            if use_cache:
+                print("次回以降のためにモデルのキャッシュを作成しています...")
+                try:
+                    with metrics.timer("load_model_phase", phase="save_cache"):
+                        model_cache.save_cache(model_path, words, vectors, fingerprint, limit)
+                    # 解析した配列は捨てて、他のプロセスと共有できる mmap 版に切り替える
+                    words, vectors, norms = model_cache.load_cache(model_path, limit)
+                    model = model_cache.build_keyed_vectors(words, vectors, norms)
+                except (IOError, OSError) as e:
+                    # キャッシュが作れなくてもゲームは続けられる
+                    print(f"キャッシュの作成に失敗しました: {e}")
+
+        if store != "full":
+            print(f"省メモリストア ({store}) を作成しています...")
+            with metrics.timer("load_model_phase", phase="build_compact_store"):
+                model = compact_store.build_compact_store(model, store, keep_words=keep_words, **options)
+            if use_cache:
+                try:
+                    model.save(store_dir, {"source": fingerprint, "options": options, "build": signature})
+                except (IOError, OSError) as e:
+                    print(f"省メモリストアの保存に失敗しました: {e}")
+        state.model = model
         print("モデルの読み込みが完了しました。")
-        return True
+        return state
     except FileNotFoundError:
         print(f"エラー: モデルファイルが見つかりません。'{model_path}'")
-        return False
+        return None
     except Exception as e:
         print(f"モデル読み込み中にエラーが発生しました: {e}")
+        return None
+
+@metrics.timed("load_model")
+def load_model(model_path, use_cache=True, limit=None, progress_callback=None, store="full"):
+    """モデルを読み込み、今使うモデルとして差し替える（引数は build_model_state と同じ）"""
+    state = build_model_state(model_path, use_cache, limit, progress_callback, store)
+    if state is None:
         return False
+    set_state(state)
+    return True
+
+def prepare_neighbor_index(model_path, backend="exact", nprobe=neighbor_index_module.DEFAULT_NPROBE, state=None, disk_cache=True):
+    """お題生成で使う近傍探索インデックスを用意する（ivf は初回だけ作成して保存）
+
+    disk_cache=True なら、近傍探索の結果をキャッシュのフォルダにも保存して再起動後も使い回す。
+    """
+    state = state or _state
+    if state.model is None:
+        return None
+    if disk_cache:
+        similar_words_cache.attach_disk(os.path.join(model_cache.get_cache_dir(model_path), neighbor_cache.DISK_FILE_NAME))
+    state.neighbor_index = neighbor_index_module.open_index(state.model, backend, model_path, state.fingerprint, nprobe)
+    return state.neighbor_index
+
+def prepare_word_index(state=None):
+    """表記ゆれを吸収する単語の索引を用意する（初回だけ語彙を走査して保存する）"""
+    state = state or _state
+    if state.model is None:
+        return None
+    with metrics.timer("prepare_word_index"):
+        state.word_index = word_index.load_or_build(state.model, state.source_path, state.fingerprint)
+    return state.word_index
+
+def find_similar_words(word, topn, state=None):
+    """単語に近い順に (単語, 類似度) を返す。一度求めた結果はキャッシュから返す"""
+    state = state or _state
+    # インデックスの種類・nprobe で結果が変わるので、キャッシュのキーに含める
+    search = state.neighbor_index.name if state.neighbor_index is not None else "model"
+    key = f"{state.fingerprint}:{search}:{getattr(state.neighbor_index, 'nprobe', None)}"
+    return similar_words_cache.get_or_compute(word, topn, key, lambda: _search_similar_words(word, topn, state))
+
+def _search_similar_words(word, topn, state):
+    if state.neighbor_index is not None:
+        with metrics.timer("most_similar", backend=state.neighbor_index.name):
+            return state.neighbor_index.search(word, topn=topn)
+    with metrics.timer("most_similar", backend="model"):
+        return state.model.most_similar(word, topn=topn)
 
 def load_json_data(filepath):
     """JSONファイルからデータを読み込む関数"""
@@ -38,23 +191,46 @@ def load_json_data(filepath):
         print(f"エラー: JSONの形式が正しくありません。'{filepath}'")
         return None
 
+@metrics.timed("prepare_easy_data")
+def prepare_easy_data(data, state=None):
+    """「かんたん」モードの候補表をデータ読み込み時に1回だけ用意する（保存済みなら再利用）"""
+    state = state or _state
+    if not data or state.model is None:
+        return
+    params = {
+        "topn": EASY_RELATED_WORD_COUNT,
+        "threshold": EASY_SIMILARITY_THRESHOLD,
+        "search": state.neighbor_index.name if state.neighbor_index is not None else "exact",
+        "nprobe": getattr(state.neighbor_index, "nprobe", None),
+    }
+    path = genre_cache.get_cache_path(state.source_path, state.fingerprint) if state.source_path else None
+    find_similar = lambda word, topn: find_similar_words(word, topn, state)
+    state.genre_tables = genre_cache.prepare_tables(state.model, data, find_similar, path, params)
+
+@metrics.timed("generate_easy_question")
 def generate_easy_question(data):
     """「かんたん」モードのお題を生成する"""
-    SIMILARITY_THRESHOLD = 0.6
-    RANDOM_CANDIDATE_COUNT = 5
-    
+    state = _state
+    model = state.model
     genre_list = list(data.keys())
     selected_genre = random.choice(genre_list)
-    
+
+    # 候補表があれば、表からランダムに選んで例示語に一番近いものを選ぶだけでよい
+    table = state.genre_tables.get(selected_genre)
+    if table is not None:
+        if len(table) < EASY_RANDOM_CANDIDATE_COUNT: return None, None
+        sampled = random.sample(table, EASY_RANDOM_CANDIDATE_COUNT)
+        return max(sampled, key=lambda candidate: candidate[1])[0], selected_genre
+
     try:
-        all_related_words = model.most_similar(selected_genre, topn=200)
+        all_related_words = find_similar_words(selected_genre, topn=EASY_RELATED_WORD_COUNT, state=state)
     except KeyError: return None, None
 
-    primary_candidates = [word for word, similarity in all_related_words if similarity >= SIMILARITY_THRESHOLD]
+    primary_candidates = [word for word, similarity in all_related_words if similarity >= EASY_SIMILARITY_THRESHOLD]
             
-    if len(primary_candidates) < RANDOM_CANDIDATE_COUNT: return None, None
+    if len(primary_candidates) < EASY_RANDOM_CANDIDATE_COUNT: return None, None
 
-    secondary_candidates = random.sample(primary_candidates, RANDOM_CANDIDATE_COUNT)
+    secondary_candidates = random.sample(primary_candidates, EASY_RANDOM_CANDIDATE_COUNT)
 
     final_scores = {}
     example_words = data[selected_genre]["example_words"]
@@ -70,8 +246,20 @@ def generate_easy_question(data):
     final_question = max(final_scores, key=final_scores.get)
     return final_question, selected_genre
 
+def record_generation(mode, question):
+    """お題生成の試行回数と失敗回数を記録する"""
+    metrics.increment("question_attempts", mode=mode)
+    if not question:
+        metrics.increment("question_failures", mode=mode)
+
+@metrics.timed("generate_question_by_difficulty")
 def generate_question_by_difficulty(difficulty, e_data, n_data, h_data):
     """難易度に応じてお題を生成し、(お題, ジャンル)のタプルを返す"""
+    question, genre = _generate_question_by_difficulty(difficulty, e_data, n_data, h_data)
+    record_generation(f"difficulty-{difficulty}", question)
+    return question, genre
+
+def _generate_question_by_difficulty(difficulty, e_data, n_data, h_data):
     if difficulty == "1":
         if not e_data: return None, None
         return generate_easy_question(e_data)
@@ -87,15 +275,46 @@ def generate_question_by_difficulty(difficulty, e_data, n_data, h_data):
         return question, "（ジャンル指定なし）"
     else: return None, None
 
+@metrics.timed("check_similarity")
 def check_similarity(word1, word2):
-    """2つの単語の類似度を計算する"""
+    """2つの単語の類似度を計算する（KeyedVectors でも省メモリストアでも同じように動く）"""
+    model = _state.model
     if word1 in model and word2 in model:
         return model.similarity(word1, word2)
     return 0
 
+@metrics.timed("check_similarity_batch")
+def check_similarity_batch(questions, guesses, with_ranks=False):
+    """(お題, 推測) の組の類似度をまとめて計算する（batch_similarity.BatchResult を返す）"""
+    return batch_similarity.similarity_pairs(_state.model, questions, guesses, with_ranks)
+
+def create_similarity_table(question, background=True):
+    """お題と全語彙との類似度・順位の表を作る（background=True なら別スレッドで作成）"""
+    table = similarity_table.SimilarityTable(_state.model, question)
+    return table.build_async() if background else table.build()
+
+def check_similarity_with_rank(question, word, table=None):
+    """類似度と順位を返す。表がまだ完成していなければ順位は None"""
+    if table is not None and table.question == question:
+        result = table.lookup(word)
+        if result is not None:
+            return result
+    return check_similarity(question, word), None
+
+@metrics.timed("resolve_word")
+def resolve_word(word):
+    """入力した単語を語彙の表記に直して返す（全角・半角、ひらがな・カタカナ、大文字・小文字の違いを吸収）。なければ None"""
+    state = _state
+    if word in state.model:
+        return word
+    if state.word_index is None:
+        prepare_word_index(state)
+    return state.word_index.resolve(word)
+
+@metrics.timed("word_exists")
 def word_exists(word):
     """単語がモデルに存在するかチェックする"""
-    return word in model
+    return word in _state.model
 
 def get_default_settings():
     """デフォルト設定を返す関数"""
@@ -109,7 +328,15 @@ def get_default_settings():
         "3": 180  # むずかしい
       },
       "ranking_display_count": 5,
-      "show_similarity": False # 要望①にあった項目を先取り
+      "show_similarity": False, # 要望①にあった項目を先取り
+      "show_rank": True, # 推測した単語が何番目に近いかを表示する
+      "vocab_limit": None, # 読み込む語彙数の上限（None なら全て）
+      "vector_store": "full", # "full"（float32）/ "float16" / "int8"
+      "neighbor_backend": "exact", # お題生成の近傍探索。"exact"（総当たり）/ "ivf"（近似）
+      "neighbor_nprobe": 16, # ivf で調べるバケット数。大きいほど正確で遅い
+      "model_file": "cc.ja.300.vec", # model フォルダの中で使うモデル（なければ見つかったものを使う）
+      "history_file": "history.sqlite3", # 遊んだゲームの履歴（空にすると記録しない）
+      "player_name": "player" # 履歴に残すプレイヤー名
     }
 
 def load_settings():
@@ -134,23 +361,37 @@ def load_settings():
         return get_default_settings()
 
 def save_settings(settings):
-    """設定をsettings.jsonに保存する"""
+    """設定をsettings.jsonに保存する（書き込みの途中で落ちても元のファイルが壊れないように、一時ファイルから置き換える）"""
+    # 一時ファイルは保存ごとに別の名前にして、同時に保存しても互いの書きかけを置き換えないようにする
+    fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(SETTINGS_FILE) + ".", suffix=".tmp",
+                                    dir=os.path.dirname(os.path.abspath(SETTINGS_FILE)))
     try:
-        with open(SETTINGS_FILE, "w", encoding="utf-8") as f:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
             # indent=2 で人間が読みやすいように整形して保存
             json.dump(settings, f, indent=2, ensure_ascii=False)
-    except IOError as e:
+        os.replace(tmp_path, SETTINGS_FILE)
+    except (IOError, OSError) as e:
         print(f"設定の保存中にエラーが発生しました: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
         
+@metrics.timed("generate_custom_question")
 def generate_custom_question(keyword):
     """カスタムモード用のお題を生成する関数（新ロジック）"""
-    if not keyword or not word_exists(keyword):
+    question = _generate_custom_question(keyword)
+    record_generation("custom", question)
+    return question
+
+def _generate_custom_question(keyword):
+    state = _state
+    keyword = resolve_word(keyword) if keyword else None
+    if not keyword:
         # キーワードが空、またはモデルに存在しない場合は失敗
         return None
 
     try:
         # 類似語を上位100件取得
-        related_words = model.most_similar(keyword, topn=100)
+        related_words = find_similar_words(keyword, topn=100, state=state)
         
         # 候補の単語リストを作成
         candidates = [word for word, similarity in related_words]
@@ -0,0 +1,684 @@
+import os
+import json
+import time
+import uuid
+import base64
+import struct
+import asyncio
+import hashlib
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit, parse_qs, quote, unquote
+
+import game_logic
+import metrics
+import question_pool
+import batch_similarity
+import history_store
+from guess_ranking import GuessRanking
+from similarity_table import SimilarityTableCache
+
+# --- ゲームサーバーの設定 ---
+# 1つのモデルを共有して、HTTP / WebSocket で複数のゲームを同時に進める
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+MODEL_WORKERS = 4  # モデルを使う処理を走らせるスレッド数
+MAX_PENDING_MODEL_CALLS = 64  # モデルの処理待ちがこれを超えたら新しい処理を待たせる
+MAX_SESSIONS = 10000
+MAX_LIST_COUNT = 100  # ランキングやリーダーボードで一度に返す件数の上限
+FINISHED_SESSION_TTL = 300  # 終わったゲームを結果の確認用に残しておく秒数
+CUSTOM_TIME_LIMIT = 300
+SIMILARITY_TABLE_CACHE = 32  # 使い回す類似度表の数（1つで語彙数×12バイト）
+MAX_BODY_BYTES = 64 * 1024
+MAX_WS_MESSAGE_BYTES = 64 * 1024
+WEBSOCKET_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+HTTP_REASONS = {200: "OK", 201: "Created", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+                409: "Conflict", 413: "Payload Too Large", 500: "Internal Server Error", 503: "Service Unavailable"}
+
+
+class GameError(Exception):
+    """HTTP のステータスコード付きのエラー"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class GameSession:
+    """1人分のゲームの状態（制限時間はサーバー側で管理する）"""
+
+    def __init__(self, session_id, question, genre, difficulty, time_limit, started_at):
+        self.id = session_id
+        self.question = question
+        self.genre = genre
+        self.difficulty = difficulty
+        self.time_limit = time_limit
+        self.started_at = started_at
+        self.deadline = started_at + time_limit
+        self.ranking = GuessRanking()
+        self.guess_count = 0
+        self.status = "playing"  # playing / won / gave_up / timeout
+        self.finished_at = None
+        self.timer_handle = None
+        self.listeners = []  # ゲームが終わったときに呼ぶ関数
+
+    def remaining(self, now):
+        if self.status != "playing":
+            return 0.0
+        return max(0.0, self.deadline - now)
+
+    def to_dict(self, now):
+        """クライアントに返す状態。答えはゲームが終わるまで返さない"""
+        best = self.ranking.best()
+        state = {
+            "session": self.id,
+            "status": self.status,
+            "genre": self.genre,
+            "difficulty": self.difficulty,
+            "time_limit": self.time_limit,
+            "remaining": self.remaining(now),
+            "guess_count": self.guess_count,
+            "best": {"word": best[0], "similarity": best[1]} if best else None,
+        }
+        if self.status != "playing":
+            state["answer"] = self.question
+        return state
+
+
+class GameService:
+    """ゲームのセッションをまとめて管理する（イベントループのスレッドからだけ呼ぶ）
+
+    モデルを使う重い処理は上限付きのスレッドプールで実行し、
+    セッションの状態はイベントループのスレッドだけで書き換える。
+    """
+
+    def __init__(self, e_data, n_data, h_data, settings=None, workers=MODEL_WORKERS,
+                 max_sessions=MAX_SESSIONS, pool_depth=question_pool.DEFAULT_DEPTH, history=None):
+        self.e_data, self.n_data, self.h_data = e_data, n_data, h_data
+        self.history = history  # history_store.HistoryStore（None なら履歴を残さない）
+        self.settings = settings or game_logic.get_default_settings()
+        self.max_sessions = max_sessions
+        self.sessions = {}
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="game-model")
+        self.tables = SimilarityTableCache(SIMILARITY_TABLE_CACHE)
+        # 表がまだないお題の推測は、同時に届いたものをまとめて1回で計算する
+        self.batcher = batch_similarity.similarity_batcher(game_logic.get_model)
+        self.question_pools = question_pool.QuestionPoolManager(e_data, n_data, h_data, depth=pool_depth) if pool_depth else None
+        self._pending = asyncio.Semaphore(MAX_PENDING_MODEL_CALLS)
+        self._building_tables = set()
+        self.loop = asyncio.get_running_loop()
+        self.started_at = time.monotonic()
+        self.guesses = 0
+
+    async def run_model(self, func, *args):
+        """モデルを使う処理をスレッドプールで実行する（待ちが多すぎるときは順番を待つ）"""
+        async with self._pending:
+            return await self.loop.run_in_executor(self.executor, func, *args)
+
+    def close(self):
+        for session in self.sessions.values():
+            if session.timer_handle:
+                session.timer_handle.cancel()
+        if self.question_pools:
+            self.question_pools.stop()
+        self.batcher.stop()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    # --- セッションの管理 ---
+
+    def get_session(self, session_id):
+        session = self.sessions.get(session_id)
+        if session is None:
+            raise GameError(404, "ゲームが見つかりません。")
+        return session
+
+    async def _generate(self, difficulty, keyword):
+        if keyword is not None:
+            pooled = self.question_pools.get_custom(keyword) if self.question_pools else None
+            question = pooled[0] if pooled else await self.run_model(game_logic.generate_custom_question, keyword)
+            if question and self.question_pools:
+                self.question_pools.watch_custom(keyword)
+            return question, f"カスタム:「{keyword}」"
+        if difficulty not in ("1", "2", "3"):
+            raise GameError(400, "difficulty は 1 / 2 / 3 のどれかを指定してください。")
+        pooled = self.question_pools.get(difficulty) if self.question_pools else None
+        if pooled:
+            return pooled
+        return await self.run_model(game_logic.generate_question_by_difficulty, difficulty, self.e_data, self.n_data, self.h_data)
+
+    async def start(self, difficulty=None, keyword=None, time_limit=None, player=None):
+        """新しいゲームを始めて、その状態を返す"""
+        if len(self.sessions) >= self.max_sessions:
+            raise GameError(503, "同時に遊べるゲームの数が上限に達しています。")
+        if keyword is not None:
+            keyword = str(keyword).strip()
+            if not keyword:
+                raise GameError(400, "キーワードを入力してください。")
+        else:
+            difficulty = str(difficulty or "1")
+        question, genre = await self._generate(difficulty, keyword)
+        if not question:
+            raise GameError(503, "お題を生成できませんでした。")
+        if time_limit is None:
+            time_limit = CUSTOM_TIME_LIMIT if keyword is not None else self.settings["time_limits"][difficulty]
+        try:
+            time_limit = float(time_limit)
+        except (TypeError, ValueError):
+            raise GameError(400, "time_limit は秒数で指定してください。")
+        if time_limit <= 0:
+            raise GameError(400, "time_limit は正の秒数で指定してください。")
+
+        now = self.loop.time()
+        session = GameSession(uuid.uuid4().hex, question, genre, "custom" if keyword is not None else difficulty, time_limit, now)
+        self.sessions[session.id] = session
+        session.timer_handle = self.loop.call_later(time_limit, self._finish, session, "timeout")
+        if self.history:
+            self.history.start_session(question, genre, session.difficulty, str(player or "anonymous"),
+                                       os.path.basename(game_logic.get_state().source_path or ""), time_limit, session.id)
+        self._ensure_table(question)
+        metrics.increment("server_sessions_started", difficulty=session.difficulty)
+        return session.to_dict(now)
+
+    def _finish(self, session, status):
+        """ゲームを終わらせ、しばらくしたらセッションを消す"""
+        if session.status != "playing":
+            return
+        session.status = status
+        session.finished_at = self.loop.time()
+        if session.timer_handle:
+            session.timer_handle.cancel()
+        self.loop.call_later(FINISHED_SESSION_TTL, self.sessions.pop, session.id, None)
+        if self.history:
+            self.history.finish_session(session.id, status)
+        metrics.increment("server_sessions_finished", status=status)
+        state = session.to_dict(session.finished_at)
+        for listener in session.listeners:
+            listener(state)
+        session.listeners.clear()
+
+    def _expire_if_overdue(self, session):
+        # タイマーより先にリクエストが届いた場合もここで時間切れにする
+        if session.status == "playing" and self.loop.time() >= session.deadline:
+            self._finish(session, "timeout")
+
+    def _check_playing(self, session):
+        self._expire_if_overdue(session)
+        if session.status != "playing":
+            raise GameError(409, "このゲームはすでに終わっています。")
+
+    def _ensure_table(self, question):
+        """お題の類似度表がなければ裏で作る（できるまでは順位なしで返す）"""
+        model = game_logic.get_model()
+        if self.tables.peek(model, question) is not None or question in self._building_tables:
+            return None
+        self._building_tables.add(question)
+        future = self.loop.run_in_executor(self.executor, self.tables.get, model, question)
+        future.add_done_callback(lambda _: self._building_tables.discard(question))
+        return future
+
+    # --- ゲームの操作 ---
+
+    async def guess(self, session_id, word):
+        """単語を推測して、類似度・順位などを返す"""
+        session = self.get_session(session_id)
+        self._check_playing(session)
+        word = str(word or "").strip()
+        if not word:
+            raise GameError(400, "単語を入力してください。")
+        typed = word
+        if word == session.question:
+            return self._win(session, word, typed)
+        resolved = game_logic.resolve_word(word)
+        if resolved is None:
+            self._record(session, typed, None, "unknown")
+            return {"word": word, "correct": False, "in_vocab": False}
+        if resolved != word:
+            # 表記ゆれは語彙の表記に直してから判定する
+            word = resolved
+            if word == session.question:
+                return self._win(session, word, typed)
+        if word in session.ranking:
+            self._record(session, typed, word, "duplicate")
+            return {"word": word, "correct": False, "in_vocab": True, "duplicate": True,
+                    "similarity": session.ranking.similarity(word), "guess_rank": session.ranking.rank(word)}
+
+        table = self.tables.peek(game_logic.get_model(), session.question)
+        result = table.lookup(word) if table is not None else None
+        if result is not None:
+            similarity, rank = result
+        else:
+            self._ensure_table(session.question)
+            similarity, _ = await asyncio.wrap_future(self.batcher.submit((session.question, word)))
+            rank = None
+        # 計算している間に時間切れになっていたら記録しない
+        self._check_playing(session)
+        if word in session.ranking:
+            self._record(session, typed, word, "duplicate")
+            return {"word": word, "correct": False, "in_vocab": True, "duplicate": True,
+                    "similarity": session.ranking.similarity(word), "guess_rank": session.ranking.rank(word)}
+        session.guess_count += 1
+        self.guesses += 1
+        guess_rank = session.ranking.add(word, float(similarity))
+        self._record(session, typed, word, "scored", similarity, rank)
+        return {"word": word, "correct": False, "in_vocab": True, "similarity": float(similarity),
+                "rank": rank, "guess_rank": guess_rank, "remaining": session.remaining(self.loop.time())}
+
+    def _win(self, session, word, typed):
+        session.guess_count += 1
+        self.guesses += 1
+        self._record(session, typed, word, "correct")
+        self._finish(session, "won")
+        return {"word": word, "correct": True, "in_vocab": True, "similarity": 1.0, "rank": 0,
+                "state": session.to_dict(self.loop.time())}
+
+    def _record(self, session, typed, word, status, similarity=None, rank=None):
+        # 書き込みはキューに入れるだけなので、イベントループを止めない
+        if self.history:
+            self.history.record_guess(session.id, typed, word, status, similarity, rank)
+
+    def give_up(self, session_id):
+        """ゲームをあきらめて、答えを含む状態を返す"""
+        session = self.get_session(session_id)
+        self._check_playing(session)
+        self._finish(session, "gave_up")
+        return session.to_dict(self.loop.time())
+
+    def ranking(self, session_id, count=None):
+        """推測した単語のランキング（上位と下位）を返す"""
+        session = self.get_session(session_id)
+        if count is None:
+            count = self.settings["ranking_display_count"]
+        top_rows, bottom_rows = session.ranking.display_rows(count)
+        return {"session": session.id, "count": len(session.ranking),
+                "top": _ranking_rows(top_rows), "bottom": _ranking_rows(bottom_rows)}
+
+    def state(self, session_id):
+        """ゲームの状態を返す"""
+        session = self.get_session(session_id)
+        self._expire_if_overdue(session)
+        return session.to_dict(self.loop.time())
+
+    def stats(self):
+        """監視用の統計を返す"""
+        playing = sum(1 for session in self.sessions.values() if session.status == "playing")
+        return {
+            "sessions": len(self.sessions),
+            "playing": playing,
+            "guesses": self.guesses,
+            "uptime_s": time.monotonic() - self.started_at,
+            "similarity_tables": {"hits": self.tables.hits, "misses": self.tables.misses},
+            "similarity_batches": self.batcher.stats(),
+            "neighbor_cache": game_logic.similar_words_cache.stats(),
+            "question_pools": self.question_pools.stats() if self.question_pools else [],
+            "history": self.history.stats() if self.history else None,
+        }
+
+    # --- 履歴の集計 ---
+
+    async def _query_history(self, name, *args):
+        if not self.history:
+            raise GameError(404, "このサーバーは履歴を記録していません。")
+        # SQLite の読み出しはイベントループを止めないように別スレッドで行う
+        return await self.loop.run_in_executor(None, getattr(self.history, name), *args)
+
+    async def player_stats(self, player):
+        """プレイヤーの成績を返す"""
+        return await self._query_history("player_stats", player)
+
+    async def fastest_solves(self, difficulty=None, count=10):
+        """早く解けたゲームの一覧を返す"""
+        return {"difficulty": difficulty, "games": await self._query_history("fastest_solves", difficulty, count)}
+
+
+def _ranking_rows(rows):
+    return [{"place": place, "word": word, "similarity": sim} for place, word, sim in rows]
+
+
+# --- ルーティング（HTTP と WebSocket と LocalClient で共通） ---
+
+async def dispatch(service, method, target, body=None):
+    """リクエストを処理して (ステータスコード, 返す辞書) を返す"""
+    url = urlsplit(target)
+    parts = [part for part in url.path.split("/") if part]
+    query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+    route = "/".join(parts[:1] + ["{id}"] * (len(parts) > 1) + parts[2:])
+    with metrics.timer("server_request", route=route, method=method):
+        try:
+            if isinstance(body, (bytes, str)):
+                try:
+                    body = json.loads(body) if body else {}
+                except (json.JSONDecodeError, UnicodeDecodeError):
+                    raise GameError(400, "リクエストの本文が JSON ではありません。")
+            body = body or {}
+            if not isinstance(body, dict):
+                raise GameError(400, "リクエストの本文は JSON オブジェクトにしてください。")
+            return await _route(service, method, parts, query, body)
+        except GameError as e:
+            return e.status, {"error": e.message}
+        except Exception as e:
+            print(f"リクエストの処理中にエラーが発生しました: {e}")
+            return 500, {"error": "サーバー内部でエラーが発生しました。"}
+
+
+def _count_param(query, default):
+    """クエリの n を 0 以上 MAX_LIST_COUNT 以下の整数にして返す（なければ default）"""
+    if "n" not in query:
+        return default
+    try:
+        count = int(query["n"])
+    except ValueError:
+        raise GameError(400, "n は整数で指定してください。")
+    if count < 0:
+        raise GameError(400, "n は 0 以上で指定してください。")
+    return min(count, MAX_LIST_COUNT)
+
+
+async def _route(service, method, parts, query, body):
+    if parts == ["health"] and method == "GET":
+        return 200, service.stats()
+    if parts == ["games"] and method == "POST":
+        return 201, await service.start(body.get("difficulty"), body.get("keyword"), body.get("time_limit"), body.get("player"))
+    if parts == ["leaderboard"] and method == "GET":
+        return 200, await service.fastest_solves(query.get("difficulty"), _count_param(query, 10))
+    if len(parts) == 3 and parts[0] == "players" and parts[2] == "stats" and method == "GET":
+        return 200, await service.player_stats(unquote(parts[1]))
+    if len(parts) >= 2 and parts[0] == "games":
+        session_id, action = parts[1], parts[2] if len(parts) > 2 else None
+        if action is None and method == "GET":
+            return 200, service.state(session_id)
+        if action == "guess" and method == "POST":
+            return 200, await service.guess(session_id, body.get("word"))
+        if action == "giveup" and method == "POST":
+            return 200, service.give_up(session_id)
+        if action == "ranking" and method == "GET":
+            return 200, service.ranking(session_id, _count_param(query, None))
+        if action in (None, "guess", "giveup", "ranking"):
+            raise GameError(405, "このメソッドは使えません。")
+    raise GameError(404, "そのURLはありません。")
+
+
+class LocalClient:
+    """ソケットを通さずに同じプロセスのサーバーを呼ぶクライアント（テストやベンチマーク用）"""
+
+    def __init__(self, service):
+        self.service = service
+
+    async def request(self, method, path, payload=None):
+        return await dispatch(self.service, method, path, payload)
+
+    async def start(self, difficulty=None, keyword=None, time_limit=None, player=None):
+        body = {"difficulty": difficulty, "keyword": keyword, "time_limit": time_limit, "player": player}
+        return await self.request("POST", "/games", {k: v for k, v in body.items() if v is not None})
+
+    async def guess(self, session_id, word):
+        return await self.request("POST", f"/games/{session_id}/guess", {"word": word})
+
+    async def give_up(self, session_id):
+        return await self.request("POST", f"/games/{session_id}/giveup")
+
+    async def ranking(self, session_id, count=None):
+        return await self.request("GET", f"/games/{session_id}/ranking" + (f"?n={count}" if count is not None else ""))
+
+
+class HttpClient(LocalClient):
+    """1本の接続を使い回す最小限の HTTP/1.1 クライアント（負荷試験用）"""
+
+    def __init__(self, host, port):
+        self.host, self.port = host, port
+        self.reader = self.writer = None
+
+    async def request(self, method, path, payload=None):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8") if payload is not None else b""
+        head = (f"{method} {path} HTTP/1.1\r\nHost: {self.host}:{self.port}\r\n"
+                f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n")
+        self.writer.write(head.encode("latin-1") + body)
+        await self.writer.drain()
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionError("サーバーとの接続が切れました。")
+        status = int(status_line.split()[1])
+        headers = await _read_headers(self.reader)
+        data = await self.reader.readexactly(int(headers.get("content-length", 0)))
+        return status, json.loads(data) if data else {}
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+
+# --- HTTP / WebSocket の処理 ---
+
+async def _read_headers(reader):
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            return headers
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+
+def _json_bytes(payload):
+    return json.dumps(payload, ensure_ascii=False).encode("utf-8")
+
+
+def _write_response(writer, status, payload, keep_alive):
+    body = _json_bytes(payload)
+    head = (f"HTTP/1.1 {status} {HTTP_REASONS.get(status, '')}\r\n"
+            "Content-Type: application/json; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+    writer.write(head.encode("latin-1") + body)
+
+
+def _encode_frame(opcode, data):
+    """サーバーから送る WebSocket フレーム（マスクなし）を作る"""
+    length = len(data)
+    if length < 126:
+        header = struct.pack("!BB", 0x80 | opcode, length)
+    elif length < 1 << 16:
+        header = struct.pack("!BBH", 0x80 | opcode, 126, length)
+    else:
+        header = struct.pack("!BBQ", 0x80 | opcode, 127, length)
+    return header + data
+
+
+async def _read_frame(reader):
+    """WebSocket フレームを1つ読み、(opcode, データ) を返す（分割フレームには対応しない）"""
+    first, second = await reader.readexactly(2)
+    opcode, length = first & 0x0F, second & 0x7F
+    if length == 126:
+        length = struct.unpack("!H", await reader.readexactly(2))[0]
+    elif length == 127:
+        length = struct.unpack("!Q", await reader.readexactly(8))[0]
+    if length > MAX_WS_MESSAGE_BYTES:
+        raise ValueError("メッセージが大きすぎます。")
+    mask = await reader.readexactly(4) if second & 0x80 else None
+    data = await reader.readexactly(length)
+    if mask:
+        data = bytes(byte ^ mask[i % 4] for i, byte in enumerate(data))
+    return opcode, data
+
+
+class GameServer:
+    """HTTP と WebSocket でゲームを遊べるようにする asyncio サーバー
+
+    HTTP:
+      POST /games                 {"difficulty": "1"} または {"keyword": "果物"}（"time_limit" は省略可）
+      GET  /games/{id}            ゲームの状態
+      POST /games/{id}/guess      {"word": "りんご"}
+      POST /games/{id}/giveup
+      GET  /games/{id}/ranking?n=5
+      GET  /health
+    WebSocket（/ws）:
+      {"id": 1, "action": "start" / "guess" / "giveup" / "ranking" / "state", "session": ..., ...} を送ると
+      {"id": 1, "status": 200, "data": {...}} が返る。時間切れになると {"event": "finished", "data": {...}} が届く。
+    """
+
+    def __init__(self, service, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        self.service = service
+        self.host, self.port = host, port
+        self.server = None
+        self._writers = set()
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            # つながったままの接続も閉じる（閉じないと wait_closed が終わらない）
+            for writer in list(self._writers):
+                writer.close()
+            await self.server.wait_closed()
+
+    async def _handle_connection(self, reader, writer):
+        self._writers.add(writer)
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, version = request_line.decode("latin-1").split()
+                headers = await _read_headers(reader)
+                if headers.get("upgrade", "").lower() == "websocket":
+                    await self._handle_websocket(reader, writer, headers)
+                    break
+                length = int(headers.get("content-length") or 0)
+                if length > MAX_BODY_BYTES:
+                    _write_response(writer, 413, {"error": "リクエストが大きすぎます。"}, False)
+                    await writer.drain()
+                    break
+                body = await reader.readexactly(length) if length else b""
+                status, payload = await dispatch(self.service, method, target, body)
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                _write_response(writer, status, payload, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+    async def _handle_websocket(self, reader, writer, headers):
+        key = headers.get("sec-websocket-key", "")
+        accept = base64.b64encode(hashlib.sha1((key + WEBSOCKET_GUID).encode("ascii")).digest()).decode("ascii")
+        writer.write(("HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                      f"Sec-WebSocket-Accept: {accept}\r\n\r\n").encode("latin-1"))
+        await writer.drain()
+
+        def send(message):
+            if not writer.is_closing():
+                writer.write(_encode_frame(0x1, _json_bytes(message)))
+
+        def notify_finished(state):
+            send({"event": "finished", "data": state})
+
+        subscribed = []  # このつながりで終了を通知するゲーム
+        try:
+            while True:
+                opcode, data = await _read_frame(reader)
+                if opcode == 0x8:  # close
+                    writer.write(_encode_frame(0x8, data[:2]))
+                    await writer.drain()
+                    return
+                if opcode == 0x9:  # ping
+                    writer.write(_encode_frame(0xA, data))
+                    await writer.drain()
+                    continue
+                if opcode != 0x1:
+                    continue
+                try:
+                    message = json.loads(data)
+                    if not isinstance(message, dict):
+                        raise ValueError
+                except ValueError:
+                    send({"status": 400, "data": {"error": "メッセージが JSON オブジェクトではありません。"}})
+                    await writer.drain()
+                    continue
+                status, payload = await self._dispatch_message(message)
+                if status == 201:
+                    session = self.service.get_session(payload["session"])
+                    session.listeners.append(notify_finished)
+                    subscribed.append(session)
+                send({"id": message.get("id"), "status": status, "data": payload})
+                await writer.drain()
+        finally:
+            # 切断した後に終わったゲームから、閉じた接続へ通知しないように外しておく
+            for session in subscribed:
+                if notify_finished in session.listeners:
+                    session.listeners.remove(notify_finished)
+
+    async def _dispatch_message(self, message):
+        action, session_id = message.get("action"), message.get("session")
+        if action == "start":
+            return await dispatch(self.service, "POST", "/games", message)
+        routes = {"guess": ("POST", "guess"), "giveup": ("POST", "giveup"), "ranking": ("GET", "ranking"), "state": ("GET", "")}
+        if action not in routes or not session_id:
+            return 400, {"error": "action と session を指定してください。"}
+        method, suffix = routes[action]
+        path = f"/games/{session_id}" + (f"/{suffix}" if suffix else "")
+        if action == "ranking" and message.get("n") is not None:
+            # 数値かどうかの確認は HTTP と同じく dispatch に任せる
+            path += f"?n={quote(str(message['n']))}"
+        return await dispatch(self.service, method, path, message)
+
+
+async def serve(args):
+    """モデルとお題データを読み込んでサーバーを起動する"""
+    settings = game_logic.load_settings()
+    loop = asyncio.get_running_loop()
+    # 読み込み中もイベントループを止めないように別スレッドで読み込む
+    loaded = await loop.run_in_executor(None, lambda: game_logic.load_model(
+        args.model, limit=settings["vocab_limit"], store=settings["vector_store"]))
+    if not loaded:
+        return
+    await loop.run_in_executor(None, game_logic.prepare_neighbor_index, args.model,
+                               settings["neighbor_backend"], settings["neighbor_nprobe"])
+    await loop.run_in_executor(None, game_logic.prepare_word_index)
+    e_data = game_logic.load_json_data(os.path.join(args.data_dir, "easy_data.json"))
+    n_data = game_logic.load_json_data(os.path.join(args.data_dir, "normal_data.json"))
+    h_data = game_logic.load_json_data(os.path.join(args.data_dir, "hard_data.json"))
+    if e_data:
+        await loop.run_in_executor(None, game_logic.prepare_easy_data, e_data)
+
+    history = history_store.open_store(args.history if args.history is not None else settings["history_file"])
+    service = GameService(e_data, n_data, h_data, settings, workers=args.workers, max_sessions=args.max_sessions, history=history)
+    server = await GameServer(service, args.host, args.port).start()
+    print(f"ゲームサーバーを http://{args.host}:{server.port} で起動しました。")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.close()
+        service.close()
+        if history:
+            history.close()
+
+
+def main():
+    """コマンドラインからゲームサーバーを起動する"""
+    parser = argparse.ArgumentParser(description="画面なしで複数のゲームを同時に遊べる HTTP / WebSocket サーバーを起動します。")
+    parser.add_argument("--model", default=os.path.join("model", "cc.ja.300.vec"), help="モデルファイル")
+    parser.add_argument("--data-dir", default="data")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--workers", type=int, default=MODEL_WORKERS, help="モデルを使う処理のスレッド数")
+    parser.add_argument("--max-sessions", type=int, default=MAX_SESSIONS)
+    parser.add_argument("--history", default=None, help="履歴のファイル（省略時は settings.json の history_file、空にすると記録しない）")
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        print("\nサーバーを停止しました。")
+
+
+if __name__ == "__main__":
+    main()
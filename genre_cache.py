@@ -0,0 +1,91 @@
+import os
+import json
+import hashlib
+
+import lazy_import
+import model_cache
+import vector_ops
+
+np = lazy_import.lazy_module("numpy")
+
+# --- 「かんたん」モードのジャンル候補表 ---
+# ジャンルごとに、しきい値を超えた類似語と「例示語との最大類似度」を前もって計算しておく
+CACHE_VERSION = 1
+
+
+def hash_data(value):
+    """JSON にできる値のハッシュを返す（キーの順番には左右されない）"""
+    payload = json.dumps(value, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def get_cache_path(model_path, fingerprint):
+    """モデルごとの候補表ファイルのパスを返す"""
+    return os.path.join(model_cache.get_cache_dir(model_path), f"{os.path.basename(model_path)}.{fingerprint}.genres.json")
+
+
+def build_genre_entry(model, genre, info, find_similar, topn, threshold):
+    """1つのジャンルの候補表 [(単語, 例示語との最大類似度), ...] を作る"""
+    try:
+        related = find_similar(genre, topn)
+    except KeyError:
+        return []
+    candidates = [word for word, similarity in related if similarity >= threshold and word in model]
+    if not candidates:
+        return []
+    examples = [word for word in info.get("example_words", []) if word in model]
+    if not examples:
+        return [(word, 0.0) for word in candidates]
+    # 候補×例示語の類似度を1回の行列積でまとめて計算する
+    candidate_rows = vector_ops.unit_rows(model, np.array([model.key_to_index[w] for w in candidates]))
+    example_rows = vector_ops.unit_rows(model, np.array([model.key_to_index[w] for w in examples]))
+    scores = (candidate_rows @ example_rows.T).max(axis=1)
+    return [(word, float(score)) for word, score in zip(candidates, scores)]
+
+
+def load_tables(path):
+    """保存された候補表を読み込む（なければ空の辞書）"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            saved = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+    if saved.get("version") != CACHE_VERSION:
+        return {}
+    return saved
+
+
+def save_tables(path, saved):
+    """候補表を保存する"""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(saved, f, ensure_ascii=False)
+    os.replace(path + ".tmp", path)
+
+
+def prepare_tables(model, e_data, find_similar, path, params):
+    """全ジャンルの候補表を用意する。内容が変わったジャンルだけを計算し直す
+
+    params には topn・しきい値・探索方法など、結果に影響する設定を渡す。
+    """
+    saved = load_tables(path) if path else {}
+    data_hash = hash_data({"data": e_data, "params": params})
+    genres = saved.get("genres", {})
+    if saved.get("data_hash") == data_hash:
+        return {genre: [tuple(c) for c in entry["candidates"]] for genre, entry in genres.items()}
+
+    updated = {}
+    for genre, info in e_data.items():
+        genre_hash = hash_data({"genre": genre, "info": info, "params": params})
+        entry = genres.get(genre)
+        if entry is None or entry.get("hash") != genre_hash:
+            candidates = build_genre_entry(model, genre, info, find_similar, params["topn"], params["threshold"])
+            entry = {"hash": genre_hash, "candidates": candidates}
+        updated[genre] = entry
+
+    if path:
+        try:
+            save_tables(path, {"version": CACHE_VERSION, "data_hash": data_hash, "genres": updated})
+        except (IOError, OSError) as e:
+            print(f"ジャンル候補表の保存に失敗しました: {e}")
+    return {genre: [tuple(c) for c in entry["candidates"]] for genre, entry in updated.items()}
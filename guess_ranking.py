@@ -0,0 +1,107 @@
+import bisect
+import random
+import time
+
+
+class GuessRanking:
+    """推測した単語を類似度の高い順に保っておくランキング
+
+    追加するたびに二分探索で挿入位置を決めるので、毎回全体をソートし直す必要がない。
+    順位・上位N件・下位N件は二分探索とスライスで求まる。
+    """
+
+    def __init__(self):
+        self._keys = []  # (-類似度, 追加順) の昇順 = 類似度の高い順
+        self._words = []  # _keys と同じ並びの単語
+        self._entries = {}  # 単語 -> (-類似度, 追加順)
+        self._sequence = 0
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, word):
+        return word in self._entries
+
+    def add(self, word, similarity):
+        """単語を追加して、その順位（1始まり）を返す。追加済みなら今の順位を返す"""
+        if word in self._entries:
+            return self.rank(word)
+        # 同じ類似度なら先に推測した単語を上にする（sorted の安定ソートと同じ並び）
+        key = (-float(similarity), self._sequence)
+        self._sequence += 1
+        position = bisect.bisect_left(self._keys, key)
+        self._keys.insert(position, key)
+        self._words.insert(position, word)
+        self._entries[word] = key
+        return position + 1
+
+    def similarity(self, word):
+        """単語の類似度を返す"""
+        return -self._entries[word][0]
+
+    def rank(self, word):
+        """単語の順位（1始まり）を返す"""
+        return bisect.bisect_left(self._keys, self._entries[word]) + 1
+
+    def _rows(self, start, end):
+        return [(start + i + 1, word, -key[0]) for i, (key, word) in enumerate(zip(self._keys[start:end], self._words[start:end]))]
+
+    def top(self, n):
+        """上位 n 件を (順位, 単語, 類似度) のリストで返す"""
+        return self._rows(0, min(n, len(self)))
+
+    def bottom(self, n):
+        """下位 n 件を (順位, 単語, 類似度) のリストで返す"""
+        return self._rows(max(0, len(self) - n), len(self))
+
+    def best(self):
+        """最も類似度の高い (単語, 類似度) を返す（空なら None）"""
+        if not self._keys:
+            return None
+        return self._words[0], -self._keys[0][0]
+
+    def display_rows(self, display_count):
+        """画面に出す (上位, 下位) を返す。件数が少なければ全件を上位として返す"""
+        if len(self) <= display_count * 2:
+            return self._rows(0, len(self)), []
+        return self.top(display_count), self.bottom(display_count)
+
+
+def run_benchmark(guess_count=10000, display_count=5, seed=0):
+    """毎回 sorted() する方法と比べたマイクロベンチマーク"""
+    rng = random.Random(seed)
+    guesses = [(f"単語{i}", rng.uniform(-0.2, 0.9)) for i in range(guess_count)]
+
+    start = time.perf_counter()
+    guessed_words = {}
+    for word, similarity in guesses:
+        guessed_words[word] = similarity
+        sorted_guesses = sorted(guessed_words.items(), key=lambda item: item[1], reverse=True)
+        sorted_guesses[:display_count], sorted_guesses[-display_count:]
+    sorted_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    ranking = GuessRanking()
+    for word, similarity in guesses:
+        ranking.add(word, similarity)
+        ranking.display_rows(display_count)
+    ranking_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for word, _ in guesses:
+        ranking.rank(word)
+    rank_seconds = time.perf_counter() - start
+
+    return {
+        "guesses": guess_count,
+        "sorted_total_ms": sorted_seconds * 1000,
+        "ranking_total_ms": ranking_seconds * 1000,
+        "ranking_per_guess_us": ranking_seconds / guess_count * 1e6,
+        "rank_lookup_us": rank_seconds / guess_count * 1e6,
+        "speedup": sorted_seconds / ranking_seconds if ranking_seconds else None,
+    }
+
+
+if __name__ == "__main__":
+    for name, value in run_benchmark().items():
+        print(f"{name}: {value:.3f}" if isinstance(value, float) else f"{name}: {value}")
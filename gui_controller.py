@@ -0,0 +1,82 @@
+import queue
+from concurrent.futures import ThreadPoolExecutor
+
+# --- 画面を止めずにモデルを呼ぶための仕組み ---
+# お題の生成や類似度の計算は別スレッドで行い、結果だけを Tk のメインスレッドに戻す。
+# Tk のウィジェットはメインスレッド以外から触れないので、結果はキューに入れて after() で取りに行く
+DEFAULT_WORKERS = 2
+POLL_INTERVAL_MS = 20  # 結果が届いていないか見に行く間隔
+
+
+class GameController:
+    """モデルを使う処理を別スレッドで実行し、終わったらメインスレッドでコールバックを呼ぶ
+
+    要求はチャンネル（"start" や "guess" など）ごとに1つだけ生かしておく。同じチャンネルに
+    新しい要求が来たら古い要求は取り消し、取り消しが間に合わなかった古い結果は捨てる。
+    """
+
+    def __init__(self, widget, max_workers=DEFAULT_WORKERS, poll_interval=POLL_INTERVAL_MS):
+        self.widget = widget
+        self.poll_interval = poll_interval
+        self._executor = ThreadPoolExecutor(max_workers, thread_name_prefix="GameController")
+        self._results = queue.SimpleQueue()
+        self._latest = {}  # チャンネル -> (要求の番号, Future)
+        self._counter = 0
+        self._after_id = None
+
+    def submit(self, channel, func, *args, on_done=None, on_error=None):
+        """func(*args) を別スレッドで実行し、結果を on_done(結果) でメインスレッドに返す
+
+        メインスレッドから呼ぶこと。例外が起きたときは on_error(例外) を呼ぶ。
+        """
+        self.cancel(channel)
+        self._counter += 1
+        token = self._counter
+        future = self._executor.submit(func, *args)
+        self._latest[channel] = (token, future)
+        # 完了の通知は別スレッドから来るので、キューに入れるだけにする
+        future.add_done_callback(lambda f: self._results.put((channel, token, f, on_done, on_error)))
+        if self._after_id is None:
+            self._after_id = self.widget.after(self.poll_interval, self._poll)
+        return future
+
+    def busy(self, channel):
+        """そのチャンネルの要求が実行中か"""
+        return channel in self._latest
+
+    def cancel(self, channel):
+        """そのチャンネルの要求を取り消す（実行中なら結果を捨てる）"""
+        entry = self._latest.pop(channel, None)
+        if entry is not None:
+            entry[1].cancel()
+
+    def _poll(self):
+        self._after_id = None
+        while True:
+            try:
+                channel, token, future, on_done, on_error = self._results.get_nowait()
+            except queue.Empty:
+                break
+            latest = self._latest.get(channel)
+            if latest is None or latest[0] != token or future.cancelled():
+                continue  # 取り消された、または新しい要求に置き換えられた古い結果
+            del self._latest[channel]
+            error = future.exception()
+            if error is not None:
+                if on_error:
+                    on_error(error)
+                else:
+                    print(f"バックグラウンド処理でエラーが発生しました ({channel}): {error}")
+            elif on_done:
+                on_done(future.result())
+        if self._latest:
+            self._after_id = self.widget.after(self.poll_interval, self._poll)
+
+    def close(self):
+        """実行待ちの要求を取り消してスレッドを止める"""
+        for channel in list(self._latest):
+            self.cancel(channel)
+        if self._after_id is not None:
+            self.widget.after_cancel(self._after_id)
+            self._after_id = None
+        self._executor.shutdown(wait=False, cancel_futures=True)
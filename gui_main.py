@@ -1,20 +1,43 @@
+import startup_report  # 起動時間を計るので最初に読み込む
 import customtkinter
 import tkinter as tk
 import threading
 import time
 import os
 import random
+from concurrent.futures import ThreadPoolExecutor
 import game_logic
+import metrics
+import question_pool
+import model_registry
+import gui_controller
+import history_store
+import lazy_import
+from guess_ranking import GuessRanking
 
 customtkinter.set_appearance_mode("System")
 customtkinter.set_default_color_theme("blue")
+TIMER_INTERVAL_MS = 250  # 残り時間の表示を見直す最大の間隔
 
 class WordGameApp(customtkinter.CTk):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.settings = game_logic.load_settings()
-        customtkinter.set_appearance_mode(self.settings["appearance_mode"])
-        
+        with startup_report.stage("settings"):
+            self.settings = game_logic.load_settings()
+            customtkinter.set_appearance_mode(self.settings["appearance_mode"])
+            # 遊んだゲームは裏のスレッドで履歴に書き込む
+            self.history = history_store.open_store(self.settings["history_file"])
+        self.question_pools = None; self.model_switcher = model_registry.ModelSwitcher()
+        # 設定の保存は1本のスレッドで順に行い、保存どうしが重ならないようにする
+        self.settings_writer = ThreadPoolExecutor(1, thread_name_prefix="SettingsWriter")
+        # モデルの準備ができる前に選ばれたゲーム（準備ができたら始める）
+        self.data_ready = False; self.model_ready = False; self.load_error = None; self.pending_start = None
+        with startup_report.stage("window"): self.build_window()
+        # 最初の描画が終わった頃に呼ばれるので、ここまでを「画面が出るまで」とする
+        self.after_idle(startup_report.mark, "window_shown")
+        self.show_frame(LoadingPage); self.start_loading()
+
+    def build_window(self):
         self.title("言葉当てゲーム"); self.geometry("600x750"); self.minsize(500, 700)
         self.title_font = ("Helvetica", 36, "bold"); self.info_font = ("Helvetica", 18)
         self.button_font = ("Helvetica", 18); self.game_font = ("Helvetica", 14)
@@ -22,42 +45,98 @@ class WordGameApp(customtkinter.CTk):
 
         self.protocol("WM_DELETE_WINDOW", self.ask_quit)
 
+        # モデルを使う処理は別スレッドで行い、待っている間も画面が固まらないようにする
+        self.game_controller = gui_controller.GameController(self)
         container = customtkinter.CTkFrame(self); container.pack(side="top", fill="both", expand=True)
         container.grid_rowconfigure(0, weight=1); container.grid_columnconfigure(0, weight=1)
         self.frames = {}
         for F in (LoadingPage, StartPage, GamePage, SettingsPage, CustomModePage):
             frame = F(container, self); self.frames[F] = frame; frame.grid(row=0, column=0, sticky="nsew")
-        
-        self.show_frame(LoadingPage); self.start_loading()
 
     def show_frame(self, page_class):
         if page_class == LoadingPage: self.frames[LoadingPage].start_hit_and_blow()
         if page_class == SettingsPage: self.frames[SettingsPage].refresh_settings()
+        if page_class == StartPage: self.frames[StartPage].show_status("" if self.model_ready else self.load_error or "モデルを読み込み中です。その間も設定を変更できます。")
+        # ゲーム画面以外に移ったら、生成中・準備待ちのお題はもう要らないので取り消す
+        if page_class != GamePage: self.game_controller.cancel("start"); self.pending_start = None; self.set_starting(False)
         frame = self.frames[page_class]; frame.tkraise()
 
     def ask_quit(self):
         if messagebox.askyesno("終了確認", "本当にアプリケーションを終了しますか？"):
+            if self.question_pools: self.question_pools.stop()
+            # 設定の保存がまだ終わっていなければ、書き終わるまで待つ
+            self.settings_writer.shutdown(wait=True)
+            self.game_controller.close()
+            # 遊んでいる途中で閉じたゲームは、やめたゲームとして記録しておく
+            game_page = self.frames[GamePage]
+            if self.history and game_page.session_id: self.history.finish_session(game_page.session_id, history_store.ABANDONED); game_page.session_id = None
+            if self.history: self.history.close()
             self.destroy()
 
     def save_and_apply_settings(self, new_settings):
-        self.settings = new_settings; game_logic.save_settings(self.settings)
+        # ファイルへの書き込みは裏で行う（続けて保存しても順に書くので、最後の設定が残る）
+        self.settings = new_settings; self.settings_writer.submit(game_logic.save_settings, dict(self.settings))
         customtkinter.set_appearance_mode(self.settings["appearance_mode"])
+        # 最初の読み込み中に変えた場合は、読み込みが終わってから切り替える（check_loading_status）
+        if self.model_ready and model_registry.resolve_model_path(self.settings["model_file"]) != game_logic.get_state().source_path: self.switch_model()
+
+    def switch_model(self):
+        # 今のモデルで遊び続けられるように、新しいモデルは裏で読み込んでから差し替える
+        model_path = model_registry.resolve_model_path(self.settings["model_file"])
+        if self.model_switcher.switch(model_path, self.settings, self.easy_data): self.after(200, self.check_model_switch)
+        else: messagebox.showinfo("モデルの切り替え", "別のモデルを読み込み中です。終わってからもう一度お試しください。")
+
+    def check_model_switch(self):
+        if self.model_switcher.busy: self.after(200, self.check_model_switch); return
+        if self.model_switcher.error: messagebox.showerror("モデルの切り替え", self.model_switcher.error); return
+        # 先読みしたお題は古いモデルで作ったものなので、新しいモデルで作り直す
+        if self.question_pools: self.question_pools.stop()
+        self.question_pools = question_pool.QuestionPoolManager(self.easy_data, self.normal_data, self.hard_data)
+        messagebox.showinfo("モデルの切り替え", f"モデルを「{os.path.basename(self.model_switcher.loading_path)}」に切り替えました。")
 
     def start_loading(self):
+        self.load_progress = None
         self.loading_thread = threading.Thread(target=self.load_data_in_background, daemon=True)
         self.loading_thread.start()
         self.check_loading_status()
 
     def load_data_in_background(self):
-        # MODEL_FILE_NAME = "jawiki.entity_vectors.300d.txt"
-        MODEL_FILE_NAME = "cc.ja.300.vec"
-        model_path = os.path.join("model", MODEL_FILE_NAME)
-        game_logic.load_model(model_path); self.easy_data = game_logic.load_json_data("data/easy_data.json")
-        self.normal_data = game_logic.load_json_data("data/normal_data.json"); self.hard_data = game_logic.load_json_data("data/hard_data.json")
+        # お題のデータは小さいので先に読み、モデルを待つ間もタイトル画面や設定画面を触れるようにする
+        with startup_report.stage("data"):
+            self.easy_data = game_logic.load_json_data("data/easy_data.json")
+            self.normal_data = game_logic.load_json_data("data/normal_data.json"); self.hard_data = game_logic.load_json_data("data/hard_data.json")
+        self.data_ready = True
+        try:
+            # 数値計算ライブラリは画面を出した後にここで読み込む（lazy_import）
+            with startup_report.stage("numeric_import"): lazy_import.load("numpy")
+        except ImportError as e:
+            self.load_error = f"numpy を読み込めませんでした: {e}"; return
+        model_path = model_registry.resolve_model_path(self.settings["model_file"])
+        with startup_report.stage("model"):
+            loaded = game_logic.load_model(model_path, limit=self.settings["vocab_limit"], progress_callback=self.on_load_progress, store=self.settings["vector_store"])
+        if not loaded: self.load_error = f"モデル '{os.path.basename(model_path)}' を読み込めませんでした。"; return
+        with startup_report.stage("indexes"):
+            game_logic.prepare_neighbor_index(model_path, self.settings["neighbor_backend"], self.settings["neighbor_nprobe"]); game_logic.prepare_word_index()
+            game_logic.prepare_easy_data(self.easy_data)
+        startup_report.mark("model_ready")
+
+    def on_load_progress(self, progress):
+        # 読み込みスレッドから呼ばれるので、値を置いておくだけにして描画はメインスレッドで行う
+        self.load_progress = progress
 
     def check_loading_status(self):
-        if self.loading_thread.is_alive(): self.after(100, self.check_loading_status)
-        else: self.frames[LoadingPage].on_loading_complete()
+        if self.load_progress is not None: self.frames[LoadingPage].show_progress(self.load_progress)
+        if self.data_ready and not self.frames[LoadingPage].data_ready: self.frames[LoadingPage].on_data_ready(); startup_report.mark("interactive")
+        if self.loading_thread.is_alive(): self.after(100, self.check_loading_status); return
+        if self.load_error:
+            self.frames[LoadingPage].on_loading_failed(self.load_error); self.frames[StartPage].show_status(self.load_error); return
+        # 読み込みが終わったら、各難易度のお題を裏で先に作っておく
+        self.question_pools = question_pool.QuestionPoolManager(self.easy_data, self.normal_data, self.hard_data)
+        self.model_ready = True; self.frames[LoadingPage].on_loading_complete(); self.frames[StartPage].show_status("")
+        startup_report.finish("model_ready")
+        # 読み込み中に選ばれたゲームや、変更されたモデルの設定をここで反映する
+        if self.pending_start: difficulty, self.pending_start = self.pending_start, None; self.start_game(difficulty)
+        if model_registry.resolve_model_path(self.settings["model_file"]) != game_logic.get_state().source_path: self.switch_model()
 
     def start_game(self, difficulty):
         # ▼▼▼ カスタムモードのリプレイに対応 ▼▼▼
@@ -65,25 +144,65 @@ class WordGameApp(customtkinter.CTk):
             # "custom"が指定されたら、カスタムゲーム開始処理に丸投げする
             self.start_custom_game(self.last_custom_time, self.last_custom_keyword)
             return
+        if not self.model_ready:
+            self.pending_start = difficulty; self.frames[StartPage].show_status("モデルを読み込み中です。準備ができたらゲームを始めます..."); return
+        # お題を作っている間にボタンを連打されても、要求を重ねない
+        if self.game_controller.busy("start"): return
             
         self.current_difficulty = difficulty
         time_limit = self.settings["time_limits"][difficulty]
-        question, genre = game_logic.generate_question_by_difficulty(difficulty, self.easy_data, self.normal_data, self.hard_data)
-        if not question: return
+        # 先読みプールにお題があればすぐに始められる。空のときだけその場で生成する
+        pooled = self.question_pools.get(difficulty) if self.question_pools else None
+        self.set_starting(True)
+        self.game_controller.submit("start", self.pick_question, difficulty, pooled, on_done=lambda result: self.on_question_ready(*result, time_limit), on_error=self.on_question_failed)
+
+    def set_starting(self, starting):
+        # お題を作っている間は「もう一回遊ぶ」を押せないようにして、作っていることを表示する
+        self.frames[GamePage].replay_button.configure(state='disabled' if starting else 'normal')
+        if starting: self.frames[StartPage].show_status("お題を生成中...")
+
+    def pick_question(self, difficulty, pooled):
+        # 別スレッドで呼ばれるので、ウィジェットには触れない
+        # モデルを切り替えた直後は古いモデルのお題が残っていることがあるので確かめる
+        if pooled and game_logic.word_exists(pooled[0]): return pooled
+        return game_logic.generate_question_by_difficulty(difficulty, self.easy_data, self.normal_data, self.hard_data)
+
+    def on_question_ready(self, question, genre, time_limit):
+        self.set_starting(False)
+        if not question: self.on_question_failed(); return
+        self.frames[StartPage].show_status("")
         game_frame = self.frames[GamePage]
         game_frame.setup_new_game(question, genre, time_limit, self.settings.copy())
         self.show_frame(GamePage)
 
+    def on_question_failed(self, error=None):
+        # 先読みのお題もなく生成にも失敗したときは、始めようとした画面（タイトルかゲーム終了後）に知らせる
+        self.set_starting(False)
+        if error is not None: print(f"お題の生成中にエラーが発生しました: {error}")
+        message = "お題を生成できませんでした。もう一度お試しください。"
+        self.frames[StartPage].show_status(message); self.frames[GamePage].feedback_label.configure(text=message, font=self.game_font, text_color="#FF5733")
+
     def start_custom_game(self, time_limit, keyword):
+        if self.game_controller.busy("start"): return
         # ▼▼▼ カスタム設定を記憶 ▼▼▼
         self.current_difficulty = "custom"
         self.last_custom_time = time_limit
         self.last_custom_keyword = keyword
+        if not self.model_ready:
+            self.pending_start = "custom"; self.frames[CustomModePage].show_error("モデルを読み込み中です。準備ができたらゲームを始めます..."); return
         
-        question = game_logic.generate_custom_question(keyword)
+        pooled = self.question_pools.get_custom(keyword) if self.question_pools else None
+        self.game_controller.submit("start", lambda: pooled[0] if pooled else game_logic.generate_custom_question(keyword),
+                                    on_done=lambda question: self.on_custom_question_ready(question, time_limit, keyword),
+                                    on_error=lambda error: self.frames[CustomModePage].show_error(f"お題の生成中にエラーが発生しました: {error}"))
+
+    def on_custom_question_ready(self, question, time_limit, keyword):
+        if question and self.question_pools: self.question_pools.watch_custom(keyword)
         if not question:
             custom_frame = self.frames[CustomModePage]
             custom_frame.show_error("お題を生成できませんでした。\nキーワードが存在しないか、候補が見つかりません。")
+            # ゲーム終了後の「もう一回遊ぶ」から始めた場合も、その画面に知らせる
+            self.frames[GamePage].feedback_label.configure(text="お題を生成できませんでした。キーワードの近くに候補が見つかりません。", font=self.game_font, text_color="#FF5733")
             return
         genre = f"カスタム:「{keyword}」"
         game_frame = self.frames[GamePage]
@@ -93,7 +212,7 @@ class WordGameApp(customtkinter.CTk):
 # (LoadingPage, StartPage, SettingsPage, GamePageのクラス定義は変更なし。長いので省略)
 class LoadingPage(customtkinter.CTkFrame):
     def __init__(self, parent, controller):
-        super().__init__(parent); self.controller = controller; self.answer = ""; self.guesses = 0; self.grid_columnconfigure(0, weight=1)
+        super().__init__(parent); self.controller = controller; self.answer = ""; self.guesses = 0; self.data_ready = False; self.grid_columnconfigure(0, weight=1)
         top_frame = customtkinter.CTkFrame(self, fg_color="transparent"); top_frame.grid(row=0, column=0, pady=10, padx=20, sticky="ew")
         self.loading_label = customtkinter.CTkLabel(top_frame, text="ゲームの準備をしています...", font=controller.info_font); self.loading_label.pack(side="left")
         self.progress_bar = customtkinter.CTkProgressBar(top_frame, mode='indeterminate'); self.progress_bar.pack(side="right", padx=10, fill='x', expand=True)
@@ -121,6 +240,16 @@ class LoadingPage(customtkinter.CTkFrame):
         self.history_text.configure(state='disabled'); self.entry.delete(0, 'end')
         if hits == 4: self.feedback_label.configure(text=f"正解！ {self.guesses}回でクリアしました！", text_color="green"); [w.configure(state='disabled') for w in [self.entry, self.button]]
         else: self.feedback_label.configure(text="")
+    def show_progress(self, progress):
+        if self.progress_bar.cget("mode") != "determinate": self.progress_bar.stop(); self.progress_bar.configure(mode="determinate")
+        self.progress_bar.set(progress.fraction)
+        eta_text = f" 残り約{int(progress.eta)}秒" if progress.eta is not None else ""
+        self.loading_label.configure(text=f"モデルを読み込んでいます... {progress.fraction:.0%}{eta_text}")
+    def on_data_ready(self):
+        # お題のデータが読めたら、モデルを待つ間もタイトル画面や設定画面に進めるようにする
+        self.data_ready = True; self.start_button.grid(row=2, column=0, columnspan=2, pady=20, ipadx=20, ipady=10)
+    def on_loading_failed(self, message):
+        self.progress_bar.stop(); self.progress_bar.grid_forget(); self.loading_label.configure(text=message, text_color="red")
     def on_loading_complete(self):
         self.progress_bar.stop(); self.progress_bar.grid_forget()
         self.loading_label.configure(text="準備が完了しました！");
@@ -131,6 +260,7 @@ class StartPage(customtkinter.CTkFrame):
         super().__init__(parent); self.controller = controller
         customtkinter.CTkLabel(self, text="言葉当てゲーム", font=controller.title_font).pack(pady=40)
         customtkinter.CTkLabel(self, text="難易度を選択してください", font=controller.info_font).pack(pady=10)
+        self.status_label = customtkinter.CTkLabel(self, text="", font=controller.game_font, text_color="orange"); self.status_label.pack()
         mode_frame = customtkinter.CTkFrame(self, fg_color="transparent"); mode_frame.pack(pady=10)
         customtkinter.CTkButton(mode_frame, text="かんたん", font=controller.button_font, command=lambda: controller.start_game("1")).pack(pady=10, ipadx=20, ipady=5)
         customtkinter.CTkButton(mode_frame, text="普通", font=controller.button_font, command=lambda: controller.start_game("2")).pack(pady=10, ipadx=20, ipady=5)
@@ -139,10 +269,11 @@ class StartPage(customtkinter.CTkFrame):
         bottom_frame = customtkinter.CTkFrame(self, fg_color="transparent"); bottom_frame.pack(pady=40, fill="x", expand=True)
         customtkinter.CTkButton(bottom_frame, text="設定", font=controller.info_font, command=lambda: controller.show_frame(SettingsPage)).pack(side="left", padx=50)
         customtkinter.CTkButton(bottom_frame, text="終了", font=controller.info_font, fg_color="#c026d3", hover_color="#a21caf", command=controller.ask_quit).pack(side="right", padx=50)
+    def show_status(self, text): self.status_label.configure(text=text)
 class SettingsPage(customtkinter.CTkFrame):
     def __init__(self, parent, controller):
         super().__init__(parent); self.controller = controller
-        self.vars = {"appearance_mode": tk.StringVar(), "time_easy": tk.IntVar(), "time_normal": tk.IntVar(), "time_hard": tk.IntVar(), "ranking_count": tk.IntVar(), "show_similarity": tk.BooleanVar()}
+        self.vars = {"appearance_mode": tk.StringVar(), "time_easy": tk.IntVar(), "time_normal": tk.IntVar(), "time_hard": tk.IntVar(), "ranking_count": tk.IntVar(), "show_similarity": tk.BooleanVar(), "show_rank": tk.BooleanVar(), "model_file": tk.StringVar()}
         self.grid_columnconfigure(1, weight=1)
         customtkinter.CTkLabel(self, text="設定", font=controller.title_font).grid(row=0, column=0, columnspan=3, pady=20, padx=20)
         customtkinter.CTkLabel(self, text="GUIの明るさ:").grid(row=1, column=0, padx=20, pady=10, sticky="w")
@@ -157,18 +288,29 @@ class SettingsPage(customtkinter.CTkFrame):
         self.ranking_count_label = customtkinter.CTkLabel(self, text="", font=controller.value_font); customtkinter.CTkLabel(self, text="ランキング表示項目数:", font=controller.info_font).grid(row=6, column=0, padx=20, pady=10, sticky="w")
         customtkinter.CTkSlider(self, from_=0, to=20, number_of_steps=21, variable=self.vars["ranking_count"], command=lambda v: self.ranking_count_label.configure(text=int(v))).grid(row=6, column=1, padx=20, pady=10, sticky="ew"); self.ranking_count_label.grid(row=6, column=2, padx=20)
         customtkinter.CTkCheckBox(self, text="ランキングに一致度を表示する", variable=self.vars["show_similarity"], font=controller.info_font).grid(row=7, column=0, columnspan=3, padx=20, pady=20)
-        customtkinter.CTkButton(self, text="保存して戻る", font=controller.button_font, command=self.save_and_exit).grid(row=8, column=0, columnspan=3, pady=20, ipadx=10, ipady=10)
+        customtkinter.CTkCheckBox(self, text="推測した単語が何番目に近いかを表示する", variable=self.vars["show_rank"], font=controller.info_font).grid(row=8, column=0, columnspan=3, padx=20, pady=(0, 20))
+        customtkinter.CTkLabel(self, text="モデル:", font=controller.info_font).grid(row=9, column=0, padx=20, pady=10, sticky="w")
+        self.model_menu = customtkinter.CTkOptionMenu(self, values=[""], variable=self.vars["model_file"]); self.model_menu.grid(row=9, column=1, columnspan=2, padx=20, pady=10, sticky="w")
+        customtkinter.CTkButton(self, text="保存して戻る", font=controller.button_font, command=self.save_and_exit).grid(row=10, column=0, columnspan=3, pady=20, ipadx=10, ipady=10)
     def refresh_settings(self):
         s = self.controller.settings; self.vars["appearance_mode"].set(s["appearance_mode"])
         self.vars["time_easy"].set(s["time_limits"]["1"]); self.time_easy_label.configure(text=s["time_limits"]["1"])
         self.vars["time_normal"].set(s["time_limits"]["2"]); self.time_normal_label.configure(text=s["time_limits"]["2"])
         self.vars["time_hard"].set(s["time_limits"]["3"]); self.time_hard_label.configure(text=s["time_limits"]["3"])
         self.vars["ranking_count"].set(s["ranking_display_count"]); self.ranking_count_label.configure(text=s["ranking_display_count"])
-        self.vars["show_similarity"].set(s["show_similarity"])
+        self.vars["show_similarity"].set(s["show_similarity"]); self.vars["show_rank"].set(s["show_rank"])
+        # model フォルダの中身は変わることがあるので、開くたびに一覧を作り直す
+        model_names = [info.name for info in model_registry.list_models()]
+        current_model = os.path.basename(game_logic.get_state().source_path or "") or s["model_file"]
+        if current_model and current_model not in model_names: model_names.insert(0, current_model)
+        self.model_menu.configure(values=model_names or [""]); self.vars["model_file"].set(current_model or "")
     def save_and_exit(self):
-        new_s = {"appearance_mode": self.vars["appearance_mode"].get(), "bgm_volume": self.controller.settings["bgm_volume"], "se_volume": self.controller.settings["se_volume"],
+        # 画面にない設定項目（vocab_limitなど）も消えないように、現在の設定をもとに上書きする
+        new_s = dict(self.controller.settings)
+        new_s.update({"appearance_mode": self.vars["appearance_mode"].get(),
                  "time_limits": {"1": self.vars["time_easy"].get(), "2": self.vars["time_normal"].get(), "3": self.vars["time_hard"].get()},
-                 "ranking_display_count": self.vars["ranking_count"].get(), "show_similarity": self.vars["show_similarity"].get()}
+                 "ranking_display_count": self.vars["ranking_count"].get(), "show_similarity": self.vars["show_similarity"].get(), "show_rank": self.vars["show_rank"].get(),
+                 "model_file": self.vars["model_file"].get() or new_s["model_file"]})
         self.controller.save_and_apply_settings(new_s); self.controller.show_frame(StartPage)
 class CustomModePage(customtkinter.CTkFrame):
     def __init__(self, parent, controller):
@@ -190,7 +332,7 @@ class CustomModePage(customtkinter.CTkFrame):
     def show_error(self, message): self.error_label.configure(text=message)
 class GamePage(customtkinter.CTkFrame):
     def __init__(self, parent, controller):
-        super().__init__(parent); self.controller = controller; self.after_id = None; self.grid_columnconfigure((0, 1), weight=1); self.grid_rowconfigure(4, weight=1)
+        super().__init__(parent); self.controller = controller; self.after_id = None; self.session_id = None; self.grid_columnconfigure((0, 1), weight=1); self.grid_rowconfigure(4, weight=1)
         self.genre_label = customtkinter.CTkLabel(self, text="", font=controller.info_font); self.timer_label = customtkinter.CTkLabel(self, text="", font=controller.info_font)
         self.guess_entry = customtkinter.CTkEntry(self, font=controller.button_font); self.guess_button = customtkinter.CTkButton(self, text="推測！", font=controller.button_font, command=self.make_a_guess)
         self.feedback_label = customtkinter.CTkLabel(self, text="", font=controller.game_font, wraplength=500); self.ranking_title_label = customtkinter.CTkLabel(self, text="--- 推測単語ランキング ---", font=controller.info_font)
@@ -205,52 +347,100 @@ class GamePage(customtkinter.CTkFrame):
         self.ranking_text.grid(row=4, column=0, columnspan=2, pady=10, padx=20, sticky="nsew"); self.giveup_button.grid(row=5, column=0, columnspan=2, pady=10)
         self.game_over_frame.grid(row=6, column=0, columnspan=2, pady=10); self.guess_entry.bind("<Return>", self.make_a_guess)
     def setup_new_game(self, question, genre, time_limit, settings):
-        self.question, self.time_limit, self.start_time, self.guessed_words, self.settings = question, time_limit, time.time(), {}, settings
+        # 前のゲームの判定がまだ終わっていなければ、その結果は捨てる
+        self.controller.game_controller.cancel("guess")
+        self.question, self.time_limit, self.deadline, self.ranking, self.settings = question, time_limit, time.monotonic() + time_limit, GuessRanking(), settings
+        self.similarity_table = game_logic.create_similarity_table(question)
+        history = self.controller.history
+        self.session_id = history.start_session(question, genre, self.controller.current_difficulty, settings["player_name"],
+                                                os.path.basename(game_logic.get_state().source_path or ""), time_limit) if history else None
         self.genre_label.configure(text=f"ジャンル: {genre}"); self.timer_label.configure(text=f"残り時間: {time_limit}秒")
         self.feedback_label.configure(text="------", font=self.controller.game_font, text_color=customtkinter.ThemeManager.theme["CTkLabel"]["text_color"])
         for widget in [self.guess_entry, self.guess_button, self.giveup_button]: widget.configure(state='normal')
-        self.ranking_text.configure(state='normal'); self.ranking_text.delete('1.0', 'end'); self.ranking_text.configure(state='disabled')
+        self.ranking_text.configure(state='normal'); self.ranking_text.delete('1.0', 'end'); self.ranking_text.configure(state='disabled'); self.ranking_lines = []
         self.guess_entry.delete(0, 'end'); self.guess_entry.focus_set(); self.game_over_frame.grid_remove()
         if self.after_id: self.after_cancel(self.after_id);
         self.update_timer()
     def update_timer(self):
-        remaining_time = self.time_limit - (time.time() - self.start_time)
-        if remaining_time > 0: self.timer_label.configure(text=f"残り時間: {int(remaining_time)}秒"); self.after_id = self.after(1000, self.update_timer)
-        else: self.game_over(is_win=False)
-    def make_a_guess(self, event=None):
-        guess = self.guess_entry.get().strip();
-        if not guess: return
-        if guess == self.question: self.game_over(is_win=True); return
-        if not game_logic.word_exists(guess): self.feedback_label.configure(text="その単語は辞書にありません。", text_color="red")
-        elif guess in self.guessed_words: self.feedback_label.configure(text="その単語は既に推測済みです。", text_color="orange")
+        # after() の呼び出しが遅れても残り時間がずれないように、単調増加する時計の締め切りから毎回求める
+        remaining_time = self.deadline - time.monotonic()
+        if remaining_time <= 0: self.game_over(is_win=False); return
+        timer_text = f"残り時間: {int(remaining_time)}秒"
+        if self.timer_label.cget("text") != timer_text: self.timer_label.configure(text=timer_text)
+        # 次に表示の秒が切り替わる頃に起きる。遅れても次の呼び出しで追いつく
+        self.after_id = self.after(min(TIMER_INTERVAL_MS, int(remaining_time % 1 * 1000) + 1), self.update_timer)
+    def make_a_guess(self, event=None): self.handle_guess()
+    def handle_guess(self):
+        # 判定中に Enter を連打されても、要求を重ねない
+        if self.controller.game_controller.busy("guess"): return
+        typed = self.guess_entry.get().strip();
+        if not typed: return
+        # 入力してから判定の結果が届くまで（別スレッドでの判定を含む）を計る
+        started = time.perf_counter()
+        if typed == self.question: self.observe_guess(started); self.record_guess(typed, typed, "correct"); self.game_over(is_win=True); return
+        self.guess_button.configure(state='disabled')
+        self.controller.game_controller.submit("guess", self.evaluate_guess, self.question, typed, self.similarity_table,
+                                               on_done=lambda result: self.show_guess_result(typed, *result, started=started),
+                                               on_error=lambda error: self.on_guess_error(error, started))
+    @staticmethod
+    def observe_guess(started): metrics.observe("gui_make_a_guess", time.perf_counter() - started)
+    @staticmethod
+    def evaluate_guess(question, typed, table):
+        # 別スレッドで呼ばれるので、ウィジェットには触れない
+        # 「りんご」と「リンゴ」のような表記ゆれは語彙の表記に直してから判定する
+        guess = game_logic.resolve_word(typed)
+        if guess is None or guess == question: return guess, None, None
+        return (guess,) + tuple(game_logic.check_similarity_with_rank(question, guess, table))
+    def on_guess_error(self, error, started=None):
+        if started is not None: self.observe_guess(started)
+        self.guess_button.configure(state='normal'); self.feedback_label.configure(text=f"判定に失敗しました: {error}", text_color="red")
+    def show_guess_result(self, typed, guess, similarity, rank, started=None):
+        if started is not None: self.observe_guess(started)
+        self.guess_button.configure(state='normal')
+        if guess == self.question: self.record_guess(typed, guess, "correct"); self.game_over(is_win=True); return
+        if guess is None: self.record_guess(typed, None, "unknown"); self.feedback_label.configure(text="その単語は辞書にありません。", text_color="red")
+        elif guess in self.ranking: self.record_guess(typed, guess, "duplicate"); self.feedback_label.configure(text="その単語は既に推測済みです。", text_color="orange")
         else:
-            similarity = game_logic.check_similarity(self.question, guess); self.guessed_words[guess] = similarity
-            if self.settings["show_similarity"]: feedback_text = f"「{guess}」... 正解との近さ: {similarity:.4f}"
+            self.ranking.add(guess, similarity); self.record_guess(typed, guess, "scored", similarity, rank)
+            rank_text = f"（{rank:,}番目に近い単語）" if self.settings["show_rank"] and rank is not None else ""
+            if guess != typed: rank_text = f"（「{typed}」→「{guess}」）" + rank_text
+            if self.settings["show_similarity"]: feedback_text = f"「{guess}」... 正解との近さ: {similarity:.4f}{rank_text}"
+            elif rank_text: feedback_text = f"「{guess}」... {rank_text}"
             else: feedback_text = f"「{guess}」... 推測を受け付けました"
             self.feedback_label.configure(text=feedback_text, text_color="cyan", font=self.controller.game_font); self.update_ranking()
-        self.guess_entry.delete(0, 'end')
+        # 判定を待つ間に次の単語を打ち始めていたら、それは消さない
+        if self.guess_entry.get().strip() == typed: self.guess_entry.delete(0, 'end')
+    def record_guess(self, typed, word, status, similarity=None, rank=None):
+        if self.session_id: self.controller.history.record_guess(self.session_id, typed, word, status, similarity, rank)
     def update_ranking(self):
-        self.ranking_text.configure(state='normal'); self.ranking_text.delete('1.0', 'end')
-        sorted_guesses = sorted(self.guessed_words.items(), key=lambda i: i[1], reverse=True); total_guesses = len(sorted_guesses)
         display_count = self.settings["ranking_display_count"]
-        if display_count == 0: self.ranking_text.configure(state='disabled'); return
-        show_similarity = self.settings["show_similarity"]; text_to_display = []
-        if total_guesses <= display_count * 2 and display_count != 0:
-            for i, (word, sim) in enumerate(sorted_guesses): text_to_display.append(f"{i+1}位: {word}" + (f" ({sim:.2f})" if show_similarity else ""))
-        elif display_count != 0:
-            text_to_display.append(f"【正解に近いトップ{display_count}】"); [text_to_display.append(f"{i+1}位: {w}" + (f" ({s:.2f})" if show_similarity else "")) for i, (w, s) in enumerate(sorted_guesses[:display_count])]
-            text_to_display.append("..."); text_to_display.append(f"【正解から遠いワースト{display_count}】")
-            [text_to_display.append(f"{total_guesses-display_count+i+1}位: {w}" + (f" ({s:.2f})" if show_similarity else "")) for i, (w, s) in enumerate(sorted_guesses[-display_count:])]
-        self.ranking_text.insert('end', "\n".join(text_to_display)); self.ranking_text.configure(state='disabled')
+        if display_count == 0: self.render_ranking_lines([]); return
+        show_similarity = self.settings["show_similarity"]; top_rows, bottom_rows = self.ranking.display_rows(display_count)
+        format_row = lambda rank, w, s: f"{rank}位: {w}" + (f" ({s:.2f})" if show_similarity else "")
+        if not bottom_rows: text_to_display = [format_row(*row) for row in top_rows]
+        else:
+            text_to_display = [f"【正解に近いトップ{display_count}】"] + [format_row(*row) for row in top_rows]
+            text_to_display += ["...", f"【正解から遠いワースト{display_count}】"] + [format_row(*row) for row in bottom_rows]
+        self.render_ranking_lines(text_to_display)
+    def render_ranking_lines(self, lines):
+        # 前回と内容が変わった行だけを書き換えて、ちらつきと再描画の手間を減らす
+        old_lines = self.ranking_lines; self.ranking_text.configure(state='normal')
+        if len(lines) < len(old_lines): self.ranking_text.delete(f"{len(lines)}.end" if lines else '1.0', 'end')
+        for i in range(min(len(lines), len(old_lines))):
+            if lines[i] != old_lines[i]: self.ranking_text.delete(f"{i+1}.0", f"{i+1}.end"); self.ranking_text.insert(f"{i+1}.0", lines[i])
+        for i in range(len(old_lines), len(lines)): self.ranking_text.insert('end', ("\n" if i > 0 else "") + lines[i])
+        self.ranking_lines = list(lines); self.ranking_text.configure(state='disabled')
     def give_up(self): self.game_over(is_win=False, gave_up=True)
     def game_over(self, is_win, gave_up=False):
         if self.after_id: self.after_cancel(self.after_id)
+        self.controller.game_controller.cancel("guess")
+        if self.session_id: self.controller.history.finish_session(self.session_id, "won" if is_win else "gave_up" if gave_up else "timeout"); self.session_id = None
         for widget in [self.guess_entry, self.guess_button, self.giveup_button]: widget.configure(state='disabled')
         final_text = ""; text_color = customtkinter.ThemeManager.theme["CTkLabel"]["text_color"]
         if is_win: final_text = "★★ 正解！おめでとうございます！ ★★"; text_color = "#00BF63"
         else:
             best_score_text = ""
-            if self.guessed_words: best_guess = max(self.guessed_words, key=self.guessed_words.get); best_score = self.guessed_words[best_guess]; best_score_text = f"\nベストスコア: 「{best_guess}」 ({best_score:.4f})"
+            if len(self.ranking): best_guess, best_score = self.ranking.best(); best_score_text = f"\nベストスコア: 「{best_guess}」 ({best_score:.4f})"
             if gave_up: final_text = f"ギブアップしました。正解は「{self.question}」でした。{best_score_text}"; text_color = "#FFA500"
             else: final_text = f"時間切れ！正解は「{self.question}」でした。{best_score_text}"; text_color = "#FF5733"
         self.feedback_label.configure(text=final_text, font=self.controller.result_font, text_color=text_color); self.game_over_frame.grid()
@@ -259,6 +449,7 @@ class GamePage(customtkinter.CTkFrame):
 if __name__ == "__main__":
     # tkinter.messagebox を使うために必要
     from tkinter import messagebox
+    startup_report.mark("imports")
     random.seed()
     app = WordGameApp()
     app.mainloop()
\ No newline at end of file
@@ -0,0 +1,363 @@
+import os
+import sys
+import json
+import time
+import uuid
+import queue
+import sqlite3
+import argparse
+import threading
+import contextlib
+from concurrent.futures import Future
+
+# --- ゲームの履歴 ---
+# 遊んだゲーム（お題・ジャンル・難易度・結果）と、推測1回ごとの記録を SQLite に残す。
+# 書き込みは専用のスレッドが少し溜めてから1回のトランザクションで行うので、ゲームの進行はディスクを待たない
+DEFAULT_PATH = "history.sqlite3"
+DEFAULT_BATCH_SIZE = 1000  # 1回のトランザクションでまとめて書く件数の上限
+DEFAULT_FLUSH_INTERVAL = 0.5  # 最初の書き込みが届いてから、ほかの書き込みを待つ最大の秒数
+ABANDONED = "abandoned"  # 決着がつく前にやめた（入力の終わり・ウィンドウを閉じたなど）ゲームの結果
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id TEXT PRIMARY KEY,
+    player TEXT NOT NULL,
+    question TEXT NOT NULL,
+    genre TEXT,
+    difficulty TEXT,
+    model TEXT,
+    time_limit REAL,
+    started_at REAL NOT NULL,
+    ended_at REAL,
+    duration REAL,
+    outcome TEXT,
+    guess_count INTEGER NOT NULL DEFAULT 0,
+    best_word TEXT,
+    best_similarity REAL
+);
+CREATE TABLE IF NOT EXISTS guesses (
+    session_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    input TEXT NOT NULL,
+    word TEXT,
+    status TEXT NOT NULL,
+    similarity REAL,
+    rank INTEGER,
+    at REAL NOT NULL,
+    PRIMARY KEY (session_id, seq)
+) WITHOUT ROWID;
+-- プレイヤーごとの集計は、この索引だけを読めば済む
+CREATE INDEX IF NOT EXISTS idx_sessions_player ON sessions (player, difficulty, outcome, guess_count, duration);
+CREATE INDEX IF NOT EXISTS idx_sessions_solves ON sessions (outcome, duration);
+CREATE INDEX IF NOT EXISTS idx_sessions_difficulty_solves ON sessions (difficulty, outcome, duration);
+CREATE INDEX IF NOT EXISTS idx_sessions_started ON sessions (started_at);
+"""
+
+INSERT_SESSION = """INSERT OR REPLACE INTO sessions (id, player, question, genre, difficulty, model, time_limit, started_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)"""
+INSERT_GUESS = "INSERT OR REPLACE INTO guesses VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+# 推測の回数と最も近かった単語は、終わったときに推測の記録から求める（主キーの範囲を読むだけ）
+FINISH_SESSION = """UPDATE sessions SET ended_at = ?1, duration = ?1 - started_at, outcome = ?2,
+    guess_count = (SELECT COUNT(*) FROM guesses WHERE session_id = ?3 AND status IN ('scored', 'correct')),
+    best_word = (SELECT word FROM guesses WHERE session_id = ?3 AND similarity IS NOT NULL ORDER BY similarity DESC LIMIT 1),
+    best_similarity = (SELECT MAX(similarity) FROM guesses WHERE session_id = ?3)
+    WHERE id = ?3"""
+SESSION_COLUMNS = ("id", "player", "question", "genre", "difficulty", "model", "time_limit", "started_at",
+                   "ended_at", "duration", "outcome", "guess_count", "best_word", "best_similarity")
+
+
+class HistoryStore:
+    """ゲームの履歴を SQLite（WAL モード）に書き込み、集計する
+
+    start_session() / record_guess() / finish_session() は書き込みをキューに入れるだけですぐに戻る。
+    専用のスレッドが batch_size 件まで、または flush_interval 秒まで溜めてからまとめて書くので、
+    たくさんのゲームが同時に進むサーバーでもトランザクションの数は少なく済む。
+    読み出し（集計）は呼んだスレッドで別の接続を開いて行う（WAL なので書き込みと並行して読める）。
+    """
+
+    def __init__(self, path=DEFAULT_PATH, batch_size=DEFAULT_BATCH_SIZE, flush_interval=DEFAULT_FLUSH_INTERVAL):
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        with contextlib.closing(self._connect()) as conn:
+            conn.executescript(SCHEMA)
+        self._queue = queue.SimpleQueue()
+        self._lock = threading.Lock()
+        self._sequences = {}  # 進行中のゲーム -> 次の推測の番号
+        self._closed = False
+        self.written = 0
+        self.transactions = 0
+        self.errors = 0
+        self._thread = threading.Thread(target=self._run, name="HistoryWriter", daemon=True)
+        self._thread.start()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        # WAL なら NORMAL でもデータベースが壊れることはない（電源断で直前の数件を失うことはある）
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    # --- 書き込み（どのスレッドから呼んでもよい） ---
+
+    def start_session(self, question, genre=None, difficulty=None, player="player", model=None, time_limit=None, session_id=None):
+        """ゲームの開始を記録して、そのゲームの ID を返す"""
+        session_id = session_id or uuid.uuid4().hex
+        with self._lock:
+            self._sequences[session_id] = 0
+        self._put("sql", INSERT_SESSION, (session_id, player, question, genre, difficulty, model, time_limit, time.time()))
+        return session_id
+
+    def record_guess(self, session_id, typed, word=None, status="scored", similarity=None, rank=None):
+        """推測1回を記録する（status は scored / correct / unknown / duplicate）"""
+        with self._lock:
+            seq = self._sequences.get(session_id)
+            if seq is None:
+                return  # 開始を記録していない、またはもう終わったゲーム
+            self._sequences[session_id] = seq + 1
+        self._put("sql", INSERT_GUESS, (session_id, seq, typed, word, status,
+                                        float(similarity) if similarity is not None else None,
+                                        int(rank) if rank is not None else None, time.time()))
+
+    def finish_session(self, session_id, outcome):
+        """ゲームの結果（won / gave_up / timeout / abandoned）を記録する"""
+        with self._lock:
+            if self._sequences.pop(session_id, None) is None:
+                return
+        self._put("sql", FINISH_SESSION, (time.time(), outcome, session_id))
+
+    def _put(self, kind, a, b=None):
+        if self._closed:
+            return
+        self._queue.put((kind, a, b))
+
+    def _call(self, func):
+        """書き込み用の接続で func(conn) を実行し、結果を受け取る Future を返す（それまでの書き込みは先に済ませる）"""
+        future = Future()
+        if self._closed:
+            future.set_exception(RuntimeError("HistoryStore は閉じています。"))
+        else:
+            self._queue.put(("call", func, future))
+        return future
+
+    def flush(self, timeout=None):
+        """キューに溜まっている書き込みが終わるまで待つ"""
+        self._call(lambda conn: None).result(timeout)
+
+    def close(self, timeout=5):
+        """残っている書き込みを済ませてからスレッドを止める（終わっていないゲームは abandoned にする）"""
+        if self._closed:
+            return
+        with self._lock:
+            open_sessions = list(self._sequences)
+        for session_id in open_sessions:
+            self.finish_session(session_id, ABANDONED)
+        self._closed = True
+        self._queue.put(("stop", None, None))
+        self._thread.join(timeout)
+
+    # --- 書き込み用のスレッド ---
+
+    def _take_batch(self):
+        batch = [self._queue.get()]
+        # 最初の書き込みから flush_interval だけ、ほかの書き込みが集まるのを待つ
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size and batch[-1][0] == "sql":
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        conn = self._connect()
+        try:
+            while True:
+                if self._write(conn, self._take_batch()):
+                    return
+        finally:
+            conn.close()
+
+    def _write(self, conn, batch):
+        """溜まった書き込みを1回のトランザクションで行う。停止の指示があれば True を返す"""
+        rows = []
+        for kind, a, b in batch:
+            if kind == "sql":
+                rows.append((a, b))
+                continue
+            self._commit(conn, rows)
+            rows = []
+            if kind == "stop":
+                return True
+            try:
+                b.set_result(a(conn))
+            except Exception as e:
+                b.set_exception(e)
+        self._commit(conn, rows)
+        return False
+
+    def _commit(self, conn, rows):
+        if not rows:
+            return
+        try:
+            with conn:
+                # 同じ文が続く部分は executemany でまとめて実行する（順番は変えない）
+                start = 0
+                for i in range(1, len(rows) + 1):
+                    if i == len(rows) or rows[i][0] != rows[start][0]:
+                        conn.executemany(rows[start][0], [params for _, params in rows[start:i]])
+                        start = i
+            self.written += len(rows)
+            self.transactions += 1
+        except sqlite3.Error as e:
+            self.errors += 1
+            print(f"履歴の書き込みに失敗しました（{len(rows)}件）: {e}")
+
+    def stats(self):
+        """監視用の統計を返す"""
+        return {"written": self.written, "transactions": self.transactions, "errors": self.errors,
+                "pending": self._queue.qsize(), "active_sessions": len(self._sequences)}
+
+    # --- 読み出し（呼んだスレッドで実行する） ---
+
+    def _query(self, sql, params=()):
+        with contextlib.closing(self._connect()) as conn:
+            return conn.execute(sql, params).fetchall()
+
+    def player_stats(self, player):
+        """プレイヤーの難易度ごとの成績を返す（終わったゲームだけを数える）"""
+        rows = self._query("""SELECT difficulty, COUNT(*), SUM(outcome = 'won'), SUM(outcome = 'gave_up'), SUM(outcome = 'timeout'),
+            SUM(outcome = 'abandoned'), AVG(CASE WHEN outcome = 'won' THEN guess_count END), MIN(CASE WHEN outcome = 'won' THEN duration END)
+            FROM sessions WHERE player = ? AND outcome IS NOT NULL GROUP BY difficulty""", (player,))
+        by_difficulty = {}
+        for difficulty, games, won, gave_up, timeout, abandoned, mean_guesses, fastest in rows:
+            by_difficulty[difficulty] = {"games": games, "won": won, "gave_up": gave_up, "timeout": timeout, "abandoned": abandoned,
+                                         "win_rate": won / games if games else None,
+                                         "mean_guesses_to_win": mean_guesses, "fastest_win_s": fastest}
+        games = sum(s["games"] for s in by_difficulty.values())
+        won = sum(s["won"] for s in by_difficulty.values())
+        return {"player": player, "games": games, "won": won, "win_rate": won / games if games else None,
+                "by_difficulty": by_difficulty}
+
+    def fastest_solves(self, difficulty=None, limit=10):
+        """正解までの時間が短いゲームを返す"""
+        where, params = "outcome = 'won'", ()
+        if difficulty is not None:
+            where, params = "difficulty = ? AND outcome = 'won'", (str(difficulty),)
+        rows = self._query(f"""SELECT id, player, question, genre, difficulty, duration, guess_count, ended_at
+            FROM sessions WHERE {where} ORDER BY duration LIMIT ?""", params + (int(limit),))
+        keys = ("session", "player", "question", "genre", "difficulty", "duration", "guess_count", "ended_at")
+        return [dict(zip(keys, row)) for row in rows]
+
+    def _guesses(self, conn, session_id):
+        rows = conn.execute("SELECT input, word, status, similarity, rank, at FROM guesses WHERE session_id = ? ORDER BY seq",
+                            (session_id,)).fetchall()
+        return [dict(zip(("input", "word", "status", "similarity", "rank", "at"), row)) for row in rows]
+
+    def session(self, session_id):
+        """1ゲーム分の記録を推測の一覧付きで返す（なければ None）"""
+        with contextlib.closing(self._connect()) as conn:
+            row = conn.execute(f"SELECT {', '.join(SESSION_COLUMNS)} FROM sessions WHERE id = ?", (session_id,)).fetchone()
+            if row is None:
+                return None
+            session = dict(zip(SESSION_COLUMNS, row))
+            session["details"] = self._guesses(conn, session_id)
+        return session
+
+    def export(self, out, since=None, player=None):
+        """ゲームを1行1件の JSON Lines で out に書き出し、件数を返す
+
+        各行の "question" と "guesses"（入力した文字列の一覧）は cui_main.py --batch でそのまま再生できる。
+        """
+        where, params = [], []
+        if since is not None:
+            where.append("started_at >= ?"); params.append(since)
+        if player is not None:
+            where.append("player = ?"); params.append(player)
+        sql = f"SELECT {', '.join(SESSION_COLUMNS)} FROM sessions"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        count = 0
+        with contextlib.closing(self._connect()) as conn:
+            for row in conn.execute(sql + " ORDER BY started_at", params).fetchall():
+                session = dict(zip(SESSION_COLUMNS, row))
+                session["details"] = self._guesses(conn, session["id"])
+                session["guesses"] = [guess["input"] for guess in session["details"]]
+                out.write(json.dumps(session, ensure_ascii=False) + "\n")
+                count += 1
+        return count
+
+    def compact(self, before=None):
+        """before（UNIX 時刻）より前のゲームの推測の記録を消し、ファイルを詰める
+
+        終わったゲームは集計に使う1行だけを残す。結果が書かれないまま残ったゲーム（途中で落ちたなど）は丸ごと消す。
+        書き込み用のスレッドで実行するので、それまでの書き込みが済んでから行われる。
+        """
+        def run(conn):
+            removed = {"guesses": 0, "unfinished_sessions": 0}
+            if before is not None:
+                with conn:
+                    removed["guesses"] = conn.execute(
+                        "DELETE FROM guesses WHERE session_id IN (SELECT id FROM sessions WHERE started_at < ?)", (before,)).rowcount
+                    removed["unfinished_sessions"] = conn.execute(
+                        "DELETE FROM sessions WHERE started_at < ? AND outcome IS NULL", (before,)).rowcount
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            conn.execute("VACUUM")
+            return removed
+        return self._call(run).result()
+
+
+def open_store(path):
+    """履歴を開く。path が空、または開けなければ None を返す（履歴なしでもゲームは遊べる）"""
+    if not path:
+        return None
+    try:
+        return HistoryStore(path)
+    except (sqlite3.Error, OSError) as e:
+        print(f"履歴のファイルを開けませんでした: {e}")
+        return None
+
+
+def main():
+    """コマンドラインから履歴を集計・書き出し・整理する"""
+    parser = argparse.ArgumentParser(description="ゲームの履歴（SQLite）を集計・書き出し・整理します。")
+    parser.add_argument("--path", default=DEFAULT_PATH, help="履歴のファイル")
+    commands = parser.add_subparsers(dest="command", required=True)
+    stats_parser = commands.add_parser("stats", help="プレイヤーの成績")
+    stats_parser.add_argument("player")
+    fastest_parser = commands.add_parser("fastest", help="早く解けたゲーム")
+    fastest_parser.add_argument("--difficulty", default=None)
+    fastest_parser.add_argument("-n", type=int, default=10)
+    export_parser = commands.add_parser("export", help="JSON Lines で書き出す")
+    export_parser.add_argument("--out", default=None, help="出力先（省略時は標準出力）")
+    export_parser.add_argument("--player", default=None)
+    export_parser.add_argument("--since-days", type=float, default=None, help="この日数より新しいゲームだけ")
+    compact_parser = commands.add_parser("compact", help="古い推測の記録を消してファイルを詰める")
+    compact_parser.add_argument("--older-than-days", type=float, default=None)
+    args = parser.parse_args()
+
+    store = HistoryStore(args.path)
+    try:
+        if args.command == "stats":
+            print(json.dumps(store.player_stats(args.player), indent=2, ensure_ascii=False))
+        elif args.command == "fastest":
+            print(json.dumps(store.fastest_solves(args.difficulty, args.n), indent=2, ensure_ascii=False))
+        elif args.command == "export":
+            since = time.time() - args.since_days * 86400 if args.since_days is not None else None
+            with (open(args.out, "w", encoding="utf-8") if args.out else contextlib.nullcontext(sys.stdout)) as out:
+                count = store.export(out, since, args.player)
+            print(f"{count}件のゲームを書き出しました。", file=sys.stderr)
+        elif args.command == "compact":
+            before = time.time() - args.older_than_days * 86400 if args.older_than_days is not None else None
+            print(json.dumps(store.compact(before), ensure_ascii=False))
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+import sys
+import time
+import types
+import importlib
+import threading
+
+# --- 重いモジュールを後から読み込む仕組み ---
+# numpy などは import するだけで時間がかかるので、モジュールの読み込み時には代理のモジュールだけを置き、
+# 最初に属性を使ったときに本物を読み込む。起動時は画面を先に出し、裏のスレッドで load() を呼んで読み込んでおく。
+# importlib.util.LazyLoader は複数のスレッドから同時に最初の参照があると二重に読み込むことがあるので、
+# ロック付きの代理を使う
+_lock = threading.RLock()
+_proxies = {}
+
+
+class LazyModule(types.ModuleType):
+    """最初に属性を参照したときに本物のモジュールを読み込む代理のモジュール"""
+
+    def __getattr__(self, attr):
+        # 代理にない属性を参照したときだけ呼ばれる（読み込んだ後は代理から直接引ける）
+        return getattr(_resolve(self), attr)
+
+    def __repr__(self):
+        return f"<lazy module '{self.__name__}'>"
+
+
+def _resolve(proxy):
+    name = proxy.__name__
+    with _lock:
+        module = sys.modules.get(name)
+        if module is None or isinstance(module, LazyModule):
+            module = importlib.import_module(name)
+        # 以後の参照が __getattr__ を通らないように、本物の属性を代理に写しておく
+        proxy.__dict__.update(module.__dict__)
+        return module
+
+
+def lazy_module(name):
+    """name のモジュールを返す。まだ読み込まれていなければ、使うときに読み込む代理を返す"""
+    with _lock:
+        module = sys.modules.get(name)
+        if module is not None:
+            return module
+        proxy = _proxies.get(name)
+        if proxy is None:
+            proxy = _proxies[name] = LazyModule(name)
+        return proxy
+
+
+def load(*names):
+    """モジュールを今すぐ読み込み、かかった秒数を返す（起動時に裏のスレッドから呼ぶ）"""
+    start = time.perf_counter()
+    for name in names:
+        proxy = _proxies.get(name)
+        if proxy is not None:
+            _resolve(proxy)
+        else:
+            importlib.import_module(name)
+    return time.perf_counter() - start
@@ -0,0 +1,259 @@
+import os
+import json
+import time
+import bisect
+import threading
+import atexit
+import functools
+
+# --- 計測の設定 ---
+# 環境変数 WORDREQUEST_METRICS=1 で有効になる。無効のときはタイマーも記録も何もしない
+# WORDREQUEST_METRICS_LOG=ファイル名 で1件ごとのイベントを JSON Lines で書き出す
+# WORDREQUEST_METRICS_PORT=番号 で Prometheus 形式のテキストを HTTP で公開する
+# WORDREQUEST_METRICS_DUMP=ファイル名 で終了時に Prometheus 形式のテキストを書き出す
+METRIC_PREFIX = "wordrequest_"
+BUCKETS_SECONDS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0, float("inf"))
+
+_enabled = False
+_lock = threading.Lock()
+_histograms = {}  # (名前, ラベル) -> Histogram
+_counters = {}  # (名前, ラベル) -> 値
+_log_file = None
+
+
+class Histogram:
+    """処理時間の分布（Prometheus と同じ累積バケット形式で出力する）"""
+
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS_SECONDS)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(BUCKETS_SECONDS, seconds)] += 1
+        self.total += seconds
+        self.count += 1
+
+
+class _NullTimer:
+    """計測が無効なときに使う、何もしないタイマー"""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+class _Timer:
+    __slots__ = ("name", "labels", "start")
+
+    def __init__(self, name, labels):
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        observe(self.name, time.perf_counter() - self.start, **self.labels)
+        if exc_type is not None:
+            increment(self.name + "_errors", **self.labels)
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+def is_enabled():
+    return _enabled
+
+
+def enable(log_path=None):
+    """計測を有効にする。log_path を指定するとイベントを JSON Lines で追記する"""
+    global _enabled, _log_file
+    with _lock:
+        if log_path and _log_file is None:
+            _log_file = open(log_path, "a", encoding="utf-8", buffering=1)
+        _enabled = True
+
+
+def disable():
+    """計測を無効にする（集計済みの値は残る）"""
+    global _enabled, _log_file
+    with _lock:
+        _enabled = False
+        if _log_file is not None:
+            _log_file.close()
+            _log_file = None
+
+
+def reset():
+    """集計した値をすべて消す"""
+    with _lock:
+        _histograms.clear()
+        _counters.clear()
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def timer(name, **labels):
+    """with 文で処理時間を計測するタイマーを返す。無効なら何もしないタイマーを返す"""
+    if not _enabled:
+        return _NULL_TIMER
+    return _Timer(name, labels)
+
+
+def timed(name=None, **labels):
+    """関数の処理時間を計測するデコレーター"""
+    def decorator(func):
+        metric_name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            with _Timer(metric_name, labels):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def observe(name, seconds, **labels):
+    """処理時間（秒）を記録する"""
+    if not _enabled:
+        return
+    key = _key(name, labels)
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = Histogram()
+        histogram.observe(seconds)
+    _write_event({"type": "timing", "name": name, "seconds": seconds, **labels})
+
+
+def increment(name, value=1, **labels):
+    """カウンターを増やす"""
+    if not _enabled:
+        return
+    with _lock:
+        key = _key(name, labels)
+        _counters[key] = _counters.get(key, 0) + value
+    _write_event({"type": "counter", "name": name, "value": value, **labels})
+
+
+def _write_event(event):
+    if _log_file is None:
+        return
+    event["ts"] = time.time()
+    line = json.dumps(event, ensure_ascii=False)
+    with _lock:
+        if _log_file is not None:
+            _log_file.write(line + "\n")
+
+
+def snapshot():
+    """集計した値を辞書で返す"""
+    with _lock:
+        histograms = {
+            _format_name(name, labels): {"count": h.count, "sum_seconds": h.total, "mean_ms": h.total / h.count * 1000 if h.count else None}
+            for (name, labels), h in _histograms.items()
+        }
+        counters = {_format_name(name, labels): value for (name, labels), value in _counters.items()}
+    return {"timings": histograms, "counters": counters}
+
+
+def _format_name(name, labels):
+    if not labels:
+        return name
+    return name + "{" + ",".join(f"{k}={v}" for k, v in labels) + "}"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def prometheus_text():
+    """集計した値を Prometheus のテキスト形式で返す"""
+    lines = []
+    with _lock:
+        histograms = sorted((key, list(h.counts), h.total, h.count) for key, h in _histograms.items())
+        counters = sorted(_counters.items())
+    declared = set()
+    for (name, labels), counts, total, count in histograms:
+        metric = f"{METRIC_PREFIX}{name}_seconds"
+        if metric not in declared:
+            lines.append(f"# TYPE {metric} histogram")
+            declared.add(metric)
+        cumulative = 0
+        for bound, bucket_count in zip(BUCKETS_SECONDS, counts):
+            cumulative += bucket_count
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            lines.append(f"{metric}_bucket{_format_labels(labels, [('le', le)])} {cumulative}")
+        lines.append(f"{metric}_sum{_format_labels(labels)} {total}")
+        lines.append(f"{metric}_count{_format_labels(labels)} {count}")
+    for (name, labels), value in counters:
+        metric = f"{METRIC_PREFIX}{name}_total"
+        if metric not in declared:
+            lines.append(f"# TYPE {metric} counter")
+            declared.add(metric)
+        lines.append(f"{metric}{_format_labels(labels)} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def write_prometheus(path):
+    """Prometheus のテキスト形式をファイルに書き出す（textfile collector などで読める）"""
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        f.write(prometheus_text())
+    os.replace(path + ".tmp", path)
+
+
+def serve_prometheus(port, host="127.0.0.1"):
+    """Prometheus 形式のテキストを返す HTTP サーバーを別スレッドで起動する"""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = prometheus_text().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-exporter", daemon=True).start()
+    return server
+
+
+def configure_from_env():
+    """環境変数の設定に従って計測を有効にする"""
+    if os.environ.get("WORDREQUEST_METRICS") not in ("1", "true", "yes"):
+        return
+    enable(os.environ.get("WORDREQUEST_METRICS_LOG"))
+    dump_path = os.environ.get("WORDREQUEST_METRICS_DUMP")
+    if dump_path:
+        atexit.register(write_prometheus, dump_path)
+    port = os.environ.get("WORDREQUEST_METRICS_PORT")
+    if port:
+        try:
+            serve_prometheus(int(port))
+        except (ValueError, OSError) as e:
+            print(f"メトリクスの公開に失敗しました: {e}")
+
+
+configure_from_env()
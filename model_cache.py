@@ -0,0 +1,131 @@
+import os
+import json
+import hashlib
+
+import lazy_import
+
+np = lazy_import.lazy_module("numpy")
+
+# --- モデルキャッシュの設定 ---
+# テキスト形式のモデルを一度だけ変換し、2回目以降は .npy を mmap で開く
+CACHE_DIR_NAME = ".cache"
+CACHE_FORMAT_VERSION = 1
+HASH_SAMPLE_BYTES = 1024 * 1024  # 先頭と末尾をこのバイト数だけハッシュする
+
+
+def get_cache_dir(model_path):
+    """モデルファイルと同じフォルダにあるキャッシュ用フォルダのパスを返す"""
+    return os.path.join(os.path.dirname(os.path.abspath(model_path)), CACHE_DIR_NAME)
+
+
+def get_cache_paths(model_path, limit=None):
+    """キャッシュを構成する各ファイルのパスを辞書で返す（語彙数を制限した場合は別のキャッシュ）"""
+    base = os.path.join(get_cache_dir(model_path), os.path.basename(model_path))
+    if limit:
+        base += f".top{limit}"
+    return {
+        "vectors": base + ".vectors.npy",
+        "norms": base + ".norms.npy",
+        "vocab": base + ".vocab.txt",
+        "meta": base + ".meta.json",
+    }
+
+
+def source_fingerprint(model_path):
+    """元のモデルファイルのサイズ・更新時刻・先頭と末尾のハッシュを返す"""
+    stat = os.stat(model_path)
+    digest = hashlib.sha1()
+    with open(model_path, "rb") as f:
+        digest.update(f.read(HASH_SAMPLE_BYTES))
+        if stat.st_size > HASH_SAMPLE_BYTES * 2:
+            f.seek(-HASH_SAMPLE_BYTES, os.SEEK_END)
+            digest.update(f.read(HASH_SAMPLE_BYTES))
+    return {
+        "version": CACHE_FORMAT_VERSION,
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "sha1": digest.hexdigest(),
+    }
+
+
+def variant_key(fingerprint, **options):
+    """元ファイルの指紋と読み込みオプションから、モデルを識別する短いキーを作る"""
+    payload = json.dumps({"source": fingerprint, **options}, sort_keys=True)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def is_cache_valid(model_path, fingerprint=None, limit=None):
+    """キャッシュが存在し、元のモデルファイルと一致しているかを返す"""
+    paths = get_cache_paths(model_path, limit)
+    if not all(os.path.exists(p) for p in paths.values()):
+        return False
+    try:
+        with open(paths["meta"], "r", encoding="utf-8") as f:
+            meta = json.load(f)
+    except (json.JSONDecodeError, IOError):
+        return False
+    if fingerprint is None:
+        fingerprint = source_fingerprint(model_path)
+    return meta.get("source") == fingerprint
+
+
+def save_cache(model_path, words, vectors, fingerprint=None, limit=None):
+    """単語リストとベクトルをキャッシュとして保存する"""
+    paths = get_cache_paths(model_path, limit)
+    os.makedirs(get_cache_dir(model_path), exist_ok=True)
+    if fingerprint is None:
+        fingerprint = source_fingerprint(model_path)
+
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1).astype(np.float32)
+
+    # メタ情報は最後に書く（メタ情報の存在がキャッシュ完成の目印になる）
+    if os.path.exists(paths["meta"]):
+        os.remove(paths["meta"])
+    for key, array in (("vectors", vectors), ("norms", norms)):
+        tmp_path = paths[key] + ".tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, array)
+        os.replace(tmp_path, paths[key])
+
+    tmp_path = paths["vocab"] + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8", newline="\n") as f:
+        f.write("\n".join(words))
+    os.replace(tmp_path, paths["vocab"])
+
+    meta = {"source": fingerprint, "count": len(words), "vector_size": int(vectors.shape[1])}
+    tmp_path = paths["meta"] + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+    os.replace(tmp_path, paths["meta"])
+
+
+def load_cache(model_path, limit=None):
+    """キャッシュを mmap で開き、(単語リスト, ベクトル, ノルム) を返す"""
+    paths = get_cache_paths(model_path, limit)
+    # mmap_mode='r' なので同じホスト上の複数プロセスでページキャッシュを共有できる
+    vectors = np.load(paths["vectors"], mmap_mode="r")
+    norms = np.load(paths["norms"], mmap_mode="r")
+    with open(paths["vocab"], "r", encoding="utf-8", newline="\n") as f:
+        # splitlines() は単語中の特殊な改行文字でも分割してしまうので使わない
+        words = f.read().split("\n")
+    if len(words) != vectors.shape[0]:
+        raise ValueError("キャッシュの単語数とベクトル数が一致しません。")
+    return words, vectors, norms
+
+
+def build_keyed_vectors(words, vectors, norms=None):
+    """単語リストとベクトルから KeyedVectors を組み立てる（ベクトルはコピーしない）"""
+    from gensim.models import KeyedVectors
+
+    kv = KeyedVectors(vector_size=vectors.shape[1], count=0, dtype=np.float32)
+    kv.vectors = vectors
+    kv.index_to_key = words
+    key_to_index = {}
+    for i, word in enumerate(words):
+        # 重複した単語は頻度の高い（先に出てくる）方を優先する
+        key_to_index.setdefault(word, i)
+    kv.key_to_index = key_to_index
+    if norms is not None:
+        kv.norms = norms
+    return kv
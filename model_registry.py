@@ -0,0 +1,138 @@
+import os
+import threading
+from collections import namedtuple
+
+import model_cache
+import compact_store
+
+# --- モデルの一覧と切り替え ---
+# model フォルダに置いたモデルから、設定の "model_file" で使うものを選ぶ
+MODEL_DIR = "model"
+MODEL_EXTENSIONS = (".vec", ".txt")  # word2vec のテキスト形式
+# README で案内しているモデル（見つかればこの順に優先する）
+PREFERRED_MODELS = ("cc.ja.300.vec", "jawiki.entity_vectors.300d.txt")
+
+ModelInfo = namedtuple("ModelInfo", ["name", "path", "size"])
+
+
+class VectorHandle(namedtuple("VectorHandle", ["model_path", "limit", "store"])):
+    """別プロセスから同じベクトルを開くための情報（pickle してワーカープロセスに渡せる）
+
+    ベクトルはキャッシュ（.npy）や省メモリストアを mmap で開くので、同じファイルを開いた
+    プロセス同士は OS のページキャッシュを共有し、プロセスごとにコピーを持たない。
+    """
+    __slots__ = ()
+
+    def attach(self):
+        """ベクトルを mmap で開いてモデルを返す（キャッシュがまだなければ FileNotFoundError）"""
+        if self.store != "full":
+            store_dir = compact_store.get_store_dir(self.model_path, self.store, self.limit)
+            if compact_store.read_store_meta(store_dir) is None:
+                raise FileNotFoundError(f"省メモリストアがありません: {store_dir}")
+            return compact_store.CompactVectorStore.load(store_dir)
+        if not model_cache.is_cache_valid(self.model_path, limit=self.limit):
+            raise FileNotFoundError(f"モデルのキャッシュがありません: {self.model_path}")
+        words, vectors, norms = model_cache.load_cache(self.model_path, self.limit)
+        return model_cache.build_keyed_vectors(words, vectors, norms)
+
+
+def _sort_key(info):
+    preferred = PREFERRED_MODELS.index(info.name) if info.name in PREFERRED_MODELS else len(PREFERRED_MODELS)
+    return preferred, info.name
+
+
+def list_models(model_dir=MODEL_DIR):
+    """model フォルダにあるモデルファイルの一覧を返す（README のモデルを先に並べる）
+
+    設定画面を開くたびに呼ぶので、ファイルの中身は読まない。
+    """
+    try:
+        names = os.listdir(model_dir)
+    except FileNotFoundError:
+        return []
+    models = []
+    for name in names:
+        path = os.path.join(model_dir, name)
+        if name.startswith(".") or not name.endswith(MODEL_EXTENSIONS) or not os.path.isfile(path):
+            continue
+        models.append(ModelInfo(name, path, os.path.getsize(path)))
+    return sorted(models, key=_sort_key)
+
+
+def resolve_model_path(model_file=None, model_dir=MODEL_DIR):
+    """設定のモデルファイル名からパスを返す。見つからなければ model フォルダにあるモデルを使う"""
+    if model_file:
+        path = os.path.join(model_dir, model_file)
+        if os.path.isfile(path):
+            return path
+        print(f"設定のモデル '{model_file}' が見つからないため、ほかのモデルを探します。")
+    models = list_models(model_dir)
+    if models:
+        return models[0].path
+    # 何もなければ README のモデルのパスを返し、読み込み時に見つからないことを知らせる
+    return os.path.join(model_dir, PREFERRED_MODELS[0])
+
+
+class ModelSwitcher:
+    """別スレッドで新しいモデルを読み込み、準備ができたら今のモデルと差し替える
+
+    読み込んでいる間も今のモデルでゲームを続けられる。近傍探索インデックスと
+    「かんたん」モードの候補表も新しいモデルで用意してから、まとめて差し替える。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._thread = None
+        self.loading_path = None
+        self.progress = None  # テキスト解析中の進捗（vec_parser.LoadProgress）
+        self.error = None
+
+    @property
+    def busy(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def switch(self, model_path, settings, e_data=None, on_swapped=None):
+        """model_path のモデルへの切り替えを始める。すでに読み込み中なら False を返す
+
+        on_swapped(新しい ModelState, 古い ModelState) は読み込みスレッドから呼ばれる。
+        """
+        with self._lock:
+            if self.busy:
+                return False
+            self.loading_path, self.progress, self.error = model_path, None, None
+            self._thread = threading.Thread(target=self._run, args=(model_path, dict(settings), e_data, on_swapped),
+                                            name="ModelSwitcher", daemon=True)
+            self._thread.start()
+            return True
+
+    def _on_progress(self, progress):
+        self.progress = progress
+
+    def _run(self, model_path, settings, e_data, on_swapped):
+        import game_logic
+        name = os.path.basename(model_path)
+        try:
+            state = game_logic.build_model_state(model_path, limit=settings["vocab_limit"],
+                                                 progress_callback=self._on_progress, store=settings["vector_store"])
+            if state is None:
+                self.error = f"モデル '{name}' を読み込めませんでした。"
+                return
+            game_logic.prepare_neighbor_index(model_path, settings["neighbor_backend"], settings["neighbor_nprobe"], state=state)
+            game_logic.prepare_word_index(state)
+            if e_data:
+                game_logic.prepare_easy_data(e_data, state=state)
+        except Exception as e:
+            # 差し替える前に失敗したので、今のモデルのまま遊び続けられる
+            self.error = f"モデル '{name}' の準備中にエラーが発生しました: {e}"
+            print(self.error)
+            return
+        previous = game_logic.set_state(state)
+        print(f"モデルを '{name}' に切り替えました。")
+        if on_swapped:
+            on_swapped(state, previous)
+
+    def wait(self, timeout=None):
+        """切り替えが終わるまで待つ"""
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
@@ -0,0 +1,222 @@
+import os
+import sys
+import json
+import time
+import atexit
+import sqlite3
+import threading
+from collections import OrderedDict
+
+import metrics
+
+# --- 近傍探索の結果のキャッシュ ---
+# 同じ単語の近傍を何度も求めないように、(モデル, 単語) ごとに結果を覚えておく。
+# topn の大きい結果があれば、小さい topn の問い合わせはその先頭を返すだけで済む
+DEFAULT_MAX_ENTRIES = 512
+DEFAULT_MAX_BYTES = 32 * 1024 * 1024
+DEFAULT_MAX_DISK_ENTRIES = 5000
+DISK_FILE_NAME = "neighbors.sqlite3"
+DISK_COMMIT_ENTRIES = 32  # ディスクへの書き込みをこの件数まで溜めてからまとめてコミットする
+DISK_COMMIT_INTERVAL = 5.0  # 溜めた書き込みを次の読み書きのときに書き出すまでの最大の秒数
+DISK_TOUCH_INTERVAL = 60.0  # 最後に使った時刻がこれより古いときだけ更新する
+ITEM_OVERHEAD_BYTES = 120  # (単語, 類似度) のタプル1つにかかるおおよそのバイト数（単語の文字列を除く）
+
+
+def estimate_bytes(result):
+    """近傍のリストがメモリ上で使うおおよそのバイト数を返す"""
+    return sum(ITEM_OVERHEAD_BYTES + sys.getsizeof(word) for word, _ in result)
+
+
+class DiskTier:
+    """再起動しても残る SQLite の保存先（よく使う単語だけを max_entries 件まで残す）
+
+    検索のたびにディスクへ書かないように、保存と最後に使った時刻の更新はメモリに溜めておき、
+    件数か時間がたまったら1回のトランザクションでまとめて書く。
+    """
+
+    def __init__(self, path, max_entries=DEFAULT_MAX_DISK_ENTRIES):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("""CREATE TABLE IF NOT EXISTS neighbors (
+            fingerprint TEXT NOT NULL, word TEXT NOT NULL, topn INTEGER NOT NULL,
+            result TEXT NOT NULL, used_at REAL NOT NULL, PRIMARY KEY (fingerprint, word))""")
+        self._conn.commit()
+        self._pending_puts = {}  # (指紋, 単語) -> (topn, 結果の JSON, 時刻)
+        self._pending_touches = {}  # (指紋, 単語) -> 最後に使った時刻
+        self._oldest_pending = None
+        self._closed = False
+        # 溜めたままの書き込みを終了時に書いておく
+        atexit.register(self.close)
+
+    def get(self, fingerprint, word, topn):
+        """topn 件以上の結果が保存されていれば返す（なければ None）"""
+        key = (fingerprint, word)
+        now = time.time()
+        with self._lock:
+            row = self._pending_puts.get(key)
+            if row is None:
+                row = self._conn.execute("SELECT topn, result, used_at FROM neighbors WHERE fingerprint = ? AND word = ?",
+                                         key).fetchone()
+            if row is None or row[0] < topn:
+                return None
+            # 最後に使った時刻は消す順番を決めるだけなので、古くなったときだけ書き直す
+            if now - row[2] >= DISK_TOUCH_INTERVAL:
+                self._pending_touches[key] = now
+                self._flush_if_due(now)
+        return row[0], [tuple(item) for item in json.loads(row[1])]
+
+    def put(self, fingerprint, word, topn, result):
+        now = time.time()
+        with self._lock:
+            self._pending_puts[(fingerprint, word)] = (topn, json.dumps(result, ensure_ascii=False), now)
+            self._pending_touches.pop((fingerprint, word), None)
+            self._flush_if_due(now)
+
+    def flush(self):
+        """溜めている書き込みをディスクに書く"""
+        with self._lock:
+            self._flush()
+
+    def _flush_if_due(self, now):
+        if self._oldest_pending is None:
+            self._oldest_pending = now
+        if (len(self._pending_puts) + len(self._pending_touches) >= DISK_COMMIT_ENTRIES
+                or now - self._oldest_pending >= DISK_COMMIT_INTERVAL):
+            self._flush()
+
+    def _flush(self):
+        if self._closed or not (self._pending_puts or self._pending_touches):
+            return
+        puts, touches = self._pending_puts, self._pending_touches
+        self._pending_puts, self._pending_touches, self._oldest_pending = {}, {}, None
+        with self._conn:
+            self._conn.executemany("INSERT OR REPLACE INTO neighbors VALUES (?, ?, ?, ?, ?)",
+                                   [(fingerprint, word, topn, result, at) for (fingerprint, word), (topn, result, at) in puts.items()])
+            self._conn.executemany("UPDATE neighbors SET used_at = ? WHERE fingerprint = ? AND word = ?",
+                                   [(at, fingerprint, word) for (fingerprint, word), at in touches.items()])
+            if puts:
+                # 古く使われていないものから消して件数を抑える
+                self._conn.execute("""DELETE FROM neighbors WHERE rowid IN (
+                    SELECT rowid FROM neighbors ORDER BY used_at DESC LIMIT -1 OFFSET ?)""", (self.max_entries,))
+
+    def close(self):
+        with self._lock:
+            if self._closed:
+                return
+            try:
+                self._flush()
+            except sqlite3.Error as e:
+                print(f"近傍キャッシュの保存に失敗しました: {e}")
+            self._closed = True
+            self._conn.close()
+        atexit.unregister(self.close)
+
+
+class NeighborCache:
+    """近傍探索の結果を (単語, topn, モデルの指紋) で覚えておく LRU キャッシュ
+
+    件数と合計バイト数の両方で上限を決め、超えたら使われていないものから捨てる。
+    attach_disk() でディスクの保存先を付けると、よく使うキーワードが再起動後も残る。
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # (指紋, 単語) -> (topn, 結果, バイト数)
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.disk = None
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def attach_disk(self, path, max_entries=DEFAULT_MAX_DISK_ENTRIES):
+        """ディスクの保存先を付ける（同じパスなら何もしない）"""
+        if self.disk is not None and self.disk.path == path:
+            return
+        try:
+            disk = DiskTier(path, max_entries)
+        except sqlite3.Error as e:
+            print(f"近傍キャッシュの保存先を開けませんでした: {e}")
+            return
+        previous, self.disk = self.disk, disk
+        if previous is not None:
+            previous.close()
+
+    def get(self, word, topn, fingerprint):
+        """覚えている結果の先頭 topn 件を返す（なければ None）"""
+        key = (fingerprint, word)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] >= topn:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1][:topn]
+        if self.disk is not None:
+            try:
+                saved = self.disk.get(fingerprint, word, topn)
+            except sqlite3.Error as e:
+                print(f"近傍キャッシュの読み込みに失敗しました: {e}")
+                saved = None
+            if saved is not None:
+                self._store(key, *saved)
+                with self._lock:
+                    self.disk_hits += 1
+                return saved[1][:topn]
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, word, topn, fingerprint, result):
+        """結果を覚える（ディスクの保存先があればそちらにも書く）"""
+        result = [(word_, float(similarity)) for word_, similarity in result]
+        self._store((fingerprint, word), topn, result)
+        if self.disk is not None:
+            try:
+                self.disk.put(fingerprint, word, topn, result)
+            except sqlite3.Error as e:
+                print(f"近傍キャッシュの保存に失敗しました: {e}")
+
+    def _store(self, key, topn, result):
+        size = estimate_bytes(result)
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.bytes -= previous[2]
+            self._entries[key] = (topn, result, size)
+            self.bytes += size
+            while self._entries and (len(self._entries) > self.max_entries or self.bytes > self.max_bytes):
+                _, (_, _, old_size) = self._entries.popitem(last=False)
+                self.bytes -= old_size
+
+    def get_or_compute(self, word, topn, fingerprint, compute):
+        """覚えていればその結果を、なければ compute() を呼んで覚えてから返す"""
+        result = self.get(word, topn, fingerprint)
+        if result is not None:
+            metrics.increment("neighbor_cache", result="hit")
+            return result
+        metrics.increment("neighbor_cache", result="miss")
+        result = compute()
+        self.put(word, topn, fingerprint, result)
+        return list(result)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def stats(self):
+        """監視用の統計を返す"""
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.bytes,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else None,
+            }
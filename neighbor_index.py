@@ -0,0 +1,202 @@
+import os
+import json
+import time
+import argparse
+
+import lazy_import
+import model_cache
+import vector_ops
+
+np = lazy_import.lazy_module("numpy")
+
+# --- 近傍探索インデックスの設定 ---
+# 総当たり (exact) と、k-means のバケットを使う近似探索 (ivf) を切り替えられる
+BACKENDS = ("exact", "ivf")
+DEFAULT_NPROBE = 16  # 調べるバケット数。大きいほど正確で遅い
+KMEANS_SAMPLE_SIZE = 100000
+KMEANS_ITERATIONS = 10
+ASSIGN_CHUNK_ROWS = 8192  # バケットとの内積を一度に計算する行数（一時メモリの上限）
+
+
+class ExactIndex:
+    """モデルの most_similar をそのまま使う総当たりの探索（精度の基準）"""
+    name = "exact"
+
+    def __init__(self, model):
+        self.model = model
+
+    def search(self, word, topn=10, nprobe=None):
+        """単語に近い順に (単語, 類似度) のリストを返す"""
+        return self.model.most_similar(word, topn=topn)
+
+
+class IVFIndex:
+    """語彙を k-means のバケットに分け、近いバケットの中だけを調べる近似探索"""
+    name = "ivf"
+
+    def __init__(self, model, centroids, list_offsets, list_ids, nprobe=DEFAULT_NPROBE):
+        self.model = model
+        self.centroids = centroids
+        self.list_offsets = list_offsets
+        self.list_ids = list_ids
+        self.nprobe = nprobe
+
+    @property
+    def nlist(self):
+        return len(self.centroids)
+
+    @classmethod
+    def build(cls, model, nlist=None, nprobe=DEFAULT_NPROBE, sample_size=KMEANS_SAMPLE_SIZE, iterations=KMEANS_ITERATIONS, seed=0):
+        """語彙全体を球面 k-means でバケットに分けてインデックスを作る"""
+        count = len(model.index_to_key)
+        if nlist is None:
+            nlist = max(1, int(np.sqrt(count)))
+        rng = np.random.default_rng(seed)
+        sample_ids = np.sort(rng.choice(count, size=min(sample_size, count), replace=False))
+        sample = vector_ops.unit_rows(model, sample_ids)
+        nlist = min(nlist, len(sample))
+
+        centroids = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+        for _ in range(iterations):
+            assignments = _assign(sample, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignments, sample)
+            sizes = np.bincount(assignments, minlength=nlist)
+            # 空になったバケットはランダムな点で作り直す
+            empty = np.flatnonzero(sizes == 0)
+            sums[empty] = sample[rng.choice(len(sample), size=len(empty), replace=False)]
+            centroids = sums / np.maximum(np.linalg.norm(sums, axis=1, keepdims=True), vector_ops.EPSILON)
+
+        assignments = np.empty(count, dtype=np.int32)
+        for start in range(0, count, ASSIGN_CHUNK_ROWS):
+            end = min(start + ASSIGN_CHUNK_ROWS, count)
+            assignments[start:end] = _assign(vector_ops.unit_rows(model, slice(start, end)), centroids)
+        list_ids = np.argsort(assignments, kind="stable").astype(np.int64)
+        list_offsets = np.zeros(nlist + 1, dtype=np.int64)
+        list_offsets[1:] = np.cumsum(np.bincount(assignments, minlength=nlist))
+        return cls(model, centroids.astype(np.float32), list_offsets, list_ids, nprobe)
+
+    def search(self, word, topn=10, nprobe=None):
+        """単語に近い順に (単語, 類似度) のリストを返す（近似）"""
+        index = self.model.key_to_index.get(word)
+        if index is None:
+            raise KeyError(f"Key '{word}' not present")
+        nprobe = min(nprobe or self.nprobe, self.nlist)
+        query = vector_ops.unit_vector(self.model, word)
+        probes = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+        ids = np.sort(np.concatenate([self.list_ids[self.list_offsets[p]:self.list_offsets[p + 1]] for p in probes]))
+        ids = ids[ids != index]
+        if len(ids) == 0:
+            return []
+        scores = vector_ops.unit_rows(self.model, ids) @ query
+        topn = min(topn, len(ids))
+        best = np.argpartition(-scores, topn - 1)[:topn]
+        best = best[np.argsort(-scores[best])]
+        return [(self.model.index_to_key[ids[i]], float(scores[i])) for i in best]
+
+    def save(self, path, meta=None):
+        """インデックスを .npz として保存する"""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, centroids=self.centroids, list_offsets=self.list_offsets, list_ids=self.list_ids,
+                     meta=np.array(json.dumps(meta or {})))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, model, nprobe=DEFAULT_NPROBE):
+        """保存したインデックスを読み込み、(インデックス, メタ情報) を返す"""
+        with np.load(path) as f:
+            meta = json.loads(str(f["meta"]))
+            index = cls(model, f["centroids"], f["list_offsets"], f["list_ids"], nprobe)
+        return index, meta
+
+
+def _assign(rows, centroids):
+    """各行を最も近いバケットに割り当てる"""
+    assignments = np.empty(len(rows), dtype=np.int32)
+    for start in range(0, len(rows), ASSIGN_CHUNK_ROWS):
+        assignments[start:start + ASSIGN_CHUNK_ROWS] = np.argmax(rows[start:start + ASSIGN_CHUNK_ROWS] @ centroids.T, axis=1)
+    return assignments
+
+
+def get_index_path(model_path, fingerprint):
+    """モデルの隣（キャッシュフォルダ）に置くインデックスファイルのパスを返す"""
+    return os.path.join(model_cache.get_cache_dir(model_path), f"{os.path.basename(model_path)}.{fingerprint}.ivf.npz")
+
+
+def open_index(model, backend="exact", model_path=None, fingerprint=None, nprobe=DEFAULT_NPROBE):
+    """設定に応じたインデックスを返す。ivf は保存済みのものを使い、なければ作って保存する"""
+    if backend == "exact" or model_path is None:
+        return ExactIndex(model)
+    path = get_index_path(model_path, fingerprint)
+    if os.path.exists(path):
+        index, meta = IVFIndex.load(path, model, nprobe)
+        if meta.get("fingerprint") == fingerprint and index.list_offsets[-1] == len(model.index_to_key):
+            return index
+    print("近傍探索インデックスを作成しています...")
+    index = IVFIndex.build(model, nprobe=nprobe)
+    try:
+        index.save(path, {"fingerprint": fingerprint})
+    except (IOError, OSError) as e:
+        print(f"近傍探索インデックスの保存に失敗しました: {e}")
+    return index
+
+
+def evaluate_recall(model, index, words, k=100, nprobes=(1, 2, 4, 8, 16, 32)):
+    """総当たりと比べた recall@k と1回あたりの探索時間をまとめる"""
+    exact = ExactIndex(model)
+    words = [w for w in words if w in model]
+    truth = {}
+    start = time.perf_counter()
+    for word in words:
+        truth[word] = {w for w, _ in exact.search(word, topn=k)}
+    exact_ms = (time.perf_counter() - start) * 1000 / max(len(words), 1)
+
+    results = [{"backend": "exact", "nprobe": None, f"recall@{k}": 1.0, "latency_ms": exact_ms}]
+    for nprobe in nprobes:
+        recalls = []
+        start = time.perf_counter()
+        for word in words:
+            found = {w for w, _ in index.search(word, topn=k, nprobe=nprobe)}
+            recalls.append(len(found & truth[word]) / max(len(truth[word]), 1))
+        latency_ms = (time.perf_counter() - start) * 1000 / max(len(words), 1)
+        results.append({"backend": index.name, "nprobe": nprobe, f"recall@{k}": float(np.mean(recalls)) if recalls else None, "latency_ms": latency_ms})
+    return {"words": len(words), "k": k, "results": results}
+
+
+def collect_genre_words(data_dir="data"):
+    """同梱のデータからジャンル名を集める"""
+    words = []
+    for name in sorted(os.listdir(data_dir)):
+        if name.endswith(".json"):
+            with open(os.path.join(data_dir, name), "r", encoding="utf-8") as f:
+                words.extend(json.load(f).keys())
+    return words
+
+
+def main():
+    """コマンドラインからインデックスを作成し、総当たりとの recall@k を表示する"""
+    parser = argparse.ArgumentParser(description="近傍探索インデックスを作成し、総当たりと精度・速度を比較します。")
+    parser.add_argument("model_path", help="モデルファイル (例: model/cc.ja.300.vec)")
+    parser.add_argument("--nlist", type=int, default=None, help="バケット数（省略時は語彙数の平方根）")
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32], help="比較する調査バケット数")
+    parser.add_argument("-k", type=int, default=100)
+    parser.add_argument("--store", default="full", help="full / float16 / int8")
+    parser.add_argument("--limit", type=int, default=None)
+    parser.add_argument("--data-dir", default="data")
+    args = parser.parse_args()
+
+    import game_logic
+    if not game_logic.load_model(args.model_path, limit=args.limit, store=args.store):
+        return
+    state = game_logic.get_state()
+    index = IVFIndex.build(state.model, nlist=args.nlist)
+    index.save(get_index_path(args.model_path, state.fingerprint), {"fingerprint": state.fingerprint})
+    report = evaluate_recall(state.model, index, collect_genre_words(args.data_dir), args.k, args.nprobe)
+    report["nlist"] = index.nlist
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+import queue
+import threading
+import time
+from collections import OrderedDict, deque
+
+import game_logic
+
+# --- お題の先読みプールの設定 ---
+DEFAULT_DEPTH = 3  # 1つのプールに用意しておくお題の数
+RECENT_CUSTOM_KEYWORDS = 4  # プールを保持しておくカスタムキーワードの数
+RETRY_DELAY = 0.05  # 生成に失敗したときの待ち時間（失敗が続くと倍々で伸ばす）
+MAX_RETRY_DELAY = 5.0
+LATENCY_SAMPLES = 100
+
+
+class QuestionPool:
+    """ワーカースレッドでお題を生成し、すぐに遊べる (お題, ジャンル) を貯めておくプール
+
+    生成に失敗しても裏で再試行するので、取り出す側は失敗を気にしなくてよい。
+    """
+
+    def __init__(self, generate, depth=DEFAULT_DEPTH, name=""):
+        self.name = name
+        self._generate = generate
+        self._queue = queue.Queue(maxsize=depth)
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=LATENCY_SAMPLES)
+        self.generated = 0
+        self.failures = 0
+        self.served = 0
+        self._thread = threading.Thread(target=self._run, name=f"QuestionPool-{name}", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        delay = RETRY_DELAY
+        started = time.perf_counter()
+        while not self._stop.is_set():
+            try:
+                question, genre = self._generate()
+            except Exception as e:
+                print(f"お題の先読み中にエラー ({self.name}): {e}")
+                question, genre = None, None
+            if not question:
+                with self._lock:
+                    self.failures += 1
+                self._stop.wait(delay)
+                delay = min(delay * 2, MAX_RETRY_DELAY)
+                continue
+            # 失敗して再試行した時間も含めて、1問用意するまでにかかった時間を記録する
+            with self._lock:
+                self.generated += 1
+                self._latencies.append(time.perf_counter() - started)
+            delay = RETRY_DELAY
+            while not self._stop.is_set():
+                try:
+                    self._queue.put((question, genre), timeout=0.5)
+                    break
+                except queue.Full:
+                    continue
+            started = time.perf_counter()
+
+    def get(self, timeout=None):
+        """お題を取り出す。timeout=None なら待たずに、なければ None を返す"""
+        try:
+            item = self._queue.get(timeout=timeout) if timeout else self._queue.get_nowait()
+        except queue.Empty:
+            return None
+        with self._lock:
+            self.served += 1
+        return item
+
+    def stop(self):
+        """ワーカースレッドを止める"""
+        self._stop.set()
+
+    def stats(self):
+        """監視用の統計（プールの残り数・生成にかかった時間など）を返す"""
+        with self._lock:
+            latencies = sorted(self._latencies)
+            generated, failures, served = self.generated, self.failures, self.served
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] if latencies else None
+        return {
+            "name": self.name,
+            "depth": self._queue.qsize(),
+            "capacity": self._queue.maxsize,
+            "generated": generated,
+            "failures": failures,
+            "served": served,
+            "latency_ms_mean": sum(latencies) / len(latencies) * 1000 if latencies else None,
+            "latency_ms_p95": p95 * 1000 if p95 is not None else None,
+        }
+
+
+class QuestionPoolManager:
+    """難易度ごと・最近使ったカスタムキーワードごとにプールをまとめて管理する"""
+
+    def __init__(self, e_data, n_data, h_data, depth=DEFAULT_DEPTH, custom_keywords=RECENT_CUSTOM_KEYWORDS):
+        self.depth = depth
+        self.custom_keywords = custom_keywords
+        self.pools = {
+            difficulty: QuestionPool(
+                lambda d=difficulty: game_logic.generate_question_by_difficulty(d, e_data, n_data, h_data),
+                depth, name=f"difficulty-{difficulty}")
+            for difficulty in ("1", "2", "3")
+        }
+        self.custom_pools = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, difficulty):
+        """難易度のプールからお題を取り出す（なければ None）"""
+        pool = self.pools.get(difficulty)
+        return pool.get() if pool else None
+
+    def get_custom(self, keyword):
+        """カスタムキーワードのプールからお題を取り出す（なければ None）"""
+        with self._lock:
+            pool = self.custom_pools.get(keyword)
+            if pool is None:
+                return None
+            self.custom_pools.move_to_end(keyword)
+        return pool.get()
+
+    def watch_custom(self, keyword):
+        """カスタムキーワードのプールを用意する。古いキーワードのプールは止める"""
+        with self._lock:
+            if keyword in self.custom_pools:
+                self.custom_pools.move_to_end(keyword)
+                return
+            genre = f"カスタム:「{keyword}」"
+            self.custom_pools[keyword] = QuestionPool(
+                lambda: (game_logic.generate_custom_question(keyword), genre), self.depth, name=f"custom-{keyword}")
+            while len(self.custom_pools) > self.custom_keywords:
+                _, old_pool = self.custom_pools.popitem(last=False)
+                old_pool.stop()
+
+    def stats(self):
+        """全プールの統計を返す"""
+        with self._lock:
+            pools = list(self.pools.values()) + list(self.custom_pools.values())
+        return [pool.stats() for pool in pools]
+
+    def stop(self):
+        """全プールのワーカースレッドを止める"""
+        with self._lock:
+            pools = list(self.pools.values()) + list(self.custom_pools.values())
+            self.custom_pools.clear()
+        for pool in pools:
+            pool.stop()
@@ -0,0 +1,121 @@
+import threading
+from collections import OrderedDict
+
+import lazy_import
+import metrics
+import vector_ops
+
+np = lazy_import.lazy_module("numpy")
+
+
+class SimilarityTable:
+    """1つのお題について、全語彙との類似度と順位をまとめて持つ表
+
+    お題が決まったときに行列とベクトルの積を1回だけ計算しておけば、
+    以降の推測は辞書を引くだけで類似度と順位がわかる。
+    """
+
+    def __init__(self, model, question):
+        self.model = model
+        self.question = question
+        self.similarities = None
+        self.ranks = None
+        self._ready = threading.Event()
+
+    @property
+    def ready(self):
+        return self._ready.is_set()
+
+    def build(self):
+        """表を作成する（語彙全体で1回の積とソート）"""
+        try:
+            # 別スレッドで作る場合も、積とソートにかかった時間を計る
+            with metrics.timer("create_similarity_table"):
+                query = vector_ops.unit_vector(self.model, self.question)
+                similarities = vector_ops.similarities_to_all(self.model, query)
+                order = np.argsort(-similarities, kind="stable")
+                # お題自身が0番目、最も近い単語が1番目になる
+                ranks = np.empty(len(similarities), dtype=np.int64)
+                ranks[order] = np.arange(len(similarities))
+            self.similarities, self.ranks = similarities, ranks
+        except KeyError:
+            # お題がモデルにない場合は表を作らず、通常の計算に任せる
+            pass
+        finally:
+            self._ready.set()
+        return self
+
+    def build_async(self):
+        """画面を止めないように別スレッドで表を作成する"""
+        threading.Thread(target=self.build, daemon=True).start()
+        return self
+
+    def wait(self, timeout=None):
+        return self._ready.wait(timeout)
+
+    def lookup(self, word):
+        """(類似度, 順位) を返す。表が未完成か単語がなければ None"""
+        if not self.ready or self.similarities is None:
+            return None
+        index = self.model.key_to_index.get(word)
+        if index is None:
+            return None
+        return float(self.similarities[index]), int(self.ranks[index])
+
+
+class SimilarityTableCache:
+    """お題ごとの表を使い回すための LRU キャッシュ
+
+    表は語彙数に比例した大きさ（1語あたり12バイト）になるので、同時に大量の
+    ゲームを扱うときは保持する表の数を max_tables で抑える。
+    """
+
+    def __init__(self, max_tables=32):
+        self.max_tables = max_tables
+        self._tables = OrderedDict()
+        self._lock = threading.Lock()
+        self._building = {}  # キー -> 作成中であることを示す Event
+        self.hits = 0
+        self.misses = 0
+
+    def peek(self, model, question):
+        """作成済みの表を返す（なければ None。新しく作らない）"""
+        key = (id(model), question)
+        with self._lock:
+            table = self._tables.get(key)
+            if table is not None:
+                self._tables.move_to_end(key)
+                self.hits += 1
+            return table
+
+    def get(self, model, question):
+        """表を返す。なければその場で作る（同じお題を同時に作らないようにする）"""
+        key = (id(model), question)
+        while True:
+            with self._lock:
+                table = self._tables.get(key)
+                if table is not None:
+                    self._tables.move_to_end(key)
+                    self.hits += 1
+                    return table
+                building = self._building.get(key)
+                if building is None:
+                    building = self._building[key] = threading.Event()
+                    self.misses += 1
+                    break
+            building.wait()
+        try:
+            table = SimilarityTable(model, question).build()
+            with self._lock:
+                self._tables[key] = table
+                while len(self._tables) > self.max_tables:
+                    self._tables.popitem(last=False)
+            return table
+        finally:
+            with self._lock:
+                del self._building[key]
+            building.set()
+
+    def clear(self):
+        with self._lock:
+            self._tables.clear()
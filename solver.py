@@ -0,0 +1,247 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import contextlib
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+
+import game_logic
+import model_registry
+import vector_ops
+
+# --- 自動で遊ぶソルバー ---
+# 推測した単語とお題との類似度（画面に出る値）だけを手がかりに、答えの候補を絞り込んでいく。
+# 難易度・ジャンルごとに何回の推測で解けたかを集計し、お題の難しさを客観的に測る
+DEFAULT_PRECISION = 2  # フィードバックの類似度を丸める小数点以下の桁数（ランキングの表示と同じ）
+MAX_GUESSES = 100  # これだけ推測しても解けなければ失敗とする
+FIRST_GUESS_POOL = 1000  # 最初の推測は頻度の高いこの語数の中から選ぶ
+FALLBACK_CANDIDATES = 50  # 誤差で候補がなくなったときに残す、最も矛盾の小さい候補の数
+GAMES_PER_TASK = 20  # 1つの作業単位で遊ぶゲーム数
+
+
+class Solver:
+    """類似度のフィードバックから答えの候補を絞り込むソルバー
+
+    推測した単語 g とフィードバック s が得られるたびに、cos(候補, g) が s と
+    （丸めの誤差の範囲で）一致する候補だけを残す。候補の絞り込みは行列とベクトルの積1回で行う。
+    """
+
+    def __init__(self, model, precision=DEFAULT_PRECISION, max_guesses=MAX_GUESSES, rng=None):
+        self.model = model
+        self.precision = precision
+        # 丸めた値との差が丸めの幅の半分（と計算誤差）以内なら一致とみなす
+        self.tolerance = (0.5 * 10 ** -precision if precision is not None else 0) + 1e-4
+        self.max_guesses = max_guesses
+        self.rng = rng or random.Random()
+
+    def _filter(self, candidates, word, similarity):
+        """フィードバックと矛盾しない候補の行番号を返す"""
+        query = vector_ops.unit_vector(self.model, word)
+        if candidates is None:
+            # 1回目は全語彙との類似度を求める
+            candidates = np.arange(len(self.model.index_to_key))
+            scores = vector_ops.similarities_to_all(self.model, query)
+        else:
+            scores = vector_ops.unit_rows(self.model, candidates) @ query
+        errors = np.abs(scores - similarity)
+        kept = candidates[errors <= self.tolerance]
+        if not len(kept):
+            kept = candidates[np.argsort(errors)[:FALLBACK_CANDIDATES]]
+        return kept
+
+    def _next_guess(self, candidates, guessed):
+        if candidates is None:
+            pool = min(FIRST_GUESS_POOL, len(self.model.index_to_key))
+            while True:
+                word = self.model.index_to_key[self.rng.randrange(pool)]
+                if word not in guessed:
+                    return word
+        # 残った候補の中で最も頻度の高い（行番号の小さい）単語を推測する
+        for index in candidates:
+            word = self.model.index_to_key[index]
+            if word not in guessed:
+                return word
+        return None
+
+    def play(self, guess):
+        """guess(単語) -> (正解か, 類似度) を使って1ゲーム遊び、(推測回数, 解けたか) を返す"""
+        candidates = None
+        guessed = set()
+        while len(guessed) < self.max_guesses:
+            word = self._next_guess(candidates, guessed)
+            if word is None:
+                break
+            guessed.add(word)
+            correct, similarity = guess(word)
+            if correct:
+                return len(guessed), True
+            if self.precision is not None:
+                similarity = round(float(similarity), self.precision)
+            candidates = self._filter(candidates, word, similarity)
+        return len(guessed), False
+
+
+# ワーカープロセスごとに1回だけ開くモデルとお題データ
+_worker_state = {}
+
+
+def _init_worker(handle, fingerprint, data_dir, backend, nprobe, precision, max_guesses):
+    """ワーカープロセスでベクトルを mmap で開き、お題生成の準備をする"""
+    state = game_logic.ModelState(handle.attach(), fingerprint, handle.model_path, handle)
+    game_logic.set_state(state)
+    game_logic.prepare_neighbor_index(handle.model_path, backend, nprobe, disk_cache=False)
+    e_data, n_data, h_data = load_data(data_dir)
+    if e_data:
+        game_logic.prepare_easy_data(e_data)
+    _worker_state.update(data=(e_data, n_data, h_data), genres=genre_lookup(n_data, h_data),
+                         precision=precision, max_guesses=max_guesses)
+
+
+def _init_pool_worker(*initargs):
+    # ワーカーの print が結果の JSON に混ざらないように標準エラー出力へ回す
+    sys.stdout = sys.stderr
+    _init_worker(*initargs)
+
+
+def load_data(data_dir):
+    return tuple(game_logic.load_json_data(os.path.join(data_dir, f"{name}_data.json")) for name in ("easy", "normal", "hard"))
+
+
+def genre_lookup(n_data, h_data):
+    """「普通」「むずかしい」のお題からジャンルを引く辞書を返す（画面には出ないが集計には使う）"""
+    lookup = {}
+    for difficulty, data in (("2", n_data), ("3", h_data)):
+        for genre, words in (data or {}).items():
+            for word in words:
+                lookup.setdefault((difficulty, word), genre)
+    return lookup
+
+
+def play_games(difficulty, count, seed):
+    """同じ難易度のゲームを count 回遊び、1ゲームごとの結果のリストを返す"""
+    state = _worker_state
+    rng = random.Random(seed)
+    random.seed(seed)
+    solver = Solver(game_logic.get_model(), state["precision"], state["max_guesses"], rng)
+    results = []
+    for _ in range(count):
+        start = time.perf_counter()
+        question, genre = game_logic.generate_question_by_difficulty(difficulty, *state["data"])
+        if not question:
+            results.append({"difficulty": difficulty, "generated": False})
+            continue
+        genre = state["genres"].get((difficulty, question), genre)
+        # 画面と同じ API で判定する（お題はソルバーには見せない）
+        guesses, solved = solver.play(lambda word: (word == question, game_logic.check_similarity(question, word)))
+        results.append({"difficulty": difficulty, "genre": genre, "question": question, "generated": True,
+                        "guesses": guesses, "solved": solved, "seconds": time.perf_counter() - start})
+    return results
+
+
+def summarize_guesses(results):
+    """推測回数の分布をまとめる"""
+    solved = sorted(r["guesses"] for r in results if r["solved"])
+    summary = {"games": len(results), "solved": len(solved), "solve_rate": len(solved) / len(results) if results else None}
+    if solved:
+        summary.update({
+            "mean": sum(solved) / len(solved),
+            "p50": solved[len(solved) // 2],
+            "p90": solved[min(len(solved) - 1, int(len(solved) * 0.9))],
+            "max": solved[-1],
+            "histogram": {str(n): solved.count(n) for n in sorted(set(solved))},
+        })
+    return summary
+
+
+def build_report(results, elapsed):
+    """全ゲームの結果を難易度別・ジャンル別に集計する"""
+    played = [r for r in results if r["generated"]]
+    by_difficulty, by_genre = defaultdict(list), defaultdict(list)
+    for r in played:
+        by_difficulty[r["difficulty"]].append(r)
+        by_genre[f"{r['difficulty']}:{r['genre']}"].append(r)
+    total_guesses = sum(r["guesses"] for r in played)
+    return {
+        "games": len(played),
+        "generation_failures": len(results) - len(played),
+        "elapsed_s": elapsed,
+        "games_per_s": len(played) / elapsed if elapsed else None,
+        "guesses_per_s": total_guesses / elapsed if elapsed else None,
+        "by_difficulty": {d: summarize_guesses(rs) for d, rs in sorted(by_difficulty.items())},
+        "by_genre": {g: summarize_guesses(rs) for g, rs in sorted(by_genre.items())},
+    }
+
+
+def run(args):
+    """ゲームを並列に遊び、集計結果を辞書で返す"""
+    settings = game_logic.load_settings()
+    model_path = args.model or model_registry.resolve_model_path(settings["model_file"])
+    # キャッシュ・インデックス・候補表を先に作っておき、ワーカーはそれを開くだけにする
+    if not game_logic.load_model(model_path, limit=settings["vocab_limit"], store=settings["vector_store"]):
+        raise RuntimeError("モデルを読み込めませんでした。")
+    game_logic.prepare_neighbor_index(model_path, settings["neighbor_backend"], settings["neighbor_nprobe"])
+    e_data, _, _ = load_data(args.data_dir)
+    if e_data:
+        game_logic.prepare_easy_data(e_data)
+    state = game_logic.get_state()
+    initargs = (state.handle, state.fingerprint, args.data_dir, settings["neighbor_backend"], settings["neighbor_nprobe"],
+                args.precision, args.max_guesses)
+
+    tasks = []
+    for difficulty in args.difficulties:
+        for start in range(0, args.games, GAMES_PER_TASK):
+            tasks.append((difficulty, min(GAMES_PER_TASK, args.games - start), args.seed + len(tasks)))
+
+    results = []
+    start = time.perf_counter()
+    if args.workers == 0:
+        # デバッグ用にこのプロセスだけで遊ぶ
+        _init_worker(*initargs)
+        for task in tasks:
+            results.extend(play_games(*task))
+    else:
+        with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_pool_worker, initargs=initargs) as executor:
+            futures = [executor.submit(play_games, *task) for task in tasks]
+            for done, future in enumerate(as_completed(futures), 1):
+                results.extend(future.result())
+                print(f"\r自動プレイ中... {done}/{len(futures)}", end="", file=sys.stderr, flush=True)
+            print(file=sys.stderr)
+    report = build_report(results, time.perf_counter() - start)
+    report["config"] = {"model": os.path.basename(model_path), "games_per_difficulty": args.games, "workers": args.workers,
+                        "precision": args.precision, "max_guesses": args.max_guesses, "seed": args.seed}
+    return report
+
+
+def main():
+    """コマンドラインからソルバーを実行し、結果を JSON で出力する"""
+    parser = argparse.ArgumentParser(description="ソルバーに大量のゲームを遊ばせ、難易度・ジャンルごとの推測回数と処理速度を測ります。")
+    parser.add_argument("--model", default=None, help="モデルファイル（省略時は settings.json の model_file）")
+    parser.add_argument("--games", type=int, default=200, help="難易度ごとのゲーム数")
+    parser.add_argument("--difficulties", nargs="+", default=["1", "2", "3"])
+    parser.add_argument("--workers", type=int, default=None, help="プロセス数（省略時はCPU数、0ならこのプロセスだけ）")
+    parser.add_argument("--precision", type=int, default=DEFAULT_PRECISION, help="フィードバックの類似度の桁数（-1なら丸めない）")
+    parser.add_argument("--max-guesses", type=int, default=MAX_GUESSES)
+    parser.add_argument("--data-dir", default="data")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default=None, help="結果の JSON の出力先（省略時は標準出力）")
+    args = parser.parse_args()
+    if args.precision < 0:
+        args.precision = None
+
+    # ゲームロジックの print が JSON に混ざらないように標準エラー出力へ回す
+    with contextlib.redirect_stdout(sys.stderr):
+        report = run(args)
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
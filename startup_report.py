@@ -0,0 +1,97 @@
+import os
+import sys
+import json
+import time
+import threading
+import contextlib
+
+import metrics
+
+# --- 起動時間の内訳 ---
+# 起動を段階（設定・データ・画面・数値計算ライブラリ・モデルなど）に分け、段階ごとの時間と
+# その間に新しく読み込まれたモジュールを記録する（python -X importtime の段階版）。
+# 環境変数 WORDREQUEST_STARTUP_REPORT=1 なら準備が終わったときに表を標準エラー出力に出し、
+# ファイル名を指定するとそのファイルにも1回の起動を1行の JSON で追記する
+ENV_VAR = "WORDREQUEST_STARTUP_REPORT"
+TOP_MODULES = 8  # 段階ごとに表示する、読み込まれたパッケージの数
+
+_origin = time.perf_counter()  # このモジュールを読み込んだ時刻（起動処理の最初に import する）
+_lock = threading.Lock()
+_stages = []
+_marks = {}
+_reported = False
+
+
+def elapsed_ms(now=None):
+    """起動からの経過時間（ミリ秒）"""
+    return ((now if now is not None else time.perf_counter()) - _origin) * 1000
+
+
+def _top_level(names):
+    counts = {}
+    for name in names:
+        top = name.split(".")[0]
+        counts[top] = counts.get(top, 0) + 1
+    return sorted(counts.items(), key=lambda item: -item[1])
+
+
+@contextlib.contextmanager
+def stage(name):
+    """with の中を1つの段階として計測する（別々のスレッドの段階が重なってもよい）"""
+    before = set(sys.modules)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        end = time.perf_counter()
+        # 同時に進む段階があると、そちらで読み込まれたモジュールもここに数えられることがある
+        imported = [name_ for name_ in sys.modules if name_ not in before]
+        with _lock:
+            _stages.append({"stage": name, "thread": threading.current_thread().name,
+                            "start_ms": elapsed_ms(start), "duration_ms": (end - start) * 1000,
+                            "modules": len(imported), "packages": dict(_top_level(imported)[:TOP_MODULES])})
+        metrics.observe("startup_stage", end - start, stage=name)
+
+
+def mark(name):
+    """節目（画面が出た・操作できるようになったなど）の時刻を記録する（最初の1回だけ）"""
+    with _lock:
+        _marks.setdefault(name, elapsed_ms())
+
+
+def report():
+    """ここまでの記録を辞書で返す"""
+    with _lock:
+        return {"stages": sorted(_stages, key=lambda s: s["start_ms"]), "marks": dict(_marks),
+                "modules_loaded": len(sys.modules)}
+
+
+def format_report(data=None):
+    """記録を表の文字列にする"""
+    data = data or report()
+    lines = ["起動時間の内訳 (ms)", f"{'開始':>9} | {'所要':>9} | {'モジュール':>5} | 段階 [スレッド] 主なパッケージ"]
+    for s in data["stages"]:
+        packages = ", ".join(f"{name}({count})" for name, count in s["packages"].items())
+        lines.append(f"{s['start_ms']:9.1f} | {s['duration_ms']:9.1f} | {s['modules']:>5} | {s['stage']} [{s['thread']}] {packages}")
+    for name, at in sorted(data["marks"].items(), key=lambda item: item[1]):
+        lines.append(f"{at:9.1f} | {'':>9} | {'':>5} | ★ {name}")
+    return "\n".join(lines)
+
+
+def finish(name="ready"):
+    """準備が終わった節目を記録し、設定されていれば報告を出す（2回目以降は何もしない）"""
+    global _reported
+    mark(name)
+    setting = os.environ.get(ENV_VAR)
+    with _lock:
+        if _reported or not setting:
+            return
+        _reported = True
+    data = report()
+    print(format_report(data), file=sys.stderr)
+    if setting not in ("1", "true", "yes"):
+        try:
+            with open(setting, "a", encoding="utf-8") as f:
+                f.write(json.dumps({"time": time.time(), "argv": sys.argv, **data}, ensure_ascii=False) + "\n")
+        except IOError as e:
+            print(f"起動時間の記録を書き込めませんでした: {e}", file=sys.stderr)
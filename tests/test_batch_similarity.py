@@ -0,0 +1,61 @@
+import threading
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+import batch_similarity
+from compact_store import CompactVectorStore
+from similarity_table import SimilarityTableCache
+
+
+@pytest.fixture(scope="module")
+def model():
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((300, 8)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return CompactVectorStore([f"w{i}" for i in range(300)], vectors)
+
+
+def test_pairs_match_single_similarity(model):
+    questions = ["w0", "w1", "w0", "missing", "w2"]
+    guesses = ["w5", "w6", "w7", "w8", "missing"]
+    result = batch_similarity.similarity_pairs(model, questions, guesses)
+    assert result.in_vocab.tolist() == [True, True, True, False, False]
+    for i in range(3):
+        assert result.similarities[i] == pytest.approx(model.similarity(questions[i], guesses[i]), abs=1e-6)
+    assert result.similarities[3] == 0 and result.ranks.tolist() == [-1] * 5
+
+
+def test_ranks_match_with_and_without_table(model):
+    guesses = [f"w{i}" for i in range(1, 40)]
+    expected = {word: rank for rank, (word, _) in enumerate(model.most_similar("w0", topn=299), 1)}
+    plain = batch_similarity.similarity_one_to_many(model, "w0", guesses, with_ranks=True)
+    tables = SimilarityTableCache()
+    tables.get(model, "w0")
+    cached = batch_similarity.similarity_one_to_many(model, "w0", guesses, with_ranks=True, tables=tables)
+    assert plain.ranks.tolist() == [expected[word] for word in guesses]
+    assert cached.ranks.tolist() == plain.ranks.tolist()
+    assert np.allclose(cached.similarities, plain.similarities)
+
+
+def test_batcher_groups_concurrent_requests(model):
+    batcher = batch_similarity.similarity_batcher(lambda: model, max_batch=64, max_delay=0.05)
+    try:
+        start = threading.Barrier(20)
+        futures = [None] * 20
+
+        def submit(i):
+            start.wait()
+            futures[i] = batcher.submit(("w0", f"w{i + 1}"))
+        threads = [threading.Thread(target=submit, args=(i,)) for i in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        results = [future.result(5) for future in futures]
+        assert results[0] == (pytest.approx(model.similarity("w0", "w1"), abs=1e-6), True)
+        assert batcher.stats()["items"] == 20 and batcher.stats()["batches"] < 20
+        assert batcher.submit(("w0", "missing")).result(5) == (0.0, False)
+    finally:
+        batcher.stop()
@@ -0,0 +1,50 @@
+import os
+
+import pytest
+
+np = pytest.importorskip("numpy")
+gensim_models = pytest.importorskip("gensim.models")
+
+import compact_store
+
+
+@pytest.fixture
+def kv():
+    rng = np.random.default_rng(0)
+    words = [f"単語{i}" for i in range(400)] + ["apple", "りんご"]
+    kv = gensim_models.KeyedVectors(32)
+    kv.add_vectors(words, rng.standard_normal((len(words), 32)).astype(np.float32))
+    return kv
+
+
+@pytest.mark.parametrize("dtype, tolerance", [("float16", 1e-3), ("int8", 2e-2)])
+def test_similarity_is_close_to_exact(kv, dtype, tolerance):
+    store = compact_store.build_compact_store(kv, dtype, top_n=0, script_filter=False)
+    assert len(store) == len(kv.index_to_key)
+    rng = np.random.default_rng(1)
+    for a, b in rng.integers(0, len(store), (200, 2)):
+        word1, word2 = store.index_to_key[a], store.index_to_key[b]
+        assert store.similarity(word1, word2) == pytest.approx(float(kv.similarity(word1, word2)), abs=tolerance)
+    exact = [word for word, _ in kv.most_similar("単語0", topn=10)]
+    compact = [word for word, _ in store.most_similar("単語0", topn=10)]
+    assert len(set(exact) & set(compact)) >= 8
+
+
+def test_select_vocabulary_filters_but_keeps_data_words():
+    words = ["りんご", "apple", "単語1", "東京", "りんご", "ばなな"]
+    ids = compact_store.select_vocabulary(words, top_n=4, keep_words={"ばなな"})
+    assert [words[i] for i in ids] == ["りんご", "東京", "ばなな"]
+    ids = compact_store.select_vocabulary(words, top_n=0, allow_latin=True)
+    assert [words[i] for i in ids] == ["りんご", "apple", "東京", "ばなな"]
+
+
+def test_save_and_load_round_trip(kv, tmp_path):
+    store = compact_store.build_compact_store(kv, "int8", top_n=0, script_filter=False)
+    directory = str(tmp_path / "store")
+    store.save(directory, {"source": "test"})
+    assert not [name for name in os.listdir(directory) if name.endswith(".tmp")]
+    assert compact_store.read_store_meta(directory) == {"source": "test", "dtype": "int8", "count": len(store)}
+    loaded = compact_store.CompactVectorStore.load(directory)
+    assert loaded.index_to_key == store.index_to_key
+    assert np.array_equal(loaded.source_ids, store.source_ids)
+    assert loaded.similarity("りんご", "apple") == pytest.approx(store.similarity("りんご", "apple"))
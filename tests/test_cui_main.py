@@ -0,0 +1,53 @@
+import io
+import json
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+import cui_main
+import game_logic
+from compact_store import CompactVectorStore
+
+VOCABULARY = {
+    "りんご": [1.0, 0.0, 0.0],
+    "みかん": [0.9, 0.3, 0.0],
+    "ぶどう": [0.8, 0.5, 0.1],
+    "いす": [0.0, 0.2, 1.0],
+}
+
+
+@pytest.fixture
+def model():
+    vectors = np.array(list(VOCABULARY.values()), dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    state = game_logic.ModelState(CompactVectorStore(list(VOCABULARY), vectors.astype(np.float16)), fingerprint="test")
+    previous = game_logic.set_state(state)
+    yield state.model
+    game_logic.set_state(previous)
+
+
+def run(lines):
+    out = io.StringIO()
+    errors = cui_main.run_batch(io.StringIO("\n".join(lines)), out, ({}, {}, {}))
+    return errors, [json.loads(line) for line in out.getvalue().splitlines()]
+
+
+def test_replay_counts_only_scored_guesses(model):
+    result = cui_main.replay_game("りんご", ["みかん", "ばなな", "みかん", "いす", "りんご", "ぶどう"])
+    assert [r["status"] for r in result["results"]] == ["scored", "unknown", "duplicate", "scored", "correct"]
+    assert result["solved"] and result["guess_count"] == 3
+    assert result["best"]["word"] == "みかん"
+
+
+def test_batch_reports_invalid_lines(model):
+    errors, results = run([
+        json.dumps({"question": "りんご", "guesses": ["みかん", "りんご"]}),
+        json.dumps({"question": ["りんご"], "guesses": []}),
+        json.dumps({"question": "りんご", "guesses": "みかん"}),
+        json.dumps({"question": "りんご", "guesses": [1, 2]}),
+        "{not json",
+    ])
+    assert errors == 4
+    assert results[0]["solved"] and "error" not in results[0]
+    assert [r["line"] for r in results if "error" in r] == [2, 3, 4, 5]
@@ -0,0 +1,147 @@
+import asyncio
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+import game_logic
+import game_server
+import history_store
+from compact_store import CompactVectorStore
+
+# 果物が近く、家具が遠くなるように並べた小さなモデル
+VOCABULARY = {
+    "りんご": [1.0, 0.0, 0.0],
+    "みかん": [0.9, 0.3, 0.0],
+    "ぶどう": [0.8, 0.5, 0.1],
+    "Apple": [0.7, 0.0, 0.7],
+    "いす": [0.0, 0.2, 1.0],
+    "つくえ": [0.0, 0.3, 0.9],
+}
+NORMAL_DATA = {"果物": ["りんご"]}
+
+
+@pytest.fixture
+def model():
+    vectors = np.array(list(VOCABULARY.values()), dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    state = game_logic.ModelState(CompactVectorStore(list(VOCABULARY), vectors.astype(np.float16)), fingerprint="test")
+    previous = game_logic.set_state(state)
+    yield state.model
+    game_logic.set_state(previous)
+
+
+def run_game(test, history=None):
+    """ゲームサービスを起動して test(client, service) を実行する"""
+    async def main():
+        service = game_server.GameService({}, NORMAL_DATA, {}, workers=2, pool_depth=0, history=history)
+        try:
+            await test(game_server.LocalClient(service), service)
+        finally:
+            service.close()
+    asyncio.run(main())
+
+
+def test_start_and_correct_guess(model):
+    async def test(client, service):
+        status, state = await client.start(difficulty="2")
+        assert status == 201
+        assert state["status"] == "playing" and "answer" not in state
+        status, result = await client.guess(state["session"], "りんご")
+        assert status == 200 and result["correct"]
+        assert result["state"]["status"] == "won" and result["state"]["answer"] == "りんご"
+        status, result = await client.guess(state["session"], "みかん")
+        assert status == 409
+    run_game(test)
+
+
+def test_guess_scores_unknown_and_duplicate_words(model):
+    async def test(client, service):
+        session_id = (await client.start(difficulty="2"))[1]["session"]
+        status, near = await client.guess(session_id, "みかん")
+        assert status == 200 and not near["correct"] and near["guess_rank"] == 1
+        assert near["similarity"] == pytest.approx(model.similarity("りんご", "みかん"))
+        _, far = await client.guess(session_id, "いす")
+        assert far["similarity"] < near["similarity"] and far["guess_rank"] == 2
+        _, unknown = await client.guess(session_id, "ばなな")
+        assert unknown == {"word": "ばなな", "correct": False, "in_vocab": False}
+        _, duplicate = await client.guess(session_id, "みかん")
+        assert duplicate["duplicate"] and duplicate["guess_rank"] == 1
+        status, state = await client.request("GET", f"/games/{session_id}")
+        assert state["guess_count"] == 2 and state["best"]["word"] == "みかん"
+    run_game(test)
+
+
+def test_spelling_variants_are_resolved(model):
+    async def test(client, service):
+        session_id = (await client.start(difficulty="2"))[1]["session"]
+        _, result = await client.guess(session_id, "ＡＰＰＬＥ")
+        assert result["word"] == "Apple" and result["in_vocab"]
+        _, result = await client.guess(session_id, "apple")
+        assert result["duplicate"]
+        _, result = await client.guess(session_id, "リンゴ")
+        assert result["correct"] and result["word"] == "りんご"
+    run_game(test)
+
+
+def test_give_up_and_ranking(model):
+    async def test(client, service):
+        session_id = (await client.start(difficulty="2"))[1]["session"]
+        for word in ("いす", "みかん", "つくえ", "ぶどう"):
+            await client.guess(session_id, word)
+        status, ranking = await client.ranking(session_id, 1)
+        assert status == 200 and ranking["count"] == 4
+        assert [row["word"] for row in ranking["top"]] == ["みかん"]
+        assert [row["place"] for row in ranking["bottom"]] == [4]
+        status, _ = await client.ranking(session_id, -1)
+        assert status == 400
+        status, state = await client.give_up(session_id)
+        assert status == 200 and state["status"] == "gave_up" and state["answer"] == "りんご"
+        status, _ = await client.give_up(session_id)
+        assert status == 409
+    run_game(test)
+
+
+def test_timeout_expires_session(model):
+    async def test(client, service):
+        finished = []
+        status, state = await client.start(difficulty="2", time_limit=0.05)
+        assert status == 201
+        service.get_session(state["session"]).listeners.append(finished.append)
+        await asyncio.sleep(0.1)
+        assert [event["status"] for event in finished] == ["timeout"]
+        status, state = await client.request("GET", f"/games/{state['session']}")
+        assert state["status"] == "timeout" and state["remaining"] == 0.0
+        status, result = await client.guess(state["session"], "みかん")
+        assert status == 409
+    run_game(test)
+
+
+def test_request_errors(model):
+    async def test(client, service):
+        assert (await client.start(difficulty="9"))[0] == 400
+        assert (await client.start(difficulty="2", time_limit=-1))[0] == 400
+        assert (await client.guess("missing", "りんご"))[0] == 404
+        assert (await client.request("POST", "/games", b"{not json"))[0] == 400
+        assert (await client.request("DELETE", "/games/missing/guess"))[0] == 405
+        assert (await client.request("GET", "/leaderboard"))[0] == 404  # 履歴なし
+    run_game(test)
+
+
+def test_games_are_recorded_in_history(model, tmp_path):
+    history = history_store.HistoryStore(str(tmp_path / "history.sqlite3"), flush_interval=0.01)
+
+    async def test(client, service):
+        session_id = (await client.start(difficulty="2", player="tester"))[1]["session"]
+        await client.guess(session_id, "みかん")
+        await client.guess(session_id, "りんご")
+        await asyncio.get_running_loop().run_in_executor(None, history.flush)
+        status, board = await client.request("GET", "/leaderboard?difficulty=2&n=5")
+        assert status == 200 and [game["player"] for game in board["games"]] == ["tester"]
+        assert (await client.request("GET", "/leaderboard?n=-1"))[0] == 400
+        status, stats = await client.request("GET", "/players/tester/stats")
+        assert status == 200 and stats["won"] == 1
+    try:
+        run_game(test, history)
+    finally:
+        history.close()
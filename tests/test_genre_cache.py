@@ -0,0 +1,58 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+import genre_cache
+from compact_store import CompactVectorStore
+
+VOCABULARY = {
+    "果物": [1.0, 0.0, 0.0],
+    "りんご": [0.9, 0.3, 0.0],
+    "みかん": [0.8, 0.5, 0.1],
+    "家具": [0.0, 0.0, 1.0],
+    "いす": [0.0, 0.3, 0.9],
+}
+E_DATA = {"果物": {"example_words": ["りんご"]}, "家具": {"example_words": []}}
+PARAMS = {"topn": 10, "threshold": 0.5}
+
+
+@pytest.fixture
+def model():
+    vectors = np.array(list(VOCABULARY.values()), dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return CompactVectorStore(list(VOCABULARY), vectors)
+
+
+@pytest.fixture
+def calls(model):
+    calls = []
+
+    def find_similar(genre, topn):
+        calls.append(genre)
+        return model.most_similar(genre, topn=topn)
+    find_similar.calls = calls
+    return find_similar
+
+
+def test_entry_scores_are_max_similarity_to_examples(model, calls):
+    entry = dict(genre_cache.build_genre_entry(model, "果物", E_DATA["果物"], calls, 10, 0.5))
+    assert set(entry) == {"りんご", "みかん"}
+    assert entry["みかん"] == pytest.approx(model.similarity("みかん", "りんご"), abs=1e-6)
+    assert genre_cache.build_genre_entry(model, "家具", E_DATA["家具"], calls, 10, 0.5) == [("いす", 0.0)]
+
+    def missing(genre, topn):
+        raise KeyError(genre)
+    assert genre_cache.build_genre_entry(model, "ない", {}, missing, 10, 0.5) == []
+
+
+def test_only_changed_genres_are_rebuilt(model, calls, tmp_path):
+    path = str(tmp_path / "genres.json")
+    first = genre_cache.prepare_tables(model, E_DATA, calls, path, PARAMS)
+    assert sorted(calls.calls) == ["家具", "果物"]
+    assert genre_cache.prepare_tables(model, E_DATA, calls, path, PARAMS) == first
+    assert len(calls.calls) == 2
+    changed = dict(E_DATA, 家具={"example_words": ["いす"]})
+    genre_cache.prepare_tables(model, changed, calls, path, PARAMS)
+    assert calls.calls[2:] == ["家具"]
+    genre_cache.prepare_tables(model, changed, calls, path, dict(PARAMS, threshold=0.6))
+    assert sorted(calls.calls[3:]) == ["家具", "果物"]
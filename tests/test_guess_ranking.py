@@ -0,0 +1,64 @@
+from guess_ranking import GuessRanking
+
+
+def make_ranking(count):
+    ranking = GuessRanking()
+    for i in range(count):
+        ranking.add(f"単語{i}", i / count)
+    return ranking
+
+
+def test_add_returns_rank_in_similarity_order():
+    ranking = GuessRanking()
+    assert ranking.add("みかん", 0.5) == 1
+    assert ranking.add("ぶどう", 0.7) == 1
+    assert ranking.add("いす", 0.1) == 3
+    assert ranking.rank("みかん") == 2
+    assert ranking.best() == ("ぶどう", 0.7)
+
+
+def test_add_existing_word_keeps_first_similarity():
+    ranking = GuessRanking()
+    ranking.add("みかん", 0.5)
+    ranking.add("ぶどう", 0.7)
+    assert ranking.add("みかん", 0.9) == 2
+    assert ranking.similarity("みかん") == 0.5
+    assert len(ranking) == 2
+
+
+def test_ties_keep_guess_order():
+    ranking = GuessRanking()
+    for word in ("a", "b", "c"):
+        ranking.add(word, 0.3)
+    assert [word for _, word, _ in ranking.top(3)] == ["a", "b", "c"]
+
+
+def test_matches_full_sort():
+    similarities = [0.3, -0.1, 0.8, 0.3, 0.55, 0.0, 0.8]
+    ranking = GuessRanking()
+    for i, similarity in enumerate(similarities):
+        ranking.add(f"w{i}", similarity)
+    expected = sorted(((f"w{i}", s) for i, s in enumerate(similarities)), key=lambda item: -item[1])
+    assert [(word, sim) for _, word, sim in ranking.top(len(similarities))] == expected
+
+
+def test_top_and_bottom():
+    ranking = make_ranking(12)
+    assert [place for place, _, _ in ranking.top(3)] == [1, 2, 3]
+    assert [place for place, _, _ in ranking.bottom(3)] == [10, 11, 12]
+    assert ranking.top(0) == []
+    assert ranking.bottom(0) == []
+
+
+def test_display_rows_splits_only_when_long():
+    top, bottom = make_ranking(6).display_rows(3)
+    assert len(top) == 6 and bottom == []
+    top, bottom = make_ranking(12).display_rows(3)
+    assert [place for place, _, _ in top] == [1, 2, 3]
+    assert [place for place, _, _ in bottom] == [10, 11, 12]
+
+
+def test_empty_ranking():
+    ranking = GuessRanking()
+    assert ranking.best() is None
+    assert ranking.display_rows(5) == ([], [])
@@ -0,0 +1,96 @@
+import io
+import json
+
+import pytest
+
+import history_store
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = history_store.HistoryStore(str(tmp_path / "history.sqlite3"), flush_interval=0.01)
+    yield store
+    store.close()
+
+
+def play(store, question, guesses, outcome, player="p", difficulty="1"):
+    session_id = store.start_session(question, "果物", difficulty, player, "model.vec", 60)
+    for typed, similarity in guesses:
+        store.record_guess(session_id, typed, typed, "scored", similarity, 10)
+    if outcome:
+        store.finish_session(session_id, outcome)
+    return session_id
+
+
+def test_session_records_guesses_in_order(store):
+    session_id = play(store, "りんご", [("みかん", 0.6), ("ぶどう", 0.7)], None)
+    store.record_guess(session_id, "リンゴ", "りんご", "correct", 1.0, 0)
+    store.finish_session(session_id, "won")
+    store.flush()
+    session = store.session(session_id)
+    assert session["outcome"] == "won"
+    assert session["guess_count"] == 3
+    assert [guess["input"] for guess in session["details"]] == ["みかん", "ぶどう", "リンゴ"]
+
+
+def test_guesses_after_finish_are_ignored(store):
+    session_id = play(store, "りんご", [("みかん", 0.6)], "gave_up")
+    store.record_guess(session_id, "ぶどう", "ぶどう", "scored", 0.7)
+    store.finish_session(session_id, "won")
+    store.flush()
+    session = store.session(session_id)
+    assert session["outcome"] == "gave_up"
+    assert len(session["details"]) == 1
+
+
+def test_player_stats(store):
+    play(store, "りんご", [("みかん", 0.6)], "won")
+    play(store, "ばなな", [], "timeout")
+    play(store, "いちご", [], "gave_up", difficulty="2")
+    play(store, "もも", [], "won", player="other")
+    store.flush()
+    stats = store.player_stats("p")
+    assert stats["games"] == 3 and stats["won"] == 1
+    assert stats["by_difficulty"]["1"]["timeout"] == 1
+    assert stats["by_difficulty"]["2"]["gave_up"] == 1
+
+
+def test_fastest_solves_filters_by_difficulty(store):
+    play(store, "りんご", [], "won", difficulty="1")
+    play(store, "いちご", [], "won", difficulty="2")
+    play(store, "ばなな", [], "gave_up", difficulty="1")
+    store.flush()
+    assert [game["question"] for game in store.fastest_solves("1")] == ["りんご"]
+    assert len(store.fastest_solves(limit=1)) == 1
+
+
+def test_close_marks_open_sessions_abandoned(tmp_path):
+    path = str(tmp_path / "history.sqlite3")
+    store = history_store.HistoryStore(path)
+    session_id = play(store, "りんご", [("みかん", 0.6)], None)
+    store.close()
+    reopened = history_store.HistoryStore(path)
+    try:
+        assert reopened.session(session_id)["outcome"] == history_store.ABANDONED
+        assert reopened.player_stats("p")["by_difficulty"]["1"]["abandoned"] == 1
+    finally:
+        reopened.close()
+
+
+def test_export_can_be_replayed(store):
+    play(store, "りんご", [("みかん", 0.6), ("ぶどう", 0.7)], "won")
+    store.flush()
+    out = io.StringIO()
+    assert store.export(out) == 1
+    exported = json.loads(out.getvalue())
+    assert exported["question"] == "りんご"
+    assert exported["guesses"] == ["みかん", "ぶどう"]
+
+
+def test_compact_keeps_finished_sessions(store):
+    finished = play(store, "りんご", [("みかん", 0.6)], "won")
+    play(store, "ばなな", [("みかん", 0.2)], None)
+    removed = store.compact(before=float("inf"))
+    assert removed == {"guesses": 2, "unfinished_sessions": 1}
+    assert store.session(finished)["details"] == []
+    assert store.player_stats("p")["games"] == 1
@@ -0,0 +1,57 @@
+import pytest
+
+import metrics
+
+
+@pytest.fixture
+def enabled():
+    metrics.reset()
+    metrics.enable()
+    yield
+    metrics.disable()
+    metrics.reset()
+
+
+def test_disabled_records_nothing():
+    metrics.reset()
+    metrics.observe("guess", 0.01)
+    metrics.increment("games")
+    assert metrics.prometheus_text() == "\n"
+
+
+def test_histogram_buckets_are_cumulative(enabled):
+    metrics.observe("guess", 0.0002, mode="easy")
+    metrics.observe("guess", 0.002, mode="easy")
+    metrics.observe("guess", 60.0, mode="easy")
+    lines = metrics.prometheus_text().splitlines()
+    assert lines[0] == "# TYPE wordrequest_guess_seconds histogram"
+    assert 'wordrequest_guess_seconds_bucket{mode="easy",le="0.0001"} 0' in lines
+    assert 'wordrequest_guess_seconds_bucket{mode="easy",le="0.0005"} 1' in lines
+    assert 'wordrequest_guess_seconds_bucket{mode="easy",le="0.005"} 2' in lines
+    assert 'wordrequest_guess_seconds_bucket{mode="easy",le="30.0"} 2' in lines
+    assert 'wordrequest_guess_seconds_bucket{mode="easy",le="+Inf"} 3' in lines
+    assert 'wordrequest_guess_seconds_count{mode="easy"} 3' in lines
+
+
+def test_counters_and_type_declared_once(enabled):
+    metrics.increment("games", difficulty="1")
+    metrics.increment("games", 2, difficulty="2")
+    metrics.increment("games", difficulty="1")
+    lines = metrics.prometheus_text().splitlines()
+    assert lines.count("# TYPE wordrequest_games_total counter") == 1
+    assert 'wordrequest_games_total{difficulty="1"} 2' in lines
+    assert 'wordrequest_games_total{difficulty="2"} 2' in lines
+
+
+def test_label_values_are_escaped(enabled):
+    metrics.increment("errors", message='a "quoted"\\path\nnext')
+    assert 'wordrequest_errors_total{message="a \\"quoted\\"\\\\path\\nnext"} 1' in metrics.prometheus_text()
+
+
+def test_timer_counts_errors(enabled):
+    with pytest.raises(ValueError):
+        with metrics.timer("load"):
+            raise ValueError
+    text = metrics.prometheus_text()
+    assert "wordrequest_load_seconds_count 1" in text
+    assert "wordrequest_load_errors_total 1" in text
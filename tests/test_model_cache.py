@@ -0,0 +1,57 @@
+import os
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+import model_cache
+
+WORDS = ["りんご", "みかん", "ぶどう", "りんご"]  # 重複した単語は先に出てくる方を使う
+
+
+@pytest.fixture
+def model_path(tmp_path):
+    path = tmp_path / "model.vec"
+    path.write_text("4 3\n", encoding="utf-8")
+    return str(path)
+
+
+def test_save_and_load_round_trip(model_path):
+    vectors = np.arange(12, dtype=np.float64).reshape(4, 3)
+    assert not model_cache.is_cache_valid(model_path)
+    model_cache.save_cache(model_path, WORDS, vectors)
+    assert model_cache.is_cache_valid(model_path)
+    words, loaded, norms = model_cache.load_cache(model_path)
+    assert words == WORDS
+    assert isinstance(loaded, np.memmap) and loaded.dtype == np.float32
+    assert np.array_equal(loaded, vectors.astype(np.float32))
+    assert np.allclose(norms, np.linalg.norm(vectors, axis=1))
+    assert not [name for name in os.listdir(model_cache.get_cache_dir(model_path)) if name.endswith(".tmp")]
+
+
+def test_cache_is_invalid_when_source_changes(model_path):
+    model_cache.save_cache(model_path, WORDS, np.ones((4, 3)))
+    with open(model_path, "a", encoding="utf-8") as f:
+        f.write("変更\n")
+    assert not model_cache.is_cache_valid(model_path)
+
+
+def test_limited_cache_is_separate(model_path):
+    model_cache.save_cache(model_path, WORDS[:2], np.ones((2, 3)), limit=2)
+    assert model_cache.is_cache_valid(model_path, limit=2)
+    assert not model_cache.is_cache_valid(model_path)
+
+
+def test_missing_meta_invalidates_cache(model_path):
+    model_cache.save_cache(model_path, WORDS, np.ones((4, 3)))
+    os.remove(model_cache.get_cache_paths(model_path)["meta"])
+    assert not model_cache.is_cache_valid(model_path)
+
+
+def test_build_keyed_vectors_prefers_first_duplicate(model_path):
+    pytest.importorskip("gensim")
+    model_cache.save_cache(model_path, WORDS, np.eye(4, 3) + 0.1)
+    kv = model_cache.build_keyed_vectors(*model_cache.load_cache(model_path))
+    assert kv.key_to_index["りんご"] == 0
+    assert kv.similarity("りんご", "りんご") == pytest.approx(1.0)
+    assert "みかん" not in [word for word, _ in kv.most_similar("みかん", topn=3)]
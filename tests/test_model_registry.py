@@ -0,0 +1,22 @@
+import game_logic
+import model_registry
+
+
+def test_list_models_prefers_readme_models(tmp_path):
+    for name in ("zzz.vec", "cc.ja.300.vec", "notes.md", ".hidden.vec"):
+        (tmp_path / name).write_text("1 1\na 0\n", encoding="utf-8")
+    assert [info.name for info in model_registry.list_models(str(tmp_path))] == ["cc.ja.300.vec", "zzz.vec"]
+
+
+def test_switch_failure_keeps_current_model(monkeypatch):
+    def broken_index(*args, **kwargs):
+        raise RuntimeError("index failed")
+
+    monkeypatch.setattr(game_logic, "build_model_state", lambda *args, **kwargs: game_logic.ModelState(fingerprint="new"))
+    monkeypatch.setattr(game_logic, "prepare_neighbor_index", broken_index)
+    current = game_logic.get_state()
+    switcher = model_registry.ModelSwitcher()
+    assert switcher.switch("model/new.vec", game_logic.get_default_settings())
+    switcher.wait(5)
+    assert "index failed" in switcher.error
+    assert game_logic.get_state() is current
@@ -0,0 +1,83 @@
+import pytest
+
+import neighbor_cache
+from neighbor_cache import NeighborCache
+
+RESULT = [("みかん", 0.8), ("ぶどう", 0.6), ("いす", 0.1)]
+
+
+@pytest.fixture
+def cache():
+    cache = NeighborCache()
+    yield cache
+    if cache.disk is not None:
+        cache.disk.close()
+
+
+def test_hit_returns_prefix_and_larger_topn_misses(cache):
+    cache.put("りんご", 3, "fp", RESULT)
+    assert cache.get("りんご", 2, "fp") == RESULT[:2]
+    assert cache.get("りんご", 5, "fp") is None
+    assert cache.get("りんご", 2, "other") is None
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 2
+
+
+def test_evicts_least_recently_used_by_entries():
+    cache = NeighborCache(max_entries=2)
+    cache.put("a", 3, "fp", RESULT)
+    cache.put("b", 3, "fp", RESULT)
+    cache.get("a", 3, "fp")
+    cache.put("c", 3, "fp", RESULT)
+    assert cache.get("b", 3, "fp") is None
+    assert cache.get("a", 3, "fp") == RESULT and cache.get("c", 3, "fp") == RESULT
+
+
+def test_evicts_by_bytes():
+    size = neighbor_cache.estimate_bytes(RESULT)
+    cache = NeighborCache(max_bytes=size * 2)
+    for word in ("a", "b", "c"):
+        cache.put(word, 3, "fp", RESULT)
+    assert cache.stats()["entries"] == 2 and cache.bytes == size * 2
+    assert cache.get("a", 3, "fp") is None
+
+
+def test_get_or_compute_calls_compute_once(cache):
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return RESULT
+
+    assert cache.get_or_compute("りんご", 3, "fp", compute) == RESULT
+    assert cache.get_or_compute("りんご", 3, "fp", compute) == RESULT
+    assert len(calls) == 1
+
+
+def test_disk_tier_survives_restart(cache, tmp_path):
+    path = str(tmp_path / neighbor_cache.DISK_FILE_NAME)
+    cache.attach_disk(path)
+    cache.put("りんご", 3, "fp", RESULT)
+    cache.disk.close()
+    restarted = NeighborCache()
+    restarted.attach_disk(path)
+    try:
+        assert restarted.get("りんご", 3, "fp") == RESULT
+        assert restarted.stats()["disk_hits"] == 1
+        assert restarted.get("りんご", 3, "fp") == RESULT  # 2回目はメモリから
+        assert restarted.stats()["hits"] == 1
+    finally:
+        restarted.disk.close()
+
+
+def test_disk_tier_keeps_most_recent_entries(tmp_path, monkeypatch):
+    clock = iter(range(100))
+    monkeypatch.setattr(neighbor_cache.time, "time", lambda: float(next(clock)))
+    disk = neighbor_cache.DiskTier(str(tmp_path / "neighbors.sqlite3"), max_entries=2)
+    try:
+        for word in ("a", "b", "c"):
+            disk.put("fp", word, 3, RESULT)
+        disk.flush()
+        assert disk.get("fp", "a", 3) is None
+        assert disk.get("fp", "c", 3) == (3, RESULT)
+    finally:
+        disk.close()
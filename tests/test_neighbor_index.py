@@ -0,0 +1,48 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+import neighbor_index
+from compact_store import CompactVectorStore
+
+
+@pytest.fixture(scope="module")
+def model():
+    """20個のクラスタに分かれた 2000 語の小さなモデル"""
+    rng = np.random.default_rng(0)
+    centers = rng.standard_normal((20, 16)).astype(np.float32)
+    vectors = centers[rng.integers(0, 20, 2000)] + 0.4 * rng.standard_normal((2000, 16)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return CompactVectorStore([f"w{i}" for i in range(2000)], vectors)
+
+
+def test_every_word_is_in_one_bucket(model):
+    index = neighbor_index.IVFIndex.build(model, nlist=20)
+    assert index.list_offsets[-1] == len(model)
+    assert sorted(index.list_ids.tolist()) == list(range(len(model)))
+
+
+def test_all_buckets_match_exact_search(model):
+    index = neighbor_index.IVFIndex.build(model, nlist=20)
+    exact = neighbor_index.ExactIndex(model)
+    for word in ("w0", "w1", "w2"):
+        approximate = index.search(word, topn=10, nprobe=index.nlist)
+        assert [w for w, _ in approximate] == [w for w, _ in exact.search(word, topn=10)]
+        assert word not in [w for w, _ in approximate]
+
+
+def test_recall_grows_with_nprobe(model):
+    index = neighbor_index.IVFIndex.build(model, nlist=20)
+    report = neighbor_index.evaluate_recall(model, index, [f"w{i}" for i in range(0, 2000, 50)], k=20, nprobes=(1, 4, 20))
+    recalls = [row["recall@20"] for row in report["results"][1:]]
+    assert recalls == sorted(recalls)
+    assert recalls[1] >= 0.9 and recalls[2] == 1.0
+
+
+def test_saved_index_is_reused_for_same_fingerprint(model, tmp_path):
+    model_path = str(tmp_path / "model.vec")
+    built = neighbor_index.open_index(model, "ivf", model_path, "abc")
+    loaded = neighbor_index.open_index(model, "ivf", model_path, "abc")
+    assert np.array_equal(loaded.centroids, built.centroids)
+    assert loaded.search("w0", topn=5) == built.search("w0", topn=5)
+    assert isinstance(neighbor_index.open_index(model, "exact", model_path, "abc"), neighbor_index.ExactIndex)
@@ -0,0 +1,59 @@
+import itertools
+import time
+
+import pytest
+
+import game_logic
+import question_pool
+from question_pool import QuestionPool
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_pool_fills_to_depth_and_refills():
+    counter = itertools.count()
+    pool = QuestionPool(lambda: (f"お題{next(counter)}", "ジャンル"), depth=2, name="test")
+    try:
+        wait_for(lambda: pool.stats()["depth"] == 2)
+        assert pool.get() == ("お題0", "ジャンル")
+        wait_for(lambda: pool.stats()["depth"] == 2)
+        assert pool.stats()["served"] == 1 and pool.stats()["generated"] >= 3
+    finally:
+        pool.stop()
+
+
+def test_pool_retries_failures(monkeypatch):
+    monkeypatch.setattr(question_pool, "RETRY_DELAY", 0.001)
+    results = iter([(None, None), ValueError("失敗"), ("りんご", "果物")])
+
+    def generate():
+        result = next(results, ("みかん", "果物"))
+        if isinstance(result, Exception):
+            raise result
+        return result
+    pool = QuestionPool(generate, depth=1, name="test")
+    try:
+        assert pool.get(timeout=5) == ("りんご", "果物")
+        assert pool.stats()["failures"] == 2
+    finally:
+        pool.stop()
+
+
+def test_manager_keeps_recent_custom_keywords(monkeypatch):
+    monkeypatch.setattr(game_logic, "generate_question_by_difficulty", lambda *args: (None, None))
+    monkeypatch.setattr(game_logic, "generate_custom_question", lambda keyword: keyword + "の単語")
+    manager = question_pool.QuestionPoolManager({}, {}, {}, depth=1, custom_keywords=2)
+    try:
+        for keyword in ("果物", "家具", "果物", "動物"):
+            manager.watch_custom(keyword)
+        assert list(manager.custom_pools) == ["果物", "動物"]
+        wait_for(lambda: manager.custom_pools["果物"].stats()["depth"] == 1)
+        assert manager.get_custom("果物") == ("果物の単語", "カスタム:「果物」")
+        assert manager.get_custom("家具") is None
+    finally:
+        manager.stop()
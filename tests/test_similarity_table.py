@@ -0,0 +1,39 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from compact_store import CompactVectorStore
+from similarity_table import SimilarityTable, SimilarityTableCache
+
+
+@pytest.fixture(scope="module")
+def model():
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((300, 8)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return CompactVectorStore([f"w{i}" for i in range(300)], vectors)
+
+
+def test_table_matches_exact_similarity_and_rank(model):
+    table = SimilarityTable(model, "w0").build()
+    assert table.lookup("w0") == (pytest.approx(1.0), 0)
+    neighbors = model.most_similar("w0", topn=299)
+    for rank, (word, similarity) in enumerate(neighbors, 1):
+        assert table.lookup(word) == (pytest.approx(similarity), rank)
+    assert table.lookup("missing") is None
+
+
+def test_unknown_question_builds_empty_table(model):
+    table = SimilarityTable(model, "missing").build_async()
+    assert table.wait(5)
+    assert table.ready and table.lookup("w0") is None
+
+
+def test_cache_reuses_and_evicts_tables(model):
+    cache = SimilarityTableCache(max_tables=2)
+    first = cache.get(model, "w0")
+    assert cache.get(model, "w0") is first and cache.peek(model, "w0") is first
+    cache.get(model, "w1")
+    cache.get(model, "w2")
+    assert cache.peek(model, "w0") is None
+    assert cache.misses == 3
@@ -0,0 +1,35 @@
+import random
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from compact_store import CompactVectorStore
+from solver import Solver
+
+
+@pytest.fixture(scope="module")
+def model():
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((500, 16)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return CompactVectorStore([f"w{i}" for i in range(500)], vectors)
+
+
+def oracle(model, answer):
+    def guess(word):
+        return word == answer, model.similarity(word, answer)
+    return guess
+
+
+@pytest.mark.parametrize("precision, max_count", [(None, 3), (2, 10)])
+def test_solver_finds_answer(model, precision, max_count):
+    solver = Solver(model, precision=precision, rng=random.Random(0))
+    for answer in ("w3", "w250", "w499"):
+        count, solved = solver.play(oracle(model, answer))
+        assert solved and count <= max_count
+
+
+def test_solver_gives_up_after_max_guesses(model):
+    solver = Solver(model, max_guesses=5, rng=random.Random(0))
+    assert solver.play(lambda word: (False, 0.0)) == (5, False)
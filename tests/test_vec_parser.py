@@ -0,0 +1,51 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+import vec_parser
+
+
+def write_model(path, lines, count=None, dim=3):
+    with open(path, "w", encoding="utf-8", newline="\n") as f:
+        f.write(f"{count if count is not None else len(lines)} {dim}\n")
+        f.write("".join(line + "\n" for line in lines))
+    return str(path)
+
+
+def test_parses_words_and_vectors(tmp_path):
+    path = write_model(tmp_path / "model.vec", ["りんご 1 0 0", "みかん 0.5 0.25 -1"])
+    words, vectors = vec_parser.parse_word2vec_text(path, workers=1)
+    assert words == ["りんご", "みかん"]
+    assert vectors.dtype == np.float32
+    np.testing.assert_allclose(vectors, [[1, 0, 0], [0.5, 0.25, -1]])
+
+
+def test_malformed_lines_are_skipped(tmp_path):
+    path = write_model(tmp_path / "model.vec", ["a 1 2 3", "b x 3", "c 1 2", "d 4 5 6"])
+    words, vectors = vec_parser.parse_word2vec_text(path, workers=1)
+    assert words == ["a", "d"]
+    np.testing.assert_allclose(vectors, [[1, 2, 3], [4, 5, 6]])
+
+
+def test_limit_and_progress(tmp_path):
+    path = write_model(tmp_path / "model.vec", [f"w{i} {i} {i} {i}" for i in range(10)])
+    events = []
+    words, vectors = vec_parser.parse_word2vec_text(path, limit=4, workers=1, progress_callback=events.append)
+    assert words == ["w0", "w1", "w2", "w3"] and vectors.shape == (4, 3)
+    assert events[-1].words_parsed == 4 and events[-1].fraction == 1.0
+
+
+def test_parallel_chunks_match_single_process(tmp_path):
+    lines = [f"w{i} {i} {i * 0.5} {-i}" for i in range(200)]
+    lines[57] = "bad 1 x 3"
+    path = write_model(tmp_path / "model.vec", lines)
+    events = vec_parser.iter_parse_word2vec_text(path, workers=2, chunk_bytes=256)
+    while True:
+        try:
+            next(events)
+        except StopIteration as stop:
+            words, vectors = stop.value
+            break
+    expected_words, expected_vectors = vec_parser.parse_word2vec_text(path, workers=1)
+    assert words == expected_words and len(words) == 199
+    np.testing.assert_array_equal(vectors, expected_vectors)
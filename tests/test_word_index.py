@@ -0,0 +1,46 @@
+import word_index
+
+
+class Vocabulary:
+    """NormalizedIndex に渡す最小限の語彙（index_to_key と in だけ使う）"""
+
+    def __init__(self, words):
+        self.index_to_key = list(words)
+
+    def __contains__(self, word):
+        return word in self.index_to_key
+
+
+def test_normalize_folds_width_case_and_katakana():
+    assert word_index.normalize("リンゴ") == "りんご"
+    assert word_index.normalize("ＡＰＰＬＥ") == "apple"
+    assert word_index.normalize("ｱｲｽ") == "あいす"
+    assert word_index.normalize("  Tokyo ") == "tokyo"
+
+
+def test_normalize_keeps_kanji_and_long_vowel():
+    assert word_index.normalize("東京タワー") == "東京たわー"
+    assert word_index.normalize("りんご") == "りんご"
+
+
+def test_resolve_prefers_most_frequent_spelling():
+    index = word_index.NormalizedIndex.build(Vocabulary(["Apple", "APPLE", "りんご", "コーヒー"]))
+    assert index.resolve("apple") == "Apple"
+    assert index.resolve("ＡＰＰＬＥ") == "Apple"
+    assert index.resolve("APPLE") == "APPLE"
+    assert index.resolve("リンゴ") == "りんご"
+    assert index.resolve("こーひー") == "コーヒー"
+    assert index.resolve("ばなな") is None
+
+
+def test_index_only_stores_words_that_differ_from_their_key():
+    index = word_index.NormalizedIndex.build(Vocabulary(["りんご", "Apple"]))
+    assert index.entries == {"apple": "Apple"}
+
+
+def test_saved_index_is_tied_to_fingerprint(tmp_path):
+    vocabulary = Vocabulary(["Apple"])
+    path = str(tmp_path / "words.json")
+    word_index.NormalizedIndex.build(vocabulary).save(path, "abc")
+    assert word_index.NormalizedIndex.load(path, vocabulary, "abc").resolve("apple") == "Apple"
+    assert word_index.NormalizedIndex.load(path, vocabulary, "other") is None
@@ -0,0 +1,162 @@
+import os
+import time
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import lazy_import
+
+np = lazy_import.lazy_module("numpy")
+
+# --- 並列パーサーの設定 ---
+# word2vec のテキスト形式をバイト範囲ごとに分割し、プロセスプールで解析する
+CHUNK_BYTES = 32 * 1024 * 1024
+PENDING_CHUNKS_PER_WORKER = 2  # 先読みしておくチャンク数（メモリ使用量の上限になる）
+
+
+class LoadProgress(namedtuple("LoadProgress", ["bytes_read", "total_bytes", "words_parsed", "total_words", "elapsed", "eta"])):
+    """読み込みの進捗。eta は残り秒数の見積もり（不明なら None）"""
+    __slots__ = ()
+
+    @property
+    def fraction(self):
+        """進捗を 0.0〜1.0 で返す"""
+        if self.total_words:
+            return min(1.0, self.words_parsed / self.total_words)
+        if self.total_bytes:
+            return min(1.0, self.bytes_read / self.total_bytes)
+        return 0.0
+
+
+def read_header(model_path):
+    """ヘッダー行を読み、(単語数, 次元数, 本体の開始位置) を返す"""
+    with open(model_path, "rb") as f:
+        header = f.readline()
+        count, dim = (int(x) for x in header.split())
+        return count, dim, f.tell()
+
+
+def split_chunks(model_path, start, chunk_bytes=CHUNK_BYTES):
+    """ファイルを改行位置でそろえたバイト範囲 (開始, 終了) のリストに分割する"""
+    total = os.path.getsize(model_path)
+    chunks = []
+    with open(model_path, "rb") as f:
+        while start < total:
+            f.seek(min(start + chunk_bytes, total))
+            f.readline()  # 行の途中で切らないように次の改行まで進める
+            end = min(f.tell(), total)
+            chunks.append((start, end))
+            start = end
+    return chunks
+
+
+def _parse_lines_slowly(lines, dim):
+    """形式の崩れた行を1行ずつ確認しながら解析する"""
+    words, rows = [], []
+    for line in lines:
+        parts = line.rstrip("\r\n ").split(" ")
+        if len(parts) != dim + 1:
+            continue
+        try:
+            rows.append(np.array(parts[1:], dtype=np.float32))
+        except ValueError:
+            continue
+        words.append(parts[0])
+    vectors = np.vstack(rows) if rows else np.empty((0, dim), dtype=np.float32)
+    return words, vectors
+
+
+def parse_chunk(model_path, start, end, dim):
+    """バイト範囲を解析して (単語リスト, ベクトル) を返す（ワーカープロセスで実行される）"""
+    with open(model_path, "rb") as f:
+        f.seek(start)
+        data = f.read(end - start)
+    lines = [line for line in data.decode("utf-8", errors="replace").split("\n") if line.strip()]
+
+    words, values = [], []
+    for line in lines:
+        word, _, rest = line.rstrip("\r\n ").partition(" ")
+        words.append(word)
+        values.append(rest)
+    # 数値部分はまとめて一度に変換する（1行ずつ変換するより桁違いに速い）
+    try:
+        vectors = np.fromstring(" ".join(values), dtype=np.float32, sep=" ")
+    except ValueError:
+        # NumPy 2 では数値にならない値があると例外になるので、このチャンクだけ1行ずつ解析する
+        return _parse_lines_slowly(lines, dim)
+    if vectors.size != len(words) * dim:
+        return _parse_lines_slowly(lines, dim)
+    return words, vectors.reshape(len(words), dim)
+
+
+def iter_parse_word2vec_text(model_path, limit=None, workers=None, chunk_bytes=CHUNK_BYTES):
+    """テキスト形式のモデルを並列に解析し、進捗 (LoadProgress) を順に yield する
+
+    ジェネレーターの戻り値は (単語リスト, ベクトル)。limit を指定すると先頭 N 語
+    （頻度の高い順）だけを読み込む。
+    """
+    count, dim, body_start = read_header(model_path)
+    total_bytes = os.path.getsize(model_path)
+    total_words = min(count, limit) if limit else count
+    chunks = split_chunks(model_path, body_start, chunk_bytes)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = max(1, min(workers, len(chunks)))
+
+    # 結果は最初に確保した配列へ順番に書き込む
+    vectors = np.empty((total_words, dim), dtype=np.float32)
+    words = []
+    start_time = time.time()
+    bytes_read = 0
+
+    def progress():
+        elapsed = time.time() - start_time
+        done = len(words) / total_words if total_words else 0.0
+        eta = elapsed * (1 - done) / done if done > 0 else None
+        return LoadProgress(bytes_read, total_bytes, len(words), total_words, elapsed, eta)
+
+    def consume(chunk_words, chunk_vectors, chunk_size):
+        nonlocal bytes_read
+        take = min(len(chunk_words), total_words - len(words))
+        vectors[len(words):len(words) + take] = chunk_vectors[:take]
+        words.extend(chunk_words[:take])
+        bytes_read += chunk_size
+
+    yield progress()
+    if workers == 1:
+        # 小さなファイルはプロセスを立ち上げる方が遅いのでその場で解析する
+        for start, end in chunks:
+            consume(*parse_chunk(model_path, start, end, dim), end - start)
+            yield progress()
+            if len(words) >= total_words:
+                break
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            pending = deque()
+            next_chunk = 0
+            while pending or next_chunk < len(chunks):
+                while next_chunk < len(chunks) and len(pending) < workers * PENDING_CHUNKS_PER_WORKER:
+                    start, end = chunks[next_chunk]
+                    pending.append((executor.submit(parse_chunk, model_path, start, end, dim), end - start))
+                    next_chunk += 1
+                future, chunk_size = pending.popleft()
+                consume(*future.result(), chunk_size)
+                yield progress()
+                if len(words) >= total_words:
+                    for future, _ in pending:
+                        future.cancel()
+                    break
+
+    # ヘッダーの単語数より実際の行が少ない場合は詰める
+    return words, vectors[:len(words)]
+
+
+def parse_word2vec_text(model_path, limit=None, workers=None, progress_callback=None):
+    """テキスト形式のモデルを並列に解析して (単語リスト, ベクトル) を返す"""
+    events = iter_parse_word2vec_text(model_path, limit=limit, workers=workers)
+    while True:
+        try:
+            event = next(events)
+        except StopIteration as stop:
+            return stop.value
+        if progress_callback:
+            progress_callback(event)
@@ -0,0 +1,32 @@
+import lazy_import
+
+np = lazy_import.lazy_module("numpy")  # 最初に使うときに読み込む（lazy_import.py を参照）
+
+# --- ベクトル演算の共通処理 ---
+# game_logic のモデルは gensim の KeyedVectors と compact_store.CompactVectorStore の
+# どちらにもなるので、全語彙に対する計算はここで吸収する
+EPSILON = 1e-12
+
+
+def unit_vector(model, word):
+    """単語の単位ベクトルを float32 で返す"""
+    return np.asarray(model.get_vector(word, norm=True), dtype=np.float32)
+
+
+def unit_rows(model, ids):
+    """指定した行番号のベクトルを単位ベクトルにして返す"""
+    if hasattr(model, "unit_rows"):
+        return model.unit_rows(ids)
+    model.fill_norms()
+    rows = np.asarray(model.vectors[ids], dtype=np.float32)
+    return rows / np.maximum(np.asarray(model.norms[ids], dtype=np.float32), EPSILON)[..., None]
+
+
+def similarities_to_all(model, query):
+    """単位ベクトル query と全語彙とのコサイン類似度を返す"""
+    if hasattr(model, "dot_all"):
+        return model.dot_all(query)
+    model.fill_norms()
+    scores = np.asarray(model.vectors @ query, dtype=np.float32)
+    scores /= np.maximum(np.asarray(model.norms, dtype=np.float32), EPSILON)
+    return scores
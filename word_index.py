@@ -0,0 +1,85 @@
+import os
+import json
+import unicodedata
+
+import model_cache
+
+# --- 表記ゆれを吸収する単語の索引 ---
+# 全角・半角、ひらがな・カタカナ、大文字・小文字の違いをならした形から語彙の表記を引く
+INDEX_VERSION = 1
+HIRAGANA_OFFSET = ord("ぁ") - ord("ァ")
+KATAKANA_TO_HIRAGANA = {code: code + HIRAGANA_OFFSET for code in range(ord("ァ"), ord("ヶ") + 1)}
+
+
+def normalize(word):
+    """表記ゆれをならした形を返す（NFKC → 大文字小文字をそろえる → カタカナをひらがなにする）"""
+    return unicodedata.normalize("NFKC", word).strip().casefold().translate(KATAKANA_TO_HIRAGANA)
+
+
+def get_index_path(model_path, fingerprint):
+    """モデルごとの索引ファイルのパスを返す"""
+    return os.path.join(model_cache.get_cache_dir(model_path), f"{os.path.basename(model_path)}.{fingerprint}.words.json")
+
+
+class NormalizedIndex:
+    """ならした形 -> 語彙の表記 の索引
+
+    語彙は頻度の高い順に並んでいるので、同じ形になる単語が複数あれば先頭（最も頻度の高いもの）を選ぶ。
+    ならした形そのものが選ばれる単語なら、その単語をそのまま引けばよいので索引には入れない。
+    こうすると索引に入るのは大文字を含む語やカタカナ語など一部だけで済む。
+    """
+
+    def __init__(self, model, entries):
+        self.model = model
+        self.entries = entries
+
+    @classmethod
+    def build(cls, model):
+        """語彙全体を1回だけ走査して索引を作る"""
+        best = {}
+        for word in model.index_to_key:
+            best.setdefault(normalize(word), word)
+        return cls(model, {key: word for key, word in best.items() if key != word})
+
+    def resolve(self, word):
+        """入力を語彙の表記に直して返す（見つからなければ None）"""
+        if word in self.model:
+            return word
+        key = normalize(word)
+        canonical = self.entries.get(key)
+        if canonical is not None:
+            return canonical
+        return key if key in self.model else None
+
+    def save(self, path, fingerprint):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"version": INDEX_VERSION, "fingerprint": fingerprint, "entries": self.entries}, f, ensure_ascii=False)
+        os.replace(path + ".tmp", path)
+
+    @classmethod
+    def load(cls, path, model, fingerprint):
+        """保存した索引を読み込む（なければ、またはモデルが違えば None）"""
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                saved = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        if saved.get("version") != INDEX_VERSION or saved.get("fingerprint") != fingerprint:
+            return None
+        return cls(model, saved["entries"])
+
+
+def load_or_build(model, model_path, fingerprint):
+    """保存した索引があれば読み込み、なければ作って保存する"""
+    path = get_index_path(model_path, fingerprint) if model_path else None
+    index = NormalizedIndex.load(path, model, fingerprint) if path else None
+    if index is not None:
+        return index
+    index = NormalizedIndex.build(model)
+    if path:
+        try:
+            index.save(path, fingerprint)
+        except (IOError, OSError) as e:
+            print(f"単語の索引の保存に失敗しました: {e}")
+    return index